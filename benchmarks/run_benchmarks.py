@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of moldrug with a deterministic stub of Vina (``vina_stub.py``), so the overhead
+of moldrug itself is measured without a docking program and without network access.
+A small CReM database is built from ``fragments.smi`` with the CReM command line tools.
+
+The results are written as JSON (one record per scenario) so they can be compared between commits:
+
+.. code-block:: bash
+
+    python benchmarks/run_benchmarks.py -o bench.json
+    python benchmarks/run_benchmarks.py -s ga make_sdf --popsize 20 40 --pc 0.5 1 --latency 0.05
+"""
+import argparse
+import collections
+import datetime
+import json
+import os
+import platform
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+from copy import deepcopy
+
+from rdkit import Chem
+
+import moldrug
+from moldrug import fitness, utils
+from moldrug.data import get_data
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATA = {'x0161': get_data('x0161'), '6lu7': get_data('6lu7')}
+MUTATE_CREM_KWARGS = dict(radius=3, min_size=0, max_size=8, min_inc=-5, max_inc=3)
+SCENARIOS = dict()
+# Dependencies that must be imported on first use
+HEAVY_MODULES = ['pandas', 'tqdm', 'crem', 'meeko', 'scipy']
+
+
+def scenario(func):
+    """Register a scenario. It gets the parsed arguments and returns a list of records"""
+    SCENARIOS[func.__name__] = func
+    return func
+
+
+def build_crem_db(wd: str, smiles_file: str = os.path.join(HERE, 'fragments.smi')) -> str:
+    """Build a CReM database of radius 3 from smiles_file"""
+    db = os.path.join(wd, 'crem.db')
+    subprocess.run(['fragmentation', '-i', os.path.abspath(smiles_file), '-o', 'frags.txt', '-c', '1'], cwd=wd, check=True)
+    subprocess.run(['frag_to_env', '-i', 'frags.txt', '-r', '3', '-o', 'r3.txt'], cwd=wd, check=True)
+    # The same of: sort r3.txt | uniq -c > r3_c.txt
+    with open(os.path.join(wd, 'r3.txt')) as f:
+        counts = collections.Counter(line.rstrip('\n') for line in f)
+    with open(os.path.join(wd, 'r3_c.txt'), 'w') as f:
+        f.writelines(f"{count:7d} {line}\n" for line, count in sorted(counts.items()))
+    subprocess.run(['env_to_db', '-i', 'r3_c.txt', '-o', 'crem.db', '-r', '3', '-c'], cwd=wd, check=True)
+    return db
+
+
+def write_vina(wd: str) -> str:
+    """Write an executable that runs vina_stub.py with the current interpreter"""
+    vina = os.path.join(wd, 'vina')
+    with open(vina, 'w') as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.join(HERE, "vina_stub.py")}" "$@"\n')
+    os.chmod(vina, os.stat(vina).st_mode | stat.S_IEXEC)
+    return vina
+
+
+def import_time(module: str) -> tuple:
+    """Import module in a new interpreter and return its cumulative import time (s)
+    and the heavy dependencies that were loaded"""
+    code = (f"import sys; import {module}; "
+            f"print(','.join(m for m in {HEAVY_MODULES} if m in sys.modules))")
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, check=True)
+    cumulative = [int(line.split('|')[1]) for line in process.stderr.splitlines()
+                  if line.startswith('import time:') and line.split('|')[2].strip() == module]
+    return cumulative[-1] / 1e6, [m for m in process.stdout.strip().split(',') if m]
+
+
+def single_receptor_kwargs(args) -> dict:
+    return dict(
+        receptor_pdbqt_path=DATA['x0161']['protein']['pdbqt'],
+        boxcenter=DATA['x0161']['box']['boxcenter'],
+        boxsize=DATA['x0161']['box']['boxsize'],
+        vina_executable=args.vina,
+        exhaustiveness=8,
+        ncores=1,
+        num_modes=1,
+    )
+
+
+def run_ga(args, popsize: int, pc: float, costfunc=fitness.CostOnlyVina, costfunc_kwargs: dict = None,
+           deffnm: str = 'ga') -> tuple:
+    """Run a GA from the x0161 ligand and return it with its wall time"""
+    if costfunc_kwargs is None:
+        costfunc_kwargs = single_receptor_kwargs(args)
+    ga = utils.GA(
+        seed_mol=Chem.MolFromSmiles(DATA['x0161']['smiles']),
+        crem_db_path=args.crem_db,
+        maxiter=args.maxiter,
+        popsize=popsize,
+        pc=pc,
+        costfunc=costfunc,
+        costfunc_kwargs=costfunc_kwargs,
+        mutate_crem_kwargs=deepcopy(MUTATE_CREM_KWARGS),
+        save_pop_every_gen=0,
+        deffnm=os.path.join(args.wd, deffnm),
+        randomseed=args.seed)
+    start = time.perf_counter()
+    ga(njobs=args.njobs)
+    return ga, time.perf_counter() - start
+
+
+def ga_record(ga: utils.GA, wall: float) -> dict:
+    return {
+        'wall': wall,
+        'evaluations': len(ga.SawIndividuals),
+        'best_cost': ga.pop[0].cost,
+        'best_smiles': ga.pop[0].smiles,
+        'acceptance': ga.acceptance,
+        'timings': ga.timings,
+    }
+
+
+@scenario
+def imports(args) -> list:
+    """Import time of the moldrug modules (best of repeat) and wall time of ``moldrug -v``"""
+    records = []
+    for module in ['moldrug', 'moldrug.cli', 'moldrug.utils', 'moldrug.fitness', 'moldrug.constraintconf',
+                   'moldrug.broker']:
+        measures = [import_time(module) for _ in range(args.repeat)]
+        records.append({'params': {'module': module, 'repeat': args.repeat},
+                        'wall': min(wall for wall, _ in measures), 'heavy_modules': measures[0][1]})
+    walls = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'from moldrug.cli import __moldrug_cmd; __moldrug_cmd()', '-v'],
+                       capture_output=True, check=True)
+        walls.append(time.perf_counter() - start)
+    records.append({'params': {'command': 'moldrug -v', 'repeat': args.repeat}, 'wall': min(walls)})
+    return records
+
+
+@scenario
+def ga(args) -> list:
+    """GA generations for every combination of popsize and pc"""
+    records = []
+    for popsize in args.popsize:
+        for pc in args.pc:
+            out, wall = run_ga(args, popsize, pc, deffnm=f'ga_{popsize}_{pc}')
+            records.append({'params': {'popsize': popsize, 'nc': out.nc, 'maxiter': args.maxiter},
+                            **ga_record(out, wall)})
+    return records
+
+
+@scenario
+def constraint(args) -> list:
+    """Constraint docking (local_only and score_only) of the x0161 ligand"""
+    records = []
+    for constraint_type in ['local_only', 'score_only']:
+        timer = utils.StageTimer()
+        previous = utils._swap_stage_timer(timer)
+        walls = []
+        try:
+            for i in range(args.repeat):
+                wd = os.path.join(args.wd, f'constraint_{constraint_type}_{i}')
+                os.makedirs(wd, exist_ok=True)
+                start = time.perf_counter()
+                individual = fitness.Cost(
+                    Individual=utils.Individual(Chem.MolFromSmiles(DATA['x0161']['smiles']), idx=i),
+                    wd=wd,
+                    constraint=True,
+                    constraint_type=constraint_type,
+                    constraint_ref=Chem.MolFromMolFile(DATA['x0161']['ligand_3D']),
+                    constraint_receptor_pdb_path=DATA['x0161']['protein']['pdb'],
+                    constraint_num_conf=args.constraint_num_conf,
+                    vina_seed=args.seed,
+                    **single_receptor_kwargs(args))
+                walls.append(time.perf_counter() - start)
+        finally:
+            utils._swap_stage_timer(previous)
+        records.append({'params': {'constraint_type': constraint_type, 'constraint_num_conf': args.constraint_num_conf,
+                                   'repeat': args.repeat},
+                        'wall': sum(walls), 'wall_per_call': walls, 'cost': individual.cost,
+                        'timings': timer.as_dict()})
+    return records
+
+
+@scenario
+def multi_receptor(args) -> list:
+    """GA with CostMultiReceptors on the x0161 and 6lu7 receptors"""
+    costfunc_kwargs = single_receptor_kwargs(args)
+    costfunc_kwargs.update(
+        receptor_pdbqt_path=[DATA['x0161']['protein']['pdbqt'], DATA['6lu7']['protein']['pdbqt']],
+        boxcenter=[DATA['x0161']['box']['boxcenter'], DATA['6lu7']['box']['boxcenter']],
+        boxsize=[DATA['x0161']['box']['boxsize'], DATA['6lu7']['box']['boxsize']],
+        vina_score_type=['min', 'max'])
+    popsize = args.popsize[0]
+    out, wall = run_ga(args, popsize, 1, costfunc=fitness.CostMultiReceptors, costfunc_kwargs=costfunc_kwargs,
+                       deffnm='multi_receptor')
+    return [{'params': {'popsize': popsize, 'nc': out.nc, 'maxiter': args.maxiter, 'receptors': 2},
+             **ga_record(out, wall)}]
+
+
+@scenario
+def checkpoint(args) -> list:
+    """Pickle of the GA (plain and compressed)"""
+    out, _ = run_ga(args, args.popsize[0], 1, deffnm='checkpoint')
+    records = []
+    for compress in [False, True]:
+        title = os.path.join(args.wd, f'checkpoint_{compress}')
+        start = time.perf_counter()
+        out.pickle(title, compress=compress)
+        wall = time.perf_counter() - start
+        path = f"{title}.pbz2" if compress else f"{title}.pkl"
+        records.append({'params': {'compress': compress, 'individuals': len(out.SawIndividuals)},
+                        'wall': wall, 'size': os.path.getsize(path)})
+    return records
+
+
+@scenario
+def make_sdf(args) -> list:
+    """Export of the poses of all the evaluated individuals with make_sdf"""
+    out, _ = run_ga(args, args.popsize[0], 1, deffnm='make_sdf')
+    records = []
+    for compress in [False, True]:
+        sdf_name = os.path.join(args.wd, f'make_sdf_{compress}')
+        start = time.perf_counter()
+        utils.make_sdf(out.SawIndividuals, sdf_name=sdf_name, njobs=args.njobs, compress=compress)
+        wall = time.perf_counter() - start
+        path = f"{sdf_name}.sdf.gz" if compress else f"{sdf_name}.sdf"
+        records.append({'params': {'compress': compress, 'njobs': args.njobs,
+                                   'individuals': len(out.SawIndividuals)},
+                        'wall': wall, 'size': os.path.getsize(path)})
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0], formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('-s', '--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS),
+                        help="Scenarios to run, by default all")
+    parser.add_argument('-o', '--output', default='benchmarks.json',
+                        help="Output JSON file, by default benchmarks.json")
+    parser.add_argument('--popsize', nargs='+', type=int, default=[10, 20],
+                        help="Population sizes of the GA scenarios, by default 10 20")
+    parser.add_argument('--pc', nargs='+', type=float, default=[0.5, 1],
+                        help="Crossover probabilities (nc = round(pc * popsize)), by default 0.5 1")
+    parser.add_argument('--maxiter', type=int, default=3, help="Generations of the GA, by default 3")
+    parser.add_argument('--njobs', default=1, help="njobs of GA.__call__ and make_sdf, by default 1")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Repetitions of the constraint docking and the import measures, by default 3")
+    parser.add_argument('--constraint-num-conf', dest='constraint_num_conf', type=int, default=10,
+                        help="constraint_num_conf of the constraint docking, by default 10")
+    parser.add_argument('--latency', type=float, default=0,
+                        help="Seconds per call of the stub (MOLDRUG_STUB_LATENCY), by default 0")
+    parser.add_argument('--latency-per-atom', dest='latency_per_atom', type=float, default=0,
+                        help="Seconds per heavy atom of the stub (MOLDRUG_STUB_LATENCY_PER_ATOM), by default 0")
+    parser.add_argument('--crem-db', dest='crem_db', default=None,
+                        help="CReM database. By default one is built from fragments.smi")
+    parser.add_argument('--seed', type=int, default=1234, help="Random seed, by default 1234")
+    parser.add_argument('--wd', default=None, help="Working directory, by default a temporal one")
+    args = parser.parse_args(argv)
+
+    if args.njobs != 'auto':
+        args.njobs = int(args.njobs)
+    os.environ['MOLDRUG_STUB_LATENCY'] = str(args.latency)
+    os.environ['MOLDRUG_STUB_LATENCY_PER_ATOM'] = str(args.latency_per_atom)
+
+    tmp = None
+    if args.wd is None:
+        tmp = tempfile.TemporaryDirectory(prefix='moldrug_bench_')
+        args.wd = tmp.name
+    args.wd = os.path.abspath(args.wd)
+    os.makedirs(args.wd, exist_ok=True)
+    args.vina = write_vina(args.wd)
+    if args.crem_db is None:
+        args.crem_db = build_crem_db(args.wd)
+    args.crem_db = os.path.abspath(args.crem_db)
+
+    report = {
+        'moldrug': moldrug.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': utils.available_cpus(),
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'settings': {key: value for key, value in vars(args).items() if key not in ['output', 'wd', 'vina']},
+        'results': [],
+    }
+    try:
+        for name in args.scenarios:
+            start = time.perf_counter()
+            for record in SCENARIOS[name](args):
+                report['results'].append({'scenario': name, **record})
+                print(f"{name:<15} {json.dumps(record['params'])}: {record['wall']:.3f} s")
+            print(f"{name:<15} done in {time.perf_counter() - start:.3f} s")
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
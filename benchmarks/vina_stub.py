@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Deterministic replacement of the Vina executable used by the benchmarks.
+
+It accepts the command line used by :mod:`moldrug.fitness` and it returns a score that
+only depends on the receptor and on the atoms of the ligand (not on its coordinates),
+so two runs with the same random seed of moldrug give the same results.
+The poses written on ``--out`` are the input coordinates of the ligand.
+``--write_maps`` writes empty maps and the docking with ``--maps`` (vina scoring) gives the same score
+than with the receptor of the maps.
+
+The latency of every call is set with the environment variables:
+
+* ``MOLDRUG_STUB_LATENCY``: seconds per call, by default 0.
+* ``MOLDRUG_STUB_LATENCY_PER_ATOM``: seconds per heavy atom of the ligand, by default 0.
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='vina')
+    for option in ['receptor', 'ligand', 'out', 'center_x', 'center_y', 'center_z', 'size_x', 'size_y', 'size_z',
+                   'cpu', 'exhaustiveness', 'num_modes', 'seed', 'scoring', 'maps', 'write_maps']:
+        parser.add_argument(f'--{option}')
+    parser.add_argument('--score_only', action='store_true')
+    parser.add_argument('--force_even_voxels', action='store_true')
+    parser.add_argument('--local_only', action='store_true')
+    # Options of Vina that are not used by moldrug
+    args, _ = parser.parse_known_args(argv)
+    return args
+
+
+def score(receptor, ligand):
+    atoms = [line[77:79].strip() for line in ligand.splitlines() if line.startswith(('ATOM', 'HETATM'))]
+    heavy = sum(atom not in ('H', 'HD') for atom in atoms)
+    digest = hashlib.sha1(f"{receptor}{sorted(atoms)}".encode()).hexdigest()
+    return heavy, round(-0.3 * heavy - int(digest, 16) % 100 / 50, 3)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.write_maps:
+        for atom_type in ['C', 'A', 'N', 'O', 'S', 'HD', 'e', 'd']:
+            with open(f"{args.write_maps}.{atom_type}.map", 'w') as f:
+                f.write(f"GRID_PARAMETER_FILE {args.write_maps}.gpf\n")
+        if not args.ligand:
+            return
+    with open(args.ligand, 'r') as f:
+        ligand = f.read()
+    if args.maps and args.scoring != 'ad4':
+        # Maps written by --write_maps of a pdbqt receptor
+        receptor = os.path.basename(args.maps) + '.pdbqt'
+    else:
+        receptor = os.path.basename(args.receptor or args.maps or '')
+    heavy, affinity = score(receptor, ligand)
+
+    latency = float(os.environ.get('MOLDRUG_STUB_LATENCY', 0)) + \
+        float(os.environ.get('MOLDRUG_STUB_LATENCY_PER_ATOM', 0)) * heavy
+    if latency > 0:
+        time.sleep(latency)
+
+    if args.score_only or args.local_only:
+        print(f"Affinity: {affinity:.3f} (kcal/mol)")
+    if args.out and not args.score_only:
+        num_modes = 1 if args.local_only else int(args.num_modes or 9)
+        with open(args.out, 'w') as f:
+            for mode in range(num_modes):
+                f.write(f"MODEL {mode + 1}\n"
+                        f"REMARK VINA RESULT: {affinity + 0.1 * mode:9.3f}      0.000      0.000\n"
+                        f"{ligand}ENDMDL\n")
+
+
+if __name__ == '__main__':
+    main()
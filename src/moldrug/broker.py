@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+A simple file-system task broker to distribute the evaluation of the cost function
+over several machines that share a file system.
+
+The broker is a directory with the sub-directories:
+
+* ``tasks``: pending tasks.
+* ``running``: tasks claimed by some worker (``{task_id}.{worker_id}``).
+* ``results``: finished tasks.
+* ``workers``: heartbeat files of the alive workers.
+
+All the files are written in a temporal file and then renamed, so the operations are atomic.
+A task is claimed by a worker by renaming it from ``tasks`` to ``running``; only one worker can succeed.
+If the heartbeat of a worker is older than heartbeat_timeout, its running tasks are resubmitted.
+
+The main process uses :meth:`moldrug.broker.BrokerBackend` and the workers are started with:
+
+.. code-block:: bash
+
+    moldrug worker path/to/broker
+
+The workers must run with access to the same paths used by the simulation (e.g. started from the same
+working directory on a shared file system or using absolute paths on costfunc_kwargs).
+"""
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from typing import Callable, Iterable, List, Union
+
+import dill as pickle
+
+from moldrug.utils import EvaluationBackend
+
+
+class FileBroker:
+    """File-system based task queue.
+    """
+    def __init__(self, path: str) -> None:
+        """Constructor
+
+        Parameters
+        ----------
+        path : str
+            Directory of the broker. It is created if needed.
+        """
+        self.path = os.path.abspath(path)
+        for sub_dir in ['tasks', 'running', 'results', 'workers']:
+            os.makedirs(os.path.join(self.path, sub_dir), exist_ok=True)
+
+    def _write(self, sub_dir: str, name: str, obj: object):
+        tmp = os.path.join(self.path, sub_dir, f".{name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp, 'wb') as f:
+            pickle.dump(obj, f)
+        os.replace(tmp, os.path.join(self.path, sub_dir, name))
+
+    def _read(self, sub_dir: str, name: str) -> object:
+        with open(os.path.join(self.path, sub_dir, name), 'rb') as f:
+            return pickle.load(f)
+
+    def _list(self, sub_dir: str) -> List[str]:
+        return sorted(name for name in os.listdir(os.path.join(self.path, sub_dir)) if not name.startswith('.'))
+
+    def submit(self, task_id: str, func: Callable, args: object):
+        """Submit a task
+
+        Parameters
+        ----------
+        task_id : str
+            Unique identifier of the task (without dots)
+        func : Callable
+            A picklable function
+        args : object
+            The argument of func
+        """
+        self._write('tasks', task_id, (func, args))
+
+    def claim(self, worker_id: str) -> Union[None, tuple]:
+        """Claim the oldest pending task
+
+        Parameters
+        ----------
+        worker_id : str
+            Identifier of the worker
+
+        Returns
+        -------
+        Union[None, tuple]
+            (task_id, func, args) or None if there is not pending tasks
+        """
+        for task_id in self._list('tasks'):
+            running = os.path.join(self.path, 'running', f"{task_id}.{worker_id}")
+            try:
+                os.rename(os.path.join(self.path, 'tasks', task_id), running)
+            except FileNotFoundError:
+                # Another worker was faster
+                continue
+            with open(running, 'rb') as f:
+                func, args = pickle.load(f)
+            return task_id, func, args
+        return None
+
+    def put_result(self, task_id: str, worker_id: str, result: tuple):
+        """Store the result of a task and release it
+
+        Parameters
+        ----------
+        task_id : str
+            Identifier of the task
+        worker_id : str
+            Identifier of the worker
+        result : tuple
+            ``('ok', output)`` or ``('error', traceback)``
+        """
+        self._write('results', task_id, result)
+        try:
+            os.remove(os.path.join(self.path, 'running', f"{task_id}.{worker_id}"))
+        except FileNotFoundError:
+            # It was resubmitted in the meantime
+            pass
+
+    def pop_result(self, task_id: str) -> Union[None, tuple]:
+        """Get (and remove) the result of a task
+
+        Parameters
+        ----------
+        task_id : str
+            Identifier of the task
+
+        Returns
+        -------
+        Union[None, tuple]
+            The result or None if it is not ready.
+        """
+        try:
+            result = self._read('results', task_id)
+        except FileNotFoundError:
+            return None
+        os.remove(os.path.join(self.path, 'results', task_id))
+        return result
+
+    def ready(self) -> set:
+        """Get the identifiers of the finished tasks
+
+        Returns
+        -------
+        set
+            Identifiers of the tasks with a result available
+        """
+        return set(self._list('results'))
+
+    def cancel(self, prefix: str):
+        """Remove the pending tasks and the results which identifier starts with prefix
+
+        Parameters
+        ----------
+        prefix : str
+            Prefix of the identifiers
+        """
+        for sub_dir in ['tasks', 'results']:
+            for name in self._list(sub_dir):
+                if name.startswith(prefix):
+                    try:
+                        os.remove(os.path.join(self.path, sub_dir, name))
+                    except FileNotFoundError:
+                        pass
+
+    def heartbeat(self, worker_id: str):
+        """Update the heartbeat of a worker
+
+        Parameters
+        ----------
+        worker_id : str
+            Identifier of the worker
+        """
+        path = os.path.join(self.path, 'workers', worker_id)
+        with open(path, 'a'):
+            os.utime(path)
+
+    def remove_worker(self, worker_id: str):
+        """Remove the heartbeat file of a worker
+
+        Parameters
+        ----------
+        worker_id : str
+            Identifier of the worker
+        """
+        try:
+            os.remove(os.path.join(self.path, 'workers', worker_id))
+        except FileNotFoundError:
+            pass
+
+    def requeue_lost(self, heartbeat_timeout: float = 60) -> List[str]:
+        """Resubmit the running tasks of the workers without a recent heartbeat
+
+        Parameters
+        ----------
+        heartbeat_timeout : float, optional
+            Seconds without heartbeat to consider a worker lost, by default 60
+
+        Returns
+        -------
+        List[str]
+            The resubmitted tasks
+        """
+        now = time.time()
+        requeued = []
+        for name in self._list('running'):
+            task_id, worker_id = name.split('.', 1)
+            try:
+                alive = now - os.path.getmtime(os.path.join(self.path, 'workers', worker_id)) < heartbeat_timeout
+            except FileNotFoundError:
+                alive = False
+            if not alive:
+                try:
+                    os.rename(os.path.join(self.path, 'running', name), os.path.join(self.path, 'tasks', task_id))
+                    requeued.append(task_id)
+                except FileNotFoundError:
+                    pass
+        return requeued
+
+
+def worker(path: str, poll: float = 1, heartbeat: float = 10, max_idle: Union[None, float] = None,
+           max_tasks: Union[None, int] = None, worker_id: Union[None, str] = None) -> int:
+    """Run a worker that pulls tasks from the broker, executes them and pushes the results back.
+    It is the function behind ``moldrug worker``.
+
+    Parameters
+    ----------
+    path : str
+        Directory of the broker
+    poll : float, optional
+        Seconds to wait between checks for new tasks, by default 1
+    heartbeat : float, optional
+        Seconds between heartbeats, by default 10
+    max_idle : Union[None, float], optional
+        Finish after max_idle seconds without tasks. None means never, by default None
+    max_tasks : Union[None, int], optional
+        Finish after max_tasks tasks. None means never, by default None
+    worker_id : Union[None, str], optional
+        Identifier of the worker (without dots), by default ``{hostname}-{pid}``
+
+    Returns
+    -------
+    int
+        Number of executed tasks
+    """
+    broker = FileBroker(path)
+    if worker_id is None:
+        worker_id = f"{socket.gethostname().replace('.', '-')}-{os.getpid()}"
+
+    broker.heartbeat(worker_id)
+    stop = threading.Event()
+
+    def _beat():
+        while not stop.is_set():
+            broker.heartbeat(worker_id)
+            stop.wait(heartbeat)
+
+    beat_thread = threading.Thread(target=_beat, daemon=True)
+    beat_thread.start()
+
+    done = 0
+    idle_since = time.time()
+    try:
+        while max_tasks is None or done < max_tasks:
+            task = broker.claim(worker_id)
+            if task is None:
+                if max_idle is not None and time.time() - idle_since > max_idle:
+                    break
+                time.sleep(poll)
+                continue
+            task_id, func, args = task
+            try:
+                result = ('ok', func(args))
+            except Exception:
+                result = ('error', traceback.format_exc())
+            broker.put_result(task_id, worker_id, result)
+            done += 1
+            idle_since = time.time()
+    finally:
+        stop.set()
+        beat_thread.join()
+        broker.remove_worker(worker_id)
+    return done
+
+
+class BrokerBackend(EvaluationBackend):
+    """Evaluation backend based on :meth:`moldrug.broker.FileBroker`.
+
+    Example
+    -------
+    .. code-block:: python
+
+        from moldrug.broker import BrokerBackend
+        ga(backend=BrokerBackend('broker'))
+
+    and on every node (sharing the file system):
+
+    .. code-block:: bash
+
+        moldrug worker broker
+    """
+    def __init__(self, path: str, poll: float = 0.5, heartbeat_timeout: float = 60, local_workers: int = 0) -> None:
+        """Constructor
+
+        Parameters
+        ----------
+        path : str
+            Directory of the broker
+        poll : float, optional
+            Seconds to wait between checks for results, by default 0.5
+        heartbeat_timeout : float, optional
+            Seconds without heartbeat to consider a worker lost and resubmit its tasks, by default 60
+        local_workers : int, optional
+            Number of workers to start on this machine during :meth:`map`, by default 0
+        """
+        self.broker = FileBroker(path)
+        self.poll = poll
+        self.heartbeat_timeout = heartbeat_timeout
+        self.local_workers = local_workers
+
+    def map(self, func: Callable, args_list: List) -> Iterable:
+        results = dict()
+        index = 0
+        for completed, output in self.map_incremental(func, args_list):
+            results[completed] = output
+            while index in results:
+                yield results.pop(index)
+                index += 1
+
+    def map_incremental(self, func: Callable, args_list: List) -> Iterable:
+        batch = uuid.uuid4().hex
+        task_ids = []
+
+        processes = []
+        if self.local_workers:
+            import multiprocessing as mp
+            for i in range(self.local_workers):
+                process = mp.Process(target=worker, args=(self.broker.path,),
+                                     kwargs={'poll': self.poll, 'worker_id': f"local{i}-{batch}"})
+                process.start()
+                processes.append(process)
+
+        pending = set()
+        try:
+            while len(task_ids) < len(args_list) or pending:
+                # The items added during the iteration are submitted to the same batch
+                while len(task_ids) < len(args_list):
+                    task_id = f"{batch}-{len(task_ids):08d}"
+                    self.broker.submit(task_id, func, args_list[len(task_ids)])
+                    task_ids.append(task_id)
+                    pending.add(task_id)
+                completed = []
+                for ready in sorted(self.broker.ready() & pending):
+                    result = self.broker.pop_result(ready)
+                    if result is not None:
+                        pending.discard(ready)
+                        completed.append((ready, result))
+                if not completed:
+                    self.broker.requeue_lost(self.heartbeat_timeout)
+                    time.sleep(self.poll)
+                for task_id, (status, output) in completed:
+                    if status == 'error':
+                        raise RuntimeError(f"The task {task_id} failed on the worker with:\n{output}")
+                    yield int(task_id.rsplit('-', 1)[1]), output
+        finally:
+            for i, process in enumerate(processes):
+                process.terminate()
+                process.join()
+                self.broker.remove_worker(f"local{i}-{batch}")
+            # Remaining tasks (in case of failure) and duplicated results of resubmitted tasks
+            self.broker.cancel(batch)
@@ -12,10 +12,57 @@ import os
 import sys
 from typing import Union
 
-import yaml
-from rdkit import Chem
+from moldrug import __version__
 
-from moldrug import __version__, constraintconf, utils
+
+def _get_costfunc(name: str, fitness_module: Union[None, str] = None):
+    """Get the cost function from moldrug.fitness or from a user-custom fitness module
+
+    Parameters
+    ----------
+    name : str
+        Name of the cost function
+    fitness_module : Union[None, str], optional
+        Path to the user-custom fitness module, by default None (moldrug.fitness)
+
+    Returns
+    -------
+    Callable
+        The cost function
+    """
+    if fitness_module:
+        # If the fitness module provided is not in the current directory or if its name is not fitness
+        with open(fitness_module, 'r') as source:
+            with open('CustomMoldrugFitness.py', 'w') as destination:
+                destination.write(source.read())
+        sys.path.append('.')
+        import CustomMoldrugFitness
+        return dict(inspect.getmembers(CustomMoldrugFitness))[name]
+    else:
+        from moldrug import fitness
+        return dict(inspect.getmembers(fitness))[name]
+
+
+def _get_backend(MainConfig: dict):
+    """Get the evaluation backend from the broker keyword of the yaml file
+
+    Parameters
+    ----------
+    MainConfig : dict
+        The configuration of the main job. broker is the directory of the broker
+        or the keyword arguments of :meth:`moldrug.broker.BrokerBackend`
+
+    Returns
+    -------
+    Union[None, moldrug.broker.BrokerBackend]
+        None if broker is not in MainConfig (the default backend is used)
+    """
+    if 'broker' not in MainConfig:
+        return None
+    from moldrug.broker import BrokerBackend
+    if isinstance(MainConfig['broker'], dict):
+        return BrokerBackend(**MainConfig['broker'])
+    return BrokerBackend(MainConfig['broker'])
 
 
 class CommandLineHelper:
@@ -44,6 +91,7 @@ class CommandLineHelper:
         self._set_init_moldrugClass()
 
     def _set_config(self):
+        import yaml
         with open(self.yaml_file, 'r') as c:
             self.configuration = yaml.safe_load(c)
 
@@ -54,30 +102,25 @@ class CommandLineHelper:
         return MainConfig, FollowConfig
 
     def _set_costfunc(self):
-        if self.fitness:
-            # If the fitness module provided is not in the current directory or if its name is not fitness
-            with open(self.fitness, 'r') as source:
-                with open('CustomMoldrugFitness.py', 'w') as destination:
-                    destination.write(source.read())
-            sys.path.append('.')
-            import CustomMoldrugFitness
-            costfunc = dict(inspect.getmembers(CustomMoldrugFitness))[self._split_config()[0]['costfunc']]
-        else:
-            from moldrug import fitness
-            costfunc = dict(inspect.getmembers(fitness))[self._split_config()[0]['costfunc']]
-        self.costfunc = costfunc
+        self.costfunc = _get_costfunc(self._split_config()[0]['costfunc'], self.fitness)
 
     def _set_TypeOfRun(self):
+        from moldrug import utils
         self._TypeOfRun_str = self._split_config()[0]['type'].lower()
         if self._TypeOfRun_str == 'ga':
             self.TypeOfRun = utils.GA
         elif self._TypeOfRun_str == 'local':
             self.TypeOfRun = utils.Local
+        elif self._TypeOfRun_str == 'islandga':
+            self.TypeOfRun = utils.IslandGA
         else:
             raise NotImplementedError(f"\"{self._split_config()[0]['type']}\" it is not a possible type. "
-                                      "Select from: GA or Local")
+                                      "Select from: GA, IslandGA or Local")
 
     def _translate_config(self):
+        from rdkit import Chem
+
+        from moldrug import utils
         MainConfig, FollowConfig = self._split_config()
 
         # Convert the SMILES (or path to compress_pickle) to RDKit mol (or list of RDkit mol)
@@ -114,7 +157,7 @@ class CommandLineHelper:
         InitArgs = MainConfig.copy()
 
         # Modifying InitArgs
-        _ = [InitArgs.pop(key, None) for key in ['type', 'njobs', 'pick']]
+        _ = [InitArgs.pop(key, None) for key in ['type', 'njobs', 'pick', 'broker']]
         InitArgs['costfunc'] = self.costfunc
 
         # Getting call arguments
@@ -124,13 +167,16 @@ class CommandLineHelper:
                 CallArgs[key] = MainConfig[key]
             except KeyError:
                 pass
+        # Evaluation of the cost function through moldrug workers
+        if 'broker' in MainConfig:
+            CallArgs['backend'] = _get_backend(MainConfig)
 
         # Checking for follow jobs and sanity check on the arguments
         if FollowConfig:
             # Defining the possible mutable arguments with its default values depending on the type of run
-            if MainConfig['type'].lower() == 'local':
-                raise ValueError("Type = Local does not accept multiple call from the command line! Remove follow "
-                                 "jobs from the yaml file (only the main job is possible)")
+            if MainConfig['type'].lower() in ['local', 'islandga']:
+                raise ValueError(f"Type = {MainConfig['type']} does not accept multiple call from the command line! "
+                                 "Remove follow jobs from the yaml file (only the main job is possible)")
             else:
                 # Add default value in case it is not provided for keyword arguments
                 list_of_keywords = [
@@ -179,6 +225,7 @@ class CommandLineHelper:
         This gave me the job and how many generation are needed to complete it.
         The further jobs are suppose that must run.
         """
+        from moldrug import utils
         if self.continuation:
             if self._TypeOfRun_str != 'ga':
                 raise RuntimeError('Continuation is only valid for GA runs.')
@@ -220,6 +267,7 @@ class CommandLineHelper:
         self.new_maxiter = new_maxiter
 
     def _set_init_moldrugClass(self):
+        from moldrug import utils
         # Here is where the continuation code is added
 
         # Get if if needed to continue and make the corresponded updates on self.FollowConfig
@@ -237,12 +285,14 @@ class CommandLineHelper:
 
     def save_data(self):
         # Saving data
+        from moldrug import utils
         if self._TypeOfRun_str == 'local':
             self.moldrugClass.pickle("local_result", compress=True)
-            utils.make_sdf(self.moldrugClass.pop, sdf_name="local_pop")
+            utils.make_sdf(self.moldrugClass.pop, sdf_name="local_pop", njobs=self.CallArgs.get('njobs', 1))
         else:
             self.moldrugClass.pickle(f"{self.moldrugClass.deffnm}_result", compress=True)
-            utils.make_sdf(self.moldrugClass.pop, sdf_name=f"{self.moldrugClass.deffnm}_pop")
+            utils.make_sdf(self.moldrugClass.pop, sdf_name=f"{self.moldrugClass.deffnm}_pop",
+                           njobs=self.CallArgs.get('njobs', 1))
 
     def __repr__(self) -> str:
         string = self.args.__repr__().replace('Namespace', self.__class__.__name__)
@@ -251,21 +301,156 @@ class CommandLineHelper:
         return string
 
 
+def __worker_cmd(argv: list):
+    """
+    Command line interface of :meth:`moldrug.broker.worker` (``moldrug worker``).
+
+    Parameters
+    ----------
+    argv : list
+        The command line arguments after ``worker``.
+    """
+    parser = argparse.ArgumentParser(
+        prog='moldrug worker',
+        description="Pull cost function evaluations from a moldrug broker directory, run them and push the results back. "
+        "Use `broker: <directory>` on the yaml file of the simulation (or moldrug.broker.BrokerBackend).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        help='The broker directory',
+        dest='broker',
+        type=str)
+    parser.add_argument('--poll', help="Seconds between checks for new tasks", dest='poll', default=1, type=float)
+    parser.add_argument('--heartbeat', help="Seconds between heartbeats", dest='heartbeat', default=10, type=float)
+    parser.add_argument('--max-idle', help="Finish after this number of seconds without tasks",
+                        dest='max_idle', default=None, type=float)
+    parser.add_argument('--max-tasks', help="Finish after this number of tasks", dest='max_tasks', default=None, type=int)
+    args = parser.parse_args(argv)
+
+    from moldrug.broker import worker
+    print(f"moldrug worker {__version__} started at {datetime.datetime.now().strftime('%c')} on {args.broker}")
+    done = worker(args.broker, poll=args.poll, heartbeat=args.heartbeat, max_idle=args.max_idle, max_tasks=args.max_tasks)
+    print(f"moldrug worker finished at {datetime.datetime.now().strftime('%c')} after {done} tasks")
+
+
+def __score_cmd(argv: list):
+    """
+    Command line interface of :meth:`moldrug.score.score` (``moldrug score``).
+
+    Parameters
+    ----------
+    argv : list
+        The command line arguments after ``score``.
+    """
+    parser = argparse.ArgumentParser(
+        prog='moldrug score',
+        description="Score a library of molecules (SMILES or SDF, optionally gzip-compressed) with the cost function "
+        "(costfunc and costfunc_kwargs) of the first job of a moldrug yaml file. The results are streamed to a "
+        "csv, sdf (poses) or parquet output (by extension, .gz is accepted for csv and sdf).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(help='The configuration yaml file', dest='yaml_file', type=str)
+    parser.add_argument(help='The SMILES or SDF library', dest='input', type=str)
+    parser.add_argument('-o', '--output', help="Output file: .csv, .csv.gz, .sdf, .sdf.gz or .parquet",
+                        dest='output', required=True, type=str)
+    parser.add_argument("-f", "--fitness", help="The path to the user-custom fitness module",
+                        dest="fitness", default=None, type=str)
+    parser.add_argument('--njobs', help="Number of jobs or auto. By default the njobs of the yaml file or 1",
+                        dest='njobs', default=None, type=str)
+    parser.add_argument('--batch-size', help="Number of records processed at a time",
+                        dest='batch_size', default=1000, type=int)
+    parser.add_argument('--resume', help="Continue an interrupted run from the progress of the output",
+                        dest='resume', action='store_true')
+    args = parser.parse_args(argv)
+
+    import yaml
+    from rdkit import Chem
+
+    from moldrug.score import score
+
+    with open(args.yaml_file, 'r') as c:
+        configuration = yaml.safe_load(c)
+    MainConfig = configuration[list(configuration.keys())[0]]
+    costfunc_kwargs = MainConfig['costfunc_kwargs']
+    if 'constraint_ref' in costfunc_kwargs:
+        costfunc_kwargs['constraint_ref'] = Chem.MolFromMolFile(costfunc_kwargs['constraint_ref'])
+
+    njobs = args.njobs if args.njobs is not None else MainConfig.get('njobs', 1)
+    if njobs != 'auto':
+        njobs = int(njobs)
+
+    print(f"moldrug score {__version__} started at {datetime.datetime.now().strftime('%c')} on {args.input}")
+    progress = score(args.input, args.output, _get_costfunc(MainConfig['costfunc'], args.fitness), costfunc_kwargs,
+                     njobs=njobs, backend=_get_backend(MainConfig), batch_size=args.batch_size, resume=args.resume,
+                     randomseed=MainConfig.get('randomseed', None), fidelity=MainConfig.get('fidelity', None))
+    print(f"moldrug score finished at {datetime.datetime.now().strftime('%c')}: {progress['scored']} molecules "
+          f"scored, {progress['duplicates']} duplicates and {progress['invalid']} invalid. Results on {args.output}")
+    if 'promoted' in progress:
+        print(f"{progress['promoted']} molecules were scored with the production setting (fidelity).")
+
+
+def __prepare_maps_cmd(argv: list):
+    """
+    Command line interface of :meth:`moldrug.fitness.prepare_maps` (``moldrug prepare-maps``).
+
+    Parameters
+    ----------
+    argv : list
+        The command line arguments after ``prepare-maps``.
+    """
+    parser = argparse.ArgumentParser(
+        prog='moldrug prepare-maps',
+        description="Compute once the Vina affinity maps of the receptors and boxes of the cost function "
+        "(costfunc_kwargs) of the first job of a moldrug yaml file. The maps are stored on $MOLDRUG_CACHE/maps "
+        "(by default ~/.cache/moldrug/maps) and the dockings with the same receptor and box use them automatically.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(help='The configuration yaml file', dest='yaml_file', type=str)
+    parser.add_argument('--force', help="Compute the maps even if they are already in the cache",
+                        dest='force', action='store_true')
+    args = parser.parse_args(argv)
+
+    import yaml
+
+    from moldrug.fitness import prepare_maps
+
+    with open(args.yaml_file, 'r') as c:
+        configuration = yaml.safe_load(c)
+    costfunc_kwargs = configuration[list(configuration.keys())[0]]['costfunc_kwargs']
+    receptors = costfunc_kwargs['receptor_pdbqt_path']
+    boxcenters = costfunc_kwargs['boxcenter']
+    boxsizes = costfunc_kwargs['boxsize']
+    if isinstance(receptors, str):
+        receptors, boxcenters, boxsizes = [receptors], [boxcenters], [boxsizes]
+    for receptor, boxcenter, boxsize in zip(receptors, boxcenters, boxsizes):
+        prefix = prepare_maps(receptor, boxcenter, boxsize, vina_executable=costfunc_kwargs.get('vina_executable', 'vina'),
+                              force=args.force)
+        print(f"{receptor}: {prefix}")
+
+
 def __moldrug_cmd():
     """
     This function is only used in as part of the command line interface of moldrug.
     It makes possible to use moldrug form the command line. More detail help is available
-    from the command line `moldrug -h`.
+    from the command line `moldrug -h`. ``moldrug worker -h`` shows the help of the workers
+    ``moldrug score -h`` the help of the scoring of libraries and ``moldrug prepare-maps -h``
+    the help of the precomputed affinity maps.
 
     Raises
     ------
     NotImplementedError
-        In case that the type of the calculation differs from Local or GA (currently implementations)
+        In case that the type of the calculation differs from Local, GA or IslandGA (currently implementations)
     ValueError
-        In case that the user ask for followed jobs and Local is selected.
+        In case that the user ask for followed jobs and Local or IslandGA is selected.
     ValueError
         In case that a non-mutable or non-defined argument is given by the user on the follow jobs.
     """
+    if len(sys.argv) > 1 and sys.argv[1] == 'worker':
+        __worker_cmd(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == 'score':
+        __score_cmd(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == 'prepare-maps':
+        __prepare_maps_cmd(sys.argv[2:])
+        return
     parser = argparse.ArgumentParser(description=__doc__,
                                      formatter_class=argparse.RawTextHelpFormatter)
     parser.add_argument(
@@ -342,6 +527,7 @@ def __constraintconf_cmd():
     """
     Command line implementation for :meth:`moldrug.constraintconf.constraintconf`
     """
+    from moldrug import constraintconf
     parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
     parser.add_argument(
         "--pdb",
@@ -395,7 +581,33 @@ def __constraintconf_cmd():
         "If None, the RNG will not be seeded, by default None %(default)s",
         dest="seed",
         default=None,
-        type=Union[int, None],
+        type=int,
+    )
+    parser.add_argument(
+        "--njobs",
+        help="Number of processes or auto, by default %(default)s",
+        dest="njobs",
+        default='1',
+        type=str,
+    )
+    parser.add_argument(
+        "--batch-size",
+        help="Number of molecules processed at a time, by default %(default)s",
+        dest="batch_size",
+        default=1000,
+        type=int,
+    )
+    parser.add_argument(
+        "--unordered",
+        help="Write the molecules as they are finished instead of in the input order",
+        dest="unordered",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--resume",
+        help="Continue an interrupted run from the progress of the output",
+        dest="resume",
+        action="store_true",
     )
     args = parser.parse_args()
     constraintconf.constraintconf(
@@ -406,7 +618,11 @@ def __constraintconf_cmd():
         max_conf=args.max,
         rms=args.rms,
         bump=args.bump,
-        randomseed=args.seed)
+        randomseed=args.seed,
+        njobs=args.njobs if args.njobs == 'auto' else int(args.njobs),
+        batch_size=args.batch_size,
+        ordered=not args.unordered,
+        resume=args.resume)
 
 
 if __name__ == '__main__':
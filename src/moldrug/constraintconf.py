@@ -17,20 +17,39 @@ and the class ProteinLigandClashFilter:
     * Remove bio dependency, the clashes filter is implemented in clashes_present
     * Add documentation.
     * Fix handling of some possible exceptions.
+    * Cache the MCS and the core of the reference per process and add a timeout to the MCS search.
 """
+import hashlib
+import io
+import json
+import multiprocessing as mp
 import os
 from copy import deepcopy
-from typing import Optional, Union
+from itertools import islice
+from typing import Dict, Optional, Union
 
 import numpy as np
 from rdkit import Chem
 from rdkit.Chem import AllChem, rdFMCS
 # import warnings
-from tqdm import tqdm
 
 from moldrug import verbose
 from moldrug.utils import compressed_pickle
 
+# Per process caches of generate_conformers. The reference does not change along a simulation
+# and the same molecule is evaluated several times (receptors, fidelity tiers, seeding, ...)
+_CACHE_SIZE = 4096
+_mcs_cache = {}
+_core_cache = {}
+
+
+def _cache_set(cache: dict, key, value):
+    """Add an item to one of the caches, removing the oldest one if it is full"""
+    if len(cache) >= _CACHE_SIZE:
+        del cache[next(iter(cache))]
+    cache[key] = value
+    return value
+
 
 def duplicate_conformers(m: Chem.rdchem.Mol, new_conf_idx: int, rms_limit: float = 0.5) -> bool:
     """
@@ -59,9 +78,10 @@ def duplicate_conformers(m: Chem.rdchem.Mol, new_conf_idx: int, rms_limit: float
     return any(i < rms_limit for i in rmslist)
 
 
-def get_mcs(mol_one: Chem.rdchem.Mol, mol_two: Chem.rdchem.Mol) -> str:
+def get_mcs(mol_one: Chem.rdchem.Mol, mol_two: Chem.rdchem.Mol, timeout: int = 10) -> str:
     """
     Code to find the maximum common substructure between two molecules.
+    The results are cached per process based on the canonical SMILES of the molecules.
 
     Parameters
     ----------
@@ -69,20 +89,54 @@ def get_mcs(mol_one: Chem.rdchem.Mol, mol_two: Chem.rdchem.Mol) -> str:
         The first molecule.
     mol_two : Chem.rdchem.Mol
         The second molecule.
+    timeout : int, optional
+        Maximum time (seconds) of the MCS search. When it is reached,
+        the largest common substructure found so far is used, by default 10
 
     Returns
     -------
     str
         The SMILES string of the Maximum Common Substructure (MCS).
     """
+    key = (Chem.MolToSmiles(mol_one), Chem.MolToSmiles(mol_two), timeout)
+    if key in _mcs_cache:
+        return _mcs_cache[key]
     mcs_smarts = Chem.MolFromSmarts(
-        rdFMCS.FindMCS([mol_one, mol_two], completeRingsOnly=True, matchValences=True).smartsString)
+        rdFMCS.FindMCS([mol_one, mol_two], completeRingsOnly=True, matchValences=True, timeout=timeout).smartsString)
     mcs_smi = Chem.MolToSmiles(mcs_smarts)
     # Workaround in case of fails
     if not Chem.MolFromSmiles(mcs_smi):
         valid_atoms = mol_one.GetSubstructMatch(mcs_smarts)
         mcs_smi = Chem.MolFragmentToSmiles(mol_one, atomsToUse=valid_atoms)
-    return mcs_smi
+    return _cache_set(_mcs_cache, key, mcs_smi)
+
+
+def get_core(ref_mol: Chem.rdchem.Mol, ref_smi: str) -> Chem.rdchem.Mol:
+    """
+    Get the core of the reference molecule (the part that match ref_smi, with the reference coordinates)
+    used by :meth:`moldrug.constraintconf.generate_conformers` as constraint.
+    The cores are cached per process based on the reference (including its coordinates) and ref_smi.
+    The returned molecule is shared, it must not be modified.
+
+    Parameters
+    ----------
+    ref_mol : Chem.rdchem.Mol
+        Reference molecule with a conformation
+    ref_smi : str
+        The SMILES string of the part of ref_mol to keep
+
+    Returns
+    -------
+    Chem.rdchem.Mol
+        The core
+    """
+    key = (hashlib.sha1(ref_mol.ToBinary()).hexdigest(), ref_smi)
+    if key in _core_cache:
+        return _core_cache[key]
+    core_with_wildcards = AllChem.ReplaceSidechains(ref_mol, Chem.MolFromSmiles(ref_smi))
+    core = AllChem.DeleteSubstructs(core_with_wildcards, Chem.MolFromSmiles('*'))
+    core.UpdatePropertyCache()
+    return _cache_set(_core_cache, key, core)
 
 
 def gen_aligned_conf(mol: Chem.rdchem.Mol, ref_mol: Chem.rdchem.Mol,
@@ -129,7 +183,8 @@ def generate_conformers(mol: Chem.rdchem.Mol,
                         num_conf: int,
                         ref_smi: str = None,
                         minimum_conf_rms: Optional[float] = None,
-                        randomseed: Union[int, None] = None
+                        randomseed: Union[int, None] = None,
+                        mcs_timeout: int = 10,
                         ) -> Chem.rdchem.Mol:
     """
     Generate constrained conformers
@@ -151,6 +206,8 @@ def generate_conformers(mol: Chem.rdchem.Mol,
        Provide a seed for the random number generator so that
        the same coordinates can be obtained for a molecule on multiple runs.
        If None, the RNG will not be seeded, by default None
+    mcs_timeout : int, optional
+        Maximum time (seconds) of the MCS search (see :meth:`moldrug.constraintconf.get_mcs`), by default 10
 
     Returns
     -------
@@ -168,15 +225,13 @@ def generate_conformers(mol: Chem.rdchem.Mol,
         if not Chem.MolFromSmiles(ref_smi):
             raise ValueError("The provided ref_smi is not valid.")
     else:
-        ref_smi = get_mcs(mol, ref_mol)
+        ref_smi = get_mcs(mol, ref_mol, timeout=mcs_timeout)
         if not Chem.MolFromSmiles(ref_smi):
             raise ValueError("generate_conformers fails generating ref_smi based on the MCS between mol and ref_mol")
 
     try:
         # Creating core of reference ligand #
-        core_with_wildcards = AllChem.ReplaceSidechains(ref_mol, Chem.MolFromSmiles(ref_smi))
-        core1 = AllChem.DeleteSubstructs(core_with_wildcards, Chem.MolFromSmiles('*'))
-        core1.UpdatePropertyCache()
+        core1 = get_core(ref_mol, ref_smi)
 
         # Add Hs so that conf gen is improved
         mol.RemoveAllConformers()
@@ -282,21 +337,81 @@ class ProteinLigandClashFilter:
         return False
 
 
+# Reference, fixed SMILES and clash filter of constraintconf, loaded once per worker by _init_constraintconf
+_constraintconf_setup = {}
+
+
+def _init_constraintconf(pdb: str, fix: str, max_conf: int, rms: float, bump: float,
+                         randomseed: Union[int, None]):
+    """Load the reference and the protein of :meth:`moldrug.constraintconf.constraintconf` on the current process"""
+    ref = Chem.MolFromMolFile(fix)
+    _constraintconf_setup.update({
+        'ref': ref,
+        'ref_smi': Chem.MolToSmiles(ref),
+        'clash_filter': ProteinLigandClashFilter(pdb, distance=bump),
+        'max_conf': max_conf,
+        'rms': rms,
+        'randomseed': randomseed,
+    })
+
+
+def _constraintconf_mol(args: tuple) -> tuple:
+    """Generate the conformers of one molecule of :meth:`moldrug.constraintconf.constraintconf`.
+    It is defined on the top level of the module in order to be picklable by multiprocessing.
+
+    Parameters
+    ----------
+    args : tuple
+        (index, name, mol)
+
+    Returns
+    -------
+    tuple
+        (index, number of conformers, SDF text of the conformers)
+    """
+    index, name, mol = args
+    setup = _constraintconf_setup
+    mol.SetProp('_Name', name)
+    # generate conformers
+    out_mol = generate_conformers(mol, setup['ref'],
+                                  setup['max_conf'],
+                                  ref_smi=setup['ref_smi'],
+                                  minimum_conf_rms=setup['rms'],
+                                  randomseed=setup['randomseed'])
+
+    # remove conformers that clash with the protein
+    clashIds = [conf.GetId() for conf in out_mol.GetConformers() if setup['clash_filter'](conf)]
+    _ = [out_mol.RemoveConformer(clashId) for clashId in clashIds]
+
+    # write out the surviving conformers
+    sio = io.StringIO()
+    with Chem.SDWriter(sio) as writer:
+        for conf in out_mol.GetConformers():
+            writer.write(out_mol, confId=conf.GetId())
+    return index, out_mol.GetNumConformers(), sio.getvalue()
+
+
 def constraintconf(pdb: str, smi: str, fix: str, out: str, max_conf: int = 25, rms: float = 0.01,
-                   bump: float = 1.5, randomseed: Union[int, None] = None):
+                   bump: float = 1.5, randomseed: Union[int, None] = None, njobs: Union[int, str] = 1,
+                   batch_size: int = 1000, ordered: bool = True, resume: bool = False) -> Dict:
     """
     It generates several conformations in the binding pocket with a specified constraint.
 
+    The molecules are read and processed in batches, so the memory does not grow with the size of the input.
+    With ``njobs > 1`` every worker loads the protein and the reference once. After every batch the input offset
+    and the output size are saved on ``{out}.progress``; with resume, the output is truncated to the last
+    finished batch and the generation continues from its offset.
+
     Parameters
     ----------
     pdb : str
         Protein pdb file
     smi : str
-        Input SMILES file name
+        Input SMILES file name (or SDF), optionally gzip-compressed (see :meth:`moldrug.score.read_molecules`)
     fix : str
         File with fixed piece of the molecule
     out : str
-        Output file name
+        Output file name (.sdf or .sdf.gz)
     max_conf : int, optional
         Maximum number of conformers to generate, by default 25
     rms : float, optional
@@ -307,29 +422,72 @@ def constraintconf(pdb: str, smi: str, fix: str, out: str, max_conf: int = 25, r
        Provide a seed for the random number generator so that
        the same coordinates can be obtained for a molecule on multiple runs.
        If None, the RNG will not be seeded, by default None
-    """
+    njobs : Union[int, str], optional
+        Number of processes or 'auto' (all the available CPUs, see :meth:`moldrug.utils.available_cpus`),
+        by default 1
+    batch_size : int, optional
+        Number of molecules read, processed and written at a time, by default 1000
+    ordered : bool, optional
+        If True the molecules are written in the order of the input, if not as they are finished, by default True
+    resume : bool, optional
+        Continue from the progress saved in ``{out}.progress``. If False, the output is overwritten, by default False
 
-    ref = Chem.MolFromMolFile(fix)
-    suppl = Chem.SmilesMolSupplier(smi, titleLine=False)
-    writer = Chem.SDWriter(out)
-
-    clash_filter = ProteinLigandClashFilter(pdb, distance=bump)
-
-    for mol in tqdm(suppl):
-        # generate conformers
-        out_mol = generate_conformers(mol, ref,
-                                      max_conf,
-                                      ref_smi=Chem.MolToSmiles(ref),
-                                      minimum_conf_rms=rms,
-                                      randomseed=randomseed)
-
-        # remove conformers that clash with the protein
-        clashIds = [conf.GetId() for conf in out_mol.GetConformers() if clash_filter(conf)]
-        _ = [out_mol.RemoveConformer(clashId) for clashId in clashIds]
-
-        # write out the surviving conformers
-        for conf in out_mol.GetConformers():
-            writer.write(out_mol, confId=conf.GetId())
+    Returns
+    -------
+    Dict
+        The progress: input offset, output size and the number of molecules with conformers (written),
+        without conformers (failed) and not valid (invalid)
+    """
+    from tqdm import tqdm
+
+    from moldrug.score import _open, _write_json, read_molecules
+    from moldrug.utils import available_cpus
+
+    if njobs == 'auto':
+        njobs = available_cpus()
+    progress_path = f"{out}.progress"
+    progress = {'input': os.path.abspath(smi), 'offset': 0, 'size': 0, 'written': 0, 'failed': 0, 'invalid': 0}
+    if resume and os.path.isfile(progress_path):
+        with open(progress_path, 'r') as f:
+            progress.update(json.load(f))
+        print(f"Resuming from the record {progress['offset']} of {smi}.")
+    with open(out, 'ab') as f:
+        f.truncate(progress['size'])
+
+    initargs = (pdb, fix, max_conf, rms, bump, randomseed)
+    if njobs > 1:
+        pool = mp.Pool(njobs, initializer=_init_constraintconf, initargs=initargs)
+        imap = pool.imap if ordered else pool.imap_unordered
+    else:
+        pool = None
+        _init_constraintconf(*initargs)
+        imap = map
+    records = read_molecules(smi, offset=progress['offset'])
+    try:
+        with tqdm(initial=progress['offset'], unit='mol') as bar:
+            while True:
+                batch = list(islice(records, batch_size))
+                if not batch:
+                    break
+                valid = [record for record in batch if record[2] is not None]
+                progress['invalid'] += len(batch) - len(valid)
+                # Every batch is a new gzip member, so the file can be truncated between batches
+                with _open(out, 'a') as f:
+                    for _, num_conf, text in imap(_constraintconf_mol, valid):
+                        f.write(text)
+                        progress['written' if num_conf else 'failed'] += 1
+                        bar.update()
+                with open(out, 'ab') as f:
+                    os.fsync(f.fileno())
+                bar.update(len(batch) - len(valid))
+                progress['offset'] = batch[-1][0] + 1
+                progress['size'] = os.path.getsize(out)
+                _write_json(progress_path, progress)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    return progress
 
 
 if __name__ == '__main__':
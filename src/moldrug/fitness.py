@@ -1,17 +1,21 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import glob
+import hashlib
+import json
 import os
-from copy import deepcopy
-from typing import Dict, List, Union
+import shutil
+import subprocess
+import time
+from inspect import signature
+from typing import Callable, Dict, List, Union
 
 import numpy as np
 # from warnings import import warn
-from meeko import (MoleculePreparation, PDBQTMolecule, PDBQTWriterLegacy,
-                   RDKitMolCreate)
 from rdkit import Chem
 from rdkit.Chem import QED, Descriptors
 
-from moldrug import constraintconf, utils, verbose
+from moldrug import utils, verbose
 
 
 def __get_default_desirability(multireceptor: bool = False) -> dict:
@@ -140,6 +144,7 @@ def __get_mol_cost(mol: Chem.rdchem.Mol,
     RuntimeError
         Inconsistences on user definition of the desirability function parameters.
     """
+    from meeko import PDBQTMolecule, PDBQTWriterLegacy, RDKitMolCreate
 
     if desirability is None:
         desirability = __get_default_desirability(multireceptor=False)
@@ -157,74 +162,332 @@ def __get_mol_cost(mol: Chem.rdchem.Mol,
     sascorer = utils.import_sascorer()
     # multicriteria optimization,Optimization of Several Response Variables
 
-    # Getting estimate of drug-likness
-    results['qed'] = QED.weights_mean(Chem.RemoveHs(mol))
+    with utils.stage('sa_qed'):
+        # Getting estimate of drug-likness
+        results['qed'] = QED.weights_mean(Chem.RemoveHs(mol))
 
-    # Getting synthetic accessibility score
-    results['sa_score'] = sascorer.calculateScore(Chem.RemoveHs(mol))
+        # Getting synthetic accessibility score
+        results['sa_score'] = sascorer.calculateScore(Chem.RemoveHs(mol))
 
     # Getting vina_score and update pdbqt
     # Making the ligand pdbqt
-    preparator = MoleculePreparation()
-    mol_setups = preparator.prepare(Chem.AddHs(mol, addCoords=True))
-    with open(os.path.join(os.path.join(wd, 'ligand.pdbqt')), 'w') as f:
-        f.write(PDBQTWriterLegacy.write_string(mol_setups[0])[0])
+    with utils.stage('meeko'):
+        mol_setups = utils._meeko_preparator().prepare(Chem.AddHs(mol, addCoords=True))
+        with open(os.path.join(os.path.join(wd, 'ligand.pdbqt')), 'w') as f:
+            f.write(PDBQTWriterLegacy.write_string(mol_setups[0])[0])
 
     # If the vina_executable is a path
     if os.path.isfile(vina_executable):
         vina_executable = os.path.abspath(vina_executable)
 
     # Creating the command line for vina
-    cmd_vina_str = f"{vina_executable} --receptor {receptor_pdbqt_path}"\
-        f" --center_x {boxcenter[0]} --center_y {boxcenter[1]} --center_z {boxcenter[2]}"\
-        f" --size_x {boxsize[0]} --size_y {boxsize[1]} --size_z {boxsize[2]}"\
-        f" --ligand {os.path.join(wd, 'ligand.pdbqt')}"
+    vina_args = [vina_executable, '--receptor', receptor_pdbqt_path,
+                 '--center_x', boxcenter[0], '--center_y', boxcenter[1], '--center_z', boxcenter[2],
+                 '--size_x', boxsize[0], '--size_y', boxsize[1], '--size_z', boxsize[2],
+                 '--ligand', os.path.join(wd, 'ligand.pdbqt')]
     if docking_type == 'score_only':
-        cmd_vina_str += " --score_only"
+        vina_args += ['--score_only']
     elif docking_type == 'local_only':
-        cmd_vina_str += f" --local_only --out {os.path.join(wd, 'ligand_out.pdbqt')}"
+        vina_args += ['--local_only', '--out', os.path.join(wd, 'ligand_out.pdbqt')]
     elif docking_type == 'free':
-        cmd_vina_str += f" --out {os.path.join(wd, 'ligand_out.pdbqt')}"
+        vina_args += ['--out', os.path.join(wd, 'ligand_out.pdbqt')]
     else:
         raise ValueError(f"docking_type must be one of: score_only, local_only or free. {docking_type} was given.")
-    cmd_vina_result = utils.run(cmd_vina_str)
     if docking_type in ['score_only', 'local_only']:
-        for line in cmd_vina_result.stdout.split('\n'):
-            # Check over different vina versions
-            if line.startswith('Affinity'):
-                results['vina_score'] = float(line.split()[1])
-                break
-            elif 'Estimated Free Energy of Binding' in line:
-                results['vina_score'] = float(line.split(':')[1].split()[0])
-                break
+        affinity = _VinaAffinity()
+        with utils.stage('vina'):
+            utils.launch(vina_args, on_line=affinity, capture_stdout=False)
+        results['vina_score'] = affinity.score
     else:
+        with utils.stage('vina'):
+            utils.launch(vina_args, capture_stdout=False)
         best_energy = utils.VINA_OUT(os.path.join(wd, 'ligand_out.pdbqt')).BestEnergy()
         results['vina_score'] = best_energy.freeEnergy
         pdbqt_mol = PDBQTMolecule.from_file(os.path.join(wd, 'ligand_out.pdbqt'), skip_typing=True)
         with Chem.SDWriter(os.path.join(wd, 'ligand_out.sdf')) as w:
             w.write(RDKitMolCreate.from_pdbqt_mol(pdbqt_mol)[0])
     # Getting the desirability
-    base = 1
-    exponent = 0
-    for variable in desirability:
-        for key in desirability[variable]:
-            if key == 'w':
-                w = desirability[variable][key]
-            elif key in utils.DerringerSuichDesirability():
-                d = utils.DerringerSuichDesirability()[key](results[variable], **desirability[variable][key])
-            else:
-                raise RuntimeError(f"Inside the desirability dictionary you provided for the variable = {variable}"
-                                   f"a non implemented key = {key}. Only are possible: 'w' (standing for weight)"
-                                   "and any possible Derringer-Suich desirability function: "
-                                   f"{utils.DerringerSuichDesirability().keys()}")
-        base *= d**w
-        exponent += w
+    with utils.stage('desirability'):
+        base = 1
+        exponent = 0
+        for variable in desirability:
+            for key in desirability[variable]:
+                if key == 'w':
+                    w = desirability[variable][key]
+                elif key in utils.DerringerSuichDesirability():
+                    d = utils.DerringerSuichDesirability()[key](results[variable], **desirability[variable][key])
+                else:
+                    raise RuntimeError(f"Inside the desirability dictionary you provided for the variable = {variable}"
+                                       f"a non implemented key = {key}. Only are possible: 'w' (standing for weight)"
+                                       "and any possible Derringer-Suich desirability function: "
+                                       f"{utils.DerringerSuichDesirability().keys()}")
+            base *= d**w
+            exponent += w
 
-    # We are using a geometric mean. And because we are minimizing we have to return
-    results['desirability'] = 1 - base**(1 / exponent)
+        # We are using a geometric mean. And because we are minimizing we have to return
+        results['desirability'] = 1 - base**(1 / exponent)
     return results
 
 
+class _VinaAffinity:
+    """Parser of the standard output of Vina (used as on_line of :meth:`moldrug.utils.launch`).
+    It keeps the first reported affinity on the attribute score (np.inf if there is not any).
+    """
+    def __init__(self) -> None:
+        self.score = np.inf
+
+    def __call__(self, line: str):
+        if self.score != np.inf:
+            return
+        # Check over different vina versions
+        if line.startswith('Affinity'):
+            self.score = float(line.split()[1])
+        elif 'Estimated Free Energy of Binding' in line:
+            self.score = float(line.split(':')[1].split()[0])
+
+
+def _run_vina(args: List[str], timeout: Union[float, None] = None, deadline: Union[float, None] = None,
+              resources: Union[Dict, None] = None, on_line: Union[None, Callable] = None):
+    """Run Vina with the smallest of timeout and the remaining time until deadline.
+
+    Parameters
+    ----------
+    args : List[str]
+        The Vina argument vector
+    timeout : Union[float, None], optional
+        Maximum wall-clock time (seconds), by default None
+    deadline : Union[float, None], optional
+        Absolute time (as :func:`time.time`), by default None
+    resources : Union[Dict, None], optional
+        Keywords cpus, nice and/or memory_limit of :meth:`moldrug.utils.launch`, by default None
+    on_line : Union[None, Callable], optional
+        Parser of the standard output, by default None
+
+    Returns
+    -------
+    subprocess.CompletedProcess
+        The output of :meth:`moldrug.utils.launch` (the standard output is not kept)
+
+    Raises
+    ------
+    subprocess.TimeoutExpired
+        If the budget is exceeded (or the deadline already passed).
+    """
+    if deadline is not None:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise subprocess.TimeoutExpired(args, 0)
+        timeout = remaining if timeout is None else min(timeout, remaining)
+    if resources is None:
+        resources = dict()
+    with utils.stage('vina'):
+        return utils.launch(args, timeout=timeout, on_line=on_line, capture_stdout=False, **resources)
+
+
+def _maps_prefix(receptor_pdbqt_path: str, boxcenter: List[float], boxsize: List[float],
+                 cache: Union[None, str] = None) -> str:
+    """Prefix of the cached affinity maps of a receptor and box (content-addressed:
+    the directory is the hash of the receptor content and the box).
+
+    Parameters
+    ----------
+    receptor_pdbqt_path : str
+        The receptor
+    boxcenter : List[float]
+        Center of the box
+    boxsize : List[float]
+        Size of the box
+    cache : Union[None, str], optional
+        Directory of the maps, by default None (``moldrug.utils.cache_dir('maps')``)
+
+    Returns
+    -------
+    str
+        The prefix (``--maps`` of Vina).
+    """
+    box = (tuple(float(x) for x in boxcenter), tuple(float(x) for x in boxsize))
+    digest = hashlib.sha1(f"{utils._file_digest(receptor_pdbqt_path)}{box}".encode()).hexdigest()[:16]
+    root = os.path.splitext(os.path.basename(receptor_pdbqt_path))[0]
+    return os.path.join(cache or utils.cache_dir('maps'), digest, root)
+
+
+def prepared_maps(receptor_pdbqt_path: str, boxcenter: List[float], boxsize: List[float],
+                  cache: Union[None, str] = None) -> Union[None, str]:
+    """Look for the affinity maps of the receptor and box written by :meth:`moldrug.fitness.prepare_maps`.
+
+    Parameters
+    ----------
+    receptor_pdbqt_path : str
+        The receptor
+    boxcenter : List[float]
+        Center of the box
+    boxsize : List[float]
+        Size of the box
+    cache : Union[None, str], optional
+        Directory of the maps, by default None (``moldrug.utils.cache_dir('maps')``)
+
+    Returns
+    -------
+    Union[None, str]
+        The prefix of the maps or None if they were not prepared.
+    """
+    try:
+        prefix = _maps_prefix(receptor_pdbqt_path, boxcenter, boxsize, cache=cache)
+    except OSError:
+        return None
+    return prefix if os.path.isfile(f"{prefix}.moldrug.json") else None
+
+
+def prepare_maps(receptor_pdbqt_path: str, boxcenter: List[float], boxsize: List[float],
+                 vina_executable: str = 'vina', cache: Union[None, str] = None, force: bool = False,
+                 timeout: Union[float, None] = None) -> str:
+    """Compute once the Vina affinity maps of a receptor and box (``--write_maps``) and store them
+    in a content-addressed cache. :meth:`moldrug.fitness._vinadock` uses them automatically (``--maps``) instead of
+    computing the grids on every docking when receptor_pdbqt_path, boxcenter and boxsize match
+    (and ad4map is not set). The maps of the AutoDock4 scoring function must be computed with AutoGrid4 and passed
+    with ad4map as before. It is also available from the command line: ``moldrug prepare-maps config.yml``.
+
+    Parameters
+    ----------
+    receptor_pdbqt_path : str
+        The receptor
+    boxcenter : List[float]
+        Center of the box
+    boxsize : List[float]
+        Size of the box
+    vina_executable : str, optional
+        The Vina executable (version 1.2 or later), by default 'vina'
+    cache : Union[None, str], optional
+        Directory of the maps, by default None (``moldrug.utils.cache_dir('maps')``)
+    force : bool, optional
+        Compute the maps even if they are already in the cache, by default False
+    timeout : Union[float, None], optional
+        Maximum wall-clock time (seconds) of Vina, by default None
+
+    Returns
+    -------
+    str
+        The prefix of the maps.
+
+    Raises
+    ------
+    RuntimeError
+        If Vina fails or it does not write any map.
+    """
+    prefix = _maps_prefix(receptor_pdbqt_path, boxcenter, boxsize, cache=cache)
+    if not force and os.path.isfile(f"{prefix}.moldrug.json"):
+        return prefix
+    maps_dir = os.path.dirname(prefix)
+    # The maps are written in a temporal directory that replaces maps_dir once they are complete
+    tmp_dir = f"{maps_dir}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_prefix = os.path.join(tmp_dir, os.path.basename(prefix))
+    if os.path.isfile(vina_executable):
+        vina_executable = os.path.abspath(vina_executable)
+    args = [vina_executable, '--receptor', os.path.abspath(receptor_pdbqt_path),
+            '--center_x', boxcenter[0], '--center_y', boxcenter[1], '--center_z', boxcenter[2],
+            '--size_x', boxsize[0], '--size_y', boxsize[1], '--size_z', boxsize[2],
+            '--write_maps', tmp_prefix, '--force_even_voxels']
+    try:
+        _run_vina(args, timeout=timeout)
+        files = sorted(os.path.basename(path) for path in glob.glob(f"{tmp_prefix}*.map"))
+        if not files:
+            raise RuntimeError(f"Vina did not write any map with: {' '.join(map(str, args))}")
+        with open(f"{tmp_prefix}.moldrug.json", 'w') as f:
+            json.dump({'receptor_pdbqt_path': os.path.abspath(receptor_pdbqt_path), 'boxcenter': list(boxcenter),
+                       'boxsize': list(boxsize), 'files': files}, f)
+        if force and os.path.isdir(maps_dir):
+            shutil.rmtree(maps_dir)
+        try:
+            os.replace(tmp_dir, maps_dir)
+        except OSError:
+            # Prepared at the same time by other process
+            if not os.path.isfile(f"{prefix}.moldrug.json"):
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return prefix
+
+
+def _pose_to_mol(pdbqt: str) -> Union[Chem.rdchem.Mol, None]:
+    """Convert a docked pose to a RDKit molecule with its coordinates.
+
+    Parameters
+    ----------
+    pdbqt : str
+        The pdbqt string of the pose (e.g. the pdbqt attribute of an evaluated Individual)
+
+    Returns
+    -------
+    Union[Chem.rdchem.Mol, None]
+        The molecule or None if the pdbqt is not valid (e.g. 'VinaFailed').
+    """
+    from meeko import PDBQTMolecule, RDKitMolCreate
+    try:
+        mol = RDKitMolCreate.from_pdbqt_mol(PDBQTMolecule(pdbqt, skip_typing=True))[0]
+    except Exception:
+        return None
+    return mol
+
+
+def _seed_pose(Individual: utils.Individual, i: Union[int, None] = None) -> Union[tuple, None]:
+    """Get the seed pose of the parent-pose seeding (the attribute seed_pose set by :meth:`moldrug.utils.GA`).
+
+    Parameters
+    ----------
+    Individual : utils.Individual
+        The individual to dock
+    i : Union[int, None], optional
+        Index of the receptor for the multi receptor cost functions, by default None
+
+    Returns
+    -------
+    Union[tuple, None]
+        (pdbqt, vina score) or None if the individual does not have a seed pose.
+    """
+    seed_pose = getattr(Individual, 'seed_pose', None)
+    if seed_pose is None:
+        return None
+    pdbqt, vina_score = seed_pose
+    if i is None:
+        return None if isinstance(pdbqt, list) else seed_pose
+    if not isinstance(pdbqt, list):
+        return None
+    return pdbqt[i], vina_score[i]
+
+
+def _conformer_pdbqts(mol: Chem.rdchem.Mol) -> List[tuple]:
+    """Render the pdbqt string of every conformer of a molecule.
+
+    The molecule is prepared with Meeko only once; the coordinates of the rest of the conformers
+    are set on that setup. When Meeko adds pseudo atoms (e.g. to open a macrocycle) their positions
+    depend on the conformer, so the molecule is prepared again for each conformer.
+
+    Parameters
+    ----------
+    mol : Chem.rdchem.Mol
+        A molecule with conformers (hydrogens are added with coordinates)
+
+    Returns
+    -------
+    List[tuple]
+        A list of (conformer id, pdbqt string).
+    """
+    from meeko import PDBQTWriterLegacy
+    preparator = utils._meeko_preparator()
+    mol = Chem.AddHs(mol, addCoords=True)
+    pdbqts = []
+    setup = None
+    for conf in mol.GetConformers():
+        if setup is None or len(setup.coord) != mol.GetNumAtoms():
+            setup = preparator.prepare(Chem.Mol(mol, confId=conf.GetId()))[0]
+        else:
+            for atom_idx, xyz in enumerate(conf.GetPositions()):
+                setup.coord[atom_idx] = xyz
+        pdbqts.append((conf.GetId(), PDBQTWriterLegacy.write_string(setup)[0]))
+    return pdbqts
+
+
 def _vinadock(
         Individual: utils.Individual,
         wd: str = '.vina_jobs',
@@ -242,7 +505,15 @@ def _vinadock(
         constraint_ref: Chem.rdchem.Mol = None,
         constraint_receptor_pdb_path: str = None,
         constraint_num_conf: int = 100,
-        constraint_minimum_conf_rms: int = 0.01):
+        constraint_minimum_conf_rms: int = 0.01,
+        constraint_mcs_timeout: int = 10,
+        timeout: Union[float, None] = None,
+        timeout_retries: int = 1,
+        deadline: Union[float, None] = None,
+        vina_resources: Union[Dict, None] = None,
+        receptor_margin: Union[float, None] = None,
+        pose_seeding: Union[Dict, None] = None,
+        seed_pose: Union[tuple, None] = None):
     """
     This function is intend to be used to perform docking
     for all the cost functions implemented on :mod:`moldrug.fitness`
@@ -263,7 +534,8 @@ def _vinadock(
     vina_seed : Union[int, None], optional
         Explicit random seed used by vina or the constraint docking routine, by default None
     receptor_pdbqt_path : str, optional
-        Where the receptor pdbqt file is located, by default None
+        Where the receptor pdbqt file is located, by default None. If its maps for the box were prepared with
+        :meth:`moldrug.fitness.prepare_maps`, Vina uses them (``--maps``) instead of computing the grids.
     boxcenter : List[float], optional
         A list of three floats with the definition of the center of the box
         in angstrom for docking (x, y, z), by default None
@@ -293,12 +565,39 @@ def _vinadock(
         Maximum number of conformer to be generated internally by moldrug , by default 100
     constraint_minimum_conf_rms : int, optional
         RMS to filter duplicate conformers, by default 0.01
+    constraint_mcs_timeout : int, optional
+        Timeout (seconds) of the maximum common substructure search between the molecule and constraint_ref,
+        by default 10 (see :meth:`moldrug.constraintconf.generate_conformers`)
+    timeout : Union[float, None], optional
+        Maximum wall-clock time (seconds) of every Vina run. The hung processes are killed, by default None
+    timeout_retries : int, optional
+        How many times the free docking is repeated with half of the exhaustiveness after a timeout, by default 1
+    deadline : Union[float, None], optional
+        Absolute time (as :func:`time.time`) after which no Vina run is started or continued.
+        It is set by :meth:`moldrug.utils.GA` when generation_timeout is used, by default None
+    vina_resources : Union[Dict, None], optional
+        Resource limits of every Vina process. Keywords cpus (CPU affinity), nice and memory_limit (bytes)
+        of :meth:`moldrug.utils.launch`, by default None
+    receptor_margin : Union[float, None], optional
+        If provided, receptor_pdbqt_path and constraint_receptor_pdb_path are replaced by their cropped version to
+        the box plus receptor_margin angstrom (see :meth:`moldrug.utils.crop_receptor`). The cropped files are
+        cached, by default None
+    pose_seeding : Union[Dict, None], optional
+        Parent-pose seeding of the free docking (only used if seed_pose is provided). The molecule is embedded
+        with the coordinates of its maximum common substructure with seed_pose fixed
+        (see :meth:`moldrug.constraintconf.generate_conformers`) and the conformers are only locally optimized
+        (local_only). The free docking is performed only if the seeded vina score is worse than the vina score of
+        seed_pose plus tolerance. The keys are num_conf (number of seeded conformers, by default 10) and
+        tolerance (kcal/mol, by default 1.0). The attribute seeded of Individual is set to True if the seeded pose
+        is kept, by default None
+    seed_pose : Union[tuple, None], optional
+        (pdbqt, vina score) of the docked pose of the parent (see :meth:`moldrug.utils.GA`), by default None
 
     Returns
     -------
     tuple
         A tuple with two elements:
-        (vina score, pdbqt string)
+        (vina score, pdbqt string). If the time budget is exceeded: (:data:`moldrug.utils.VINA_TIMEOUT_SCORE`, 'VinaTimeout')
 
     Raises
     ------
@@ -306,6 +605,7 @@ def _vinadock(
         Inappropriate constraint_type. must be local_only or score_only.
         Only will be checked if constraint is set to True.
     """
+    from moldrug import constraintconf
 
     constraint_type = constraint_type.lower()
 
@@ -316,40 +616,56 @@ def _vinadock(
     if not os.path.exists(wd):
         os.makedirs(wd)
 
+    # Precomputed affinity maps (see prepare_maps)
+    maps = None
+    if not ad4map and receptor_pdbqt_path:
+        maps = prepared_maps(receptor_pdbqt_path, boxcenter, boxsize)
+
+    # Cropping the receptor to the box
+    if receptor_margin is not None and not ad4map:
+        if not maps:
+            receptor_pdbqt_path = utils.crop_receptor(receptor_pdbqt_path, boxcenter, boxsize, margin=receptor_margin)
+        if constraint_receptor_pdb_path:
+            constraint_receptor_pdb_path = utils.crop_receptor(
+                constraint_receptor_pdb_path, boxcenter, boxsize, margin=receptor_margin)
+
     # Converting to absolute path in case that vina_executable points to a file
     if os.path.isfile(vina_executable):
         vina_executable = os.path.abspath(vina_executable)
     # TODO Add Check on the vina executable
-    # Creating the command line for vina
-    cmd_vina_str = f"{vina_executable}"\
-        f" --cpu {ncores} --exhaustiveness {exhaustiveness} --num_modes {num_modes}"
+    # Creating the argument vector for vina. The exhaustiveness is added on every run (it is lowered on the retries)
+    vina_args = [vina_executable, '--cpu', ncores, '--num_modes', num_modes]
 
     if ad4map:
-        cmd_vina_str += f" --scoring ad4 --maps {os.path.abspath(ad4map)}"
+        vina_args += ['--scoring', 'ad4', '--maps', os.path.abspath(ad4map)]
+    elif maps:
+        vina_args += ['--maps', maps]
     else:
-        cmd_vina_str += f" --receptor {os.path.abspath(receptor_pdbqt_path)}"\
-            f" --center_x {boxcenter[0]} --center_y {boxcenter[1]} --center_z {boxcenter[2]}"\
-            f" --size_x {boxsize[0]} --size_y {boxsize[1]} --size_z {boxsize[2]}"\
+        vina_args += ['--receptor', os.path.abspath(receptor_pdbqt_path),
+                      '--center_x', boxcenter[0], '--center_y', boxcenter[1], '--center_z', boxcenter[2],
+                      '--size_x', boxsize[0], '--size_y', boxsize[1], '--size_z', boxsize[2]]
 
     if vina_seed is not None:
-        cmd_vina_str += f" --seed {vina_seed}"
+        vina_args += ['--seed', vina_seed]
 
     if constraint:
         # Check for the correct type of docking
         if constraint_type in ['score_only', 'local_only']:
-            cmd_vina_str += f" --{constraint_type}"
+            vina_args += [f"--{constraint_type}"]
         else:
             raise Exception("constraint_type only admit two possible values: score_only, local_only.")
 
         # Generate constrained conformer
         try:
-            out_mol = constraintconf.generate_conformers(
-                mol=Chem.RemoveHs(Individual.mol),
-                ref_mol=Chem.RemoveHs(constraint_ref),
-                num_conf=constraint_num_conf,
-                # ref_smi=Chem.MolToSmiles(constraint_ref),
-                minimum_conf_rms=constraint_minimum_conf_rms,
-                randomseed=vina_seed)
+            with utils.stage('confgen'):
+                out_mol = constraintconf.generate_conformers(
+                    mol=Chem.RemoveHs(Individual.mol),
+                    ref_mol=Chem.RemoveHs(constraint_ref),
+                    num_conf=constraint_num_conf,
+                    # ref_smi=Chem.MolToSmiles(constraint_ref),
+                    minimum_conf_rms=constraint_minimum_conf_rms,
+                    mcs_timeout=constraint_mcs_timeout,
+                    randomseed=vina_seed)
         except Exception as e:
             if verbose:
                 print(f"constraintconf.generate_conformers fails inside moldrug.fitness._vinadock with {e}")
@@ -358,32 +674,35 @@ def _vinadock(
         # Remove conformers that clash with the protein in case of score_only,
         # for local_only vina will handle the clash.
         if constraint_type == 'score_only':
-            clash_filter = constraintconf.ProteinLigandClashFilter(protein_pdbpath=constraint_receptor_pdb_path,
-                                                                   distance=1.5)  # TODO is this a good threshold? 
-            clashIds = [conf.GetId() for conf in out_mol.GetConformers() if clash_filter(conf)]
-            _ = [out_mol.RemoveConformer(clashId) for clashId in clashIds]
+            with utils.stage('confgen'):
+                clash_filter = constraintconf.ProteinLigandClashFilter(protein_pdbpath=constraint_receptor_pdb_path,
+                                                                       distance=1.5)  # TODO is this a good threshold?
+                clashIds = [conf.GetId() for conf in out_mol.GetConformers() if clash_filter(conf)]
+                _ = [out_mol.RemoveConformer(clashId) for clashId in clashIds]
 
         # Check first if some valid conformer exist
         if len(out_mol.GetConformers()):
             vina_score_pdbqt = (np.inf, None)
-            for conf in out_mol.GetConformers():
-                temp_mol = deepcopy(out_mol)
-                temp_mol.RemoveAllConformers()
-                temp_mol.AddConformer(out_mol.GetConformer(conf.GetId()), assignId=True)
-
-                preparator = MoleculePreparation()
-                mol_setups = preparator.prepare(Chem.AddHs(temp_mol, addCoords=True))
-                with open(os.path.join(wd, f'{Individual.idx}_conf_{conf.GetId()}.pdbqt'), 'w') as f:
-                    f.write(PDBQTWriterLegacy.write_string(mol_setups[0])[0])
+            timed_out = False
+            with utils.stage('meeko'):
+                conf_pdbqts = _conformer_pdbqts(out_mol)
+            for conf_id, ligand_pdbqt in conf_pdbqts:
+                with open(os.path.join(wd, f'{Individual.idx}_conf_{conf_id}.pdbqt'), 'w') as f:
+                    f.write(ligand_pdbqt)
 
-                # Make a copy to the vina command string and add the out (is needed) and ligand options
-                cmd_vina_str_tmp = cmd_vina_str[:]
-                cmd_vina_str_tmp += f" --ligand {os.path.join(wd, f'{Individual.idx}_conf_{conf.GetId()}.pdbqt')}"
+                # Make a copy to the vina arguments and add the out (is needed) and ligand options
+                vina_args_tmp = vina_args + ['--exhaustiveness', exhaustiveness,
+                                             '--ligand', os.path.join(wd, f'{Individual.idx}_conf_{conf_id}.pdbqt')]
 
                 if constraint_type == 'local_only':
-                    cmd_vina_str_tmp += f" --out {os.path.join(wd, f'{Individual.idx}_conf_{conf.GetId()}_out.pdbqt')}"
+                    vina_args_tmp += ['--out', os.path.join(wd, f'{Individual.idx}_conf_{conf_id}_out.pdbqt')]
+                affinity = _VinaAffinity()
                 try:
-                    cmd_vina_result = utils.run(cmd_vina_str_tmp)
+                    _run_vina(vina_args_tmp, timeout=timeout, deadline=deadline,
+                              resources=vina_resources, on_line=affinity)
+                except subprocess.TimeoutExpired:
+                    timed_out = True
+                    continue
                 except Exception as e:
                     if os.path.isfile(receptor_pdbqt_path):
                         with open(receptor_pdbqt_path, 'r') as f:
@@ -394,45 +713,65 @@ def _vinadock(
                     error = {
                         'Exception': e,
                         'Individual': Individual,
-                        f'used_mol_conf_{conf.GetId()}': temp_mol,
-                        f'used_ligand_pdbqt_conf_{conf.GetId()}': PDBQTWriterLegacy.write_string(mol_setups[0])[0],
+                        f'used_mol_conf_{conf_id}': Chem.Mol(out_mol, confId=conf_id),
+                        f'used_ligand_pdbqt_conf_{conf_id}': ligand_pdbqt,
                         'receptor_str': receptor_str,
                         'boxcenter': boxcenter,
                         'boxsize': boxsize,
                     }
-                    utils.compressed_pickle(f'error/idx_{Individual.idx}_conf_{conf.GetId()}_error', error)
-                    vina_score_pdbqt = (np.inf, PDBQTWriterLegacy.write_string(mol_setups[0])[0])
+                    utils.compressed_pickle(f'error/idx_{Individual.idx}_conf_{conf_id}_error', error)
+                    vina_score_pdbqt = (np.inf, ligand_pdbqt)
                     return vina_score_pdbqt
 
-                vina_score = np.inf
-                for line in cmd_vina_result.stdout.split('\n'):
-                    # Check over different vina versions
-                    if line.startswith('Affinity'):
-                        vina_score = float(line.split()[1])
-                        break
-                    elif 'Estimated Free Energy of Binding' in line:
-                        vina_score = float(line.split(':')[1].split()[0])
-                        break
+                vina_score = affinity.score
                 if vina_score < vina_score_pdbqt[0]:
                     if constraint_type == 'local_only':
-                        if os.path.isfile(os.path.join(wd, f'{Individual.idx}_conf_{conf.GetId()}_out.pdbqt')):
-                            with open(os.path.join(wd, f'{Individual.idx}_conf_{conf.GetId()}_out.pdbqt'), 'r') as f:
+                        if os.path.isfile(os.path.join(wd, f'{Individual.idx}_conf_{conf_id}_out.pdbqt')):
+                            with open(os.path.join(wd, f'{Individual.idx}_conf_{conf_id}_out.pdbqt'), 'r') as f:
                                 pdbqt = f.read()
                         else:
                             pdbqt = "NonExistedFileToRead"
                         vina_score_pdbqt = (vina_score, pdbqt)
                     else:
-                        vina_score_pdbqt = (vina_score, PDBQTWriterLegacy.write_string(mol_setups[0])[0])
+                        vina_score_pdbqt = (vina_score, ligand_pdbqt)
+            if timed_out and vina_score_pdbqt[1] is None:
+                vina_score_pdbqt = (utils.VINA_TIMEOUT_SCORE, 'VinaTimeout')
         else:
             vina_score_pdbqt = (np.inf, "NonGenConformer")
     # "Normal" docking
     else:
-        cmd_vina_str += f" --ligand {os.path.join(wd, f'{Individual.idx}.pdbqt')} "\
-            f"--out {os.path.join(wd, f'{Individual.idx}_out.pdbqt')}"
+        if pose_seeding is not None and seed_pose is not None and np.isfinite(seed_pose[1]):
+            pose_seeding = {'num_conf': 10, 'tolerance': 1.0, **pose_seeding}
+            ref_mol = _pose_to_mol(seed_pose[0])
+            if ref_mol is not None:
+                vina_score_pdbqt = _vinadock(
+                    Individual=Individual, wd=wd, vina_executable=vina_executable, vina_seed=vina_seed,
+                    receptor_pdbqt_path=receptor_pdbqt_path, boxcenter=boxcenter, boxsize=boxsize,
+                    exhaustiveness=exhaustiveness, ad4map=ad4map, ncores=ncores, num_modes=num_modes,
+                    constraint=True, constraint_type='local_only', constraint_ref=ref_mol,
+                    constraint_num_conf=pose_seeding['num_conf'],
+                    constraint_minimum_conf_rms=constraint_minimum_conf_rms,
+                    constraint_mcs_timeout=constraint_mcs_timeout,
+                    timeout=timeout, deadline=deadline, vina_resources=vina_resources)
+                Individual.seeded = bool(vina_score_pdbqt[0] <= seed_pose[1] + pose_seeding['tolerance'])
+                if Individual.seeded:
+                    return vina_score_pdbqt
+        vina_args += ['--ligand', os.path.join(wd, f'{Individual.idx}.pdbqt'),
+                      '--out', os.path.join(wd, f'{Individual.idx}_out.pdbqt')]
         with open(os.path.join(wd, f'{Individual.idx}.pdbqt'), 'w') as lig_pdbqt:
             lig_pdbqt.write(Individual.pdbqt)
         try:
-            utils.run(cmd_vina_str)
+            for attempt in range(timeout_retries + 1):
+                try:
+                    # Retry with lower exhaustiveness
+                    _run_vina(vina_args + ['--exhaustiveness', max(1, exhaustiveness // 2**attempt)],
+                              timeout=timeout, deadline=deadline, resources=vina_resources)
+                    break
+                except subprocess.TimeoutExpired:
+                    if verbose:
+                        print(f"Vina exceeded the timeout on {Individual} (attempt {attempt + 1})")
+                    if attempt == timeout_retries or (deadline is not None and time.time() >= deadline):
+                        return (utils.VINA_TIMEOUT_SCORE, 'VinaTimeout')
         except Exception as e:
             receptor_str = None
             if receptor_pdbqt_path:
@@ -480,6 +819,13 @@ def Cost(
         constraint_receptor_pdb_path: str = None,
         constraint_num_conf: int = 100,
         constraint_minimum_conf_rms: int = 0.01,
+        constraint_mcs_timeout: int = 10,
+        timeout: Union[float, None] = None,
+        timeout_retries: int = 1,
+        deadline: Union[float, None] = None,
+        vina_resources: Union[Dict, None] = None,
+        receptor_margin: Union[float, None] = None,
+        pose_seeding: Union[Dict, None] = None,
         desirability: Dict = None):
     """
     This is the main Cost function of the module. It use the concept of desirability functions.
@@ -535,6 +881,25 @@ def Cost(
         Maximum number of conformer to be generated internally by moldrug , by default 100
     constraint_minimum_conf_rms : int, optional
         RMS to filter duplicate conformers, by default 0.01
+    constraint_mcs_timeout : int, optional
+        Timeout (seconds) of the maximum common substructure search with constraint_ref, by default 10
+    timeout : Union[float, None], optional
+        Maximum wall-clock time (seconds) of every Vina run, by default None
+    timeout_retries : int, optional
+        Retries of the free docking with half of the exhaustiveness after a timeout, by default 1
+    deadline : Union[float, None], optional
+        Absolute time after which no Vina run is started (set by :meth:`moldrug.utils.GA`), by default None.
+        If the time budget is exceeded, vina_score is :data:`moldrug.utils.VINA_TIMEOUT_SCORE` and cost is inf.
+    vina_resources : Union[Dict, None], optional
+        Resource limits of every Vina process: cpus (CPU affinity), nice and/or memory_limit (bytes)
+        as in :meth:`moldrug.utils.launch`, by default None
+    receptor_margin : Union[float, None], optional
+        If provided, the receptor (and constraint_receptor_pdb_path) is cropped to the box plus receptor_margin
+        angstrom (see :meth:`moldrug.utils.crop_receptor`) before the docking, by default None
+    pose_seeding : Union[Dict, None], optional
+        Parent-pose seeding of the free docking: the offspring of :meth:`moldrug.utils.GA` are first locally
+        optimized from the docked pose of their parent (keys num_conf and tolerance,
+        see :meth:`moldrug.fitness._vinadock`), by default None
     desirability : dict, optional
         Desirability definition to update the internal default values. The update use :meth:`moldrug.utils.deep_update`
         Each variable only will accept
@@ -580,11 +945,12 @@ def Cost(
 
     sascorer = utils.import_sascorer()
     # multicriteria optimization,Optimization of Several Response Variables
-    # Getting estimate of drug-likness
-    Individual.qed = QED.weights_mean(Chem.RemoveHs(Individual.mol))
+    with utils.stage('sa_qed'):
+        # Getting estimate of drug-likness
+        Individual.qed = QED.weights_mean(Chem.RemoveHs(Individual.mol))
 
-    # Getting synthetic accessibility score
-    Individual.sa_score = sascorer.calculateScore(Chem.RemoveHs(Individual.mol))
+        # Getting synthetic accessibility score
+        Individual.sa_score = sascorer.calculateScore(Chem.RemoveHs(Individual.mol))
 
     # Getting vina_score and update pdbqt
     Individual.vina_score, Individual.pdbqt = _vinadock(
@@ -604,32 +970,44 @@ def Cost(
         constraint_ref=constraint_ref,
         constraint_receptor_pdb_path=constraint_receptor_pdb_path,
         constraint_num_conf=constraint_num_conf,
-        constraint_minimum_conf_rms=constraint_minimum_conf_rms)
+        constraint_minimum_conf_rms=constraint_minimum_conf_rms,
+        constraint_mcs_timeout=constraint_mcs_timeout,
+        timeout=timeout,
+        timeout_retries=timeout_retries,
+        deadline=deadline,
+        vina_resources=vina_resources,
+        receptor_margin=receptor_margin,
+        pose_seeding=pose_seeding,
+        seed_pose=_seed_pose(Individual))
     # Adding the cost using all the information of qed, sas and vina_cost
     # Construct the desirability
     # Quantitative estimation of drug-likeness (ranges from 0 to 1). We could use just the value perse,
     # but using LargerTheBest we are more permissible.
 
-    base = 1
-    exponent = 0
-    for variable in desirability:
-        for key in desirability[variable]:
-            if key == 'w':
-                w = desirability[variable][key]
-            elif key in utils.DerringerSuichDesirability():
-                d = utils.DerringerSuichDesirability()[key](
-                    getattr(Individual, variable), **desirability[variable][key])
-            else:
-                raise RuntimeError(f"Inside the desirability dictionary you provided for the variable = {variable} "
-                                   f"a non implemented key = {key}. Only are possible:"
-                                   "'w' (standing for weight) and any "
-                                   "possible Derringer-Suich desirability "
-                                   f"function: {utils.DerringerSuichDesirability().keys()}")
-        base *= d**w
-        exponent += w
+    with utils.stage('desirability'):
+        base = 1
+        exponent = 0
+        for variable in desirability:
+            for key in desirability[variable]:
+                if key == 'w':
+                    w = desirability[variable][key]
+                elif key in utils.DerringerSuichDesirability():
+                    d = utils.DerringerSuichDesirability()[key](
+                        getattr(Individual, variable), **desirability[variable][key])
+                else:
+                    raise RuntimeError(f"Inside the desirability dictionary you provided for the variable = {variable} "
+                                       f"a non implemented key = {key}. Only are possible:"
+                                       "'w' (standing for weight) and any "
+                                       "possible Derringer-Suich desirability "
+                                       f"function: {utils.DerringerSuichDesirability().keys()}")
+            base *= d**w
+            exponent += w
 
-    # We are using a geometric mean. And because we are minimizing we have to return
-    Individual.cost = 1 - base**(1 / exponent)
+        # We are using a geometric mean. And because we are minimizing we have to return
+        Individual.cost = 1 - base**(1 / exponent)
+    # Timed out dockings are the worst solutions
+    if utils.is_timeout(Individual):
+        Individual.cost = np.inf
     return Individual
 
 
@@ -651,6 +1029,13 @@ def CostOnlyVina(
         constraint_receptor_pdb_path: str = None,
         constraint_num_conf: int = 100,
         constraint_minimum_conf_rms: int = 0.01,
+        constraint_mcs_timeout: int = 10,
+        timeout: Union[float, None] = None,
+        timeout_retries: int = 1,
+        deadline: Union[float, None] = None,
+        vina_resources: Union[Dict, None] = None,
+        receptor_margin: Union[float, None] = None,
+        pose_seeding: Union[Dict, None] = None,
         wt_cutoff: Union[None, float] = None):
     """
     This Cost function performs Docking and return the vina_score as Cost.
@@ -697,6 +1082,25 @@ def CostOnlyVina(
         Maximum number of conformer to be generated internally by moldrug , by default 100
     constraint_minimum_conf_rms : int, optional
         RMS to filter duplicate conformers, by default 0.01
+    constraint_mcs_timeout : int, optional
+        Timeout (seconds) of the maximum common substructure search with constraint_ref, by default 10
+    timeout : Union[float, None], optional
+        Maximum wall-clock time (seconds) of every Vina run, by default None
+    timeout_retries : int, optional
+        Retries of the free docking with half of the exhaustiveness after a timeout, by default 1
+    deadline : Union[float, None], optional
+        Absolute time after which no Vina run is started (set by :meth:`moldrug.utils.GA`), by default None.
+        If the time budget is exceeded, vina_score is :data:`moldrug.utils.VINA_TIMEOUT_SCORE` and cost is inf.
+    vina_resources : Union[Dict, None], optional
+        Resource limits of every Vina process: cpus (CPU affinity), nice and/or memory_limit (bytes)
+        as in :meth:`moldrug.utils.launch`, by default None
+    receptor_margin : Union[float, None], optional
+        If provided, the receptor (and constraint_receptor_pdb_path) is cropped to the box plus receptor_margin
+        angstrom (see :meth:`moldrug.utils.crop_receptor`) before the docking, by default None
+    pose_seeding : Union[Dict, None], optional
+        Parent-pose seeding of the free docking: the offspring of :meth:`moldrug.utils.GA` are first locally
+        optimized from the docked pose of their parent (keys num_conf and tolerance,
+        see :meth:`moldrug.fitness._vinadock`), by default None
     wt_cutoff : Union[None, float], optional
         If some number is provided the molecules with a molecular weight higher
         than wt_cutoff will get as vina_score = cost = np.inf. Vina will not be invoked, by default None
@@ -750,11 +1154,118 @@ def CostOnlyVina(
         constraint_ref=constraint_ref,
         constraint_receptor_pdb_path=constraint_receptor_pdb_path,
         constraint_num_conf=constraint_num_conf,
-        constraint_minimum_conf_rms=constraint_minimum_conf_rms)
+        constraint_minimum_conf_rms=constraint_minimum_conf_rms,
+        constraint_mcs_timeout=constraint_mcs_timeout,
+        timeout=timeout,
+        timeout_retries=timeout_retries,
+        deadline=deadline,
+        vina_resources=vina_resources,
+        receptor_margin=receptor_margin,
+        pose_seeding=pose_seeding,
+        seed_pose=_seed_pose(Individual))
     Individual.cost = Individual.vina_score
+    # Timed out dockings are the worst solutions
+    if utils.is_timeout(Individual):
+        Individual.cost = np.inf
     return Individual
 
 
+def _multi_receptors_cost(Individual: utils.Individual, vina_score_type: Union[str, List[str]],
+                          desirability: Dict) -> float:
+    """Aggregate the properties (qed, sa_score and vina_score) of Individual in the cost of
+    :meth:`moldrug.fitness.CostMultiReceptors`. The receptors with NaN vina_score (not docked because of early termination)
+    get their best achievable desirability, in such case the returned cost is a lower bound of the cost.
+
+    Parameters
+    ----------
+    Individual : utils.Individual
+        An Individual with the attributes qed, sa_score and vina_score (list)
+    vina_score_type : Union[str, List[str]]
+        See :meth:`moldrug.fitness.CostMultiReceptors`
+    desirability : Dict
+        The complete desirability definition (already updated with the default values)
+
+    Returns
+    -------
+    float
+        The cost
+    """
+    # make a copy of the default values of desirability
+    # pops the region of vina_scores
+    desirability_to_work_with = desirability.copy()
+    vina_desirability_section = desirability_to_work_with.pop('vina_scores')
+    # Initialize base and exponent
+    base = 1
+    exponent = 0
+    # Runs for all properties different to vina_scores
+    for variable in desirability_to_work_with:
+        for key in desirability_to_work_with[variable]:
+            if key == 'w':
+                w = desirability_to_work_with[variable][key]
+            elif key in utils.DerringerSuichDesirability():
+                d = utils.DerringerSuichDesirability()[key](
+                    getattr(Individual, variable), **desirability_to_work_with[variable][key])
+            else:
+                raise RuntimeError(f"Inside the desirability dictionary you provided for the variable = {variable} "
+                                   f"a non implemented key = {key}. Only are possible: 'w' (standing for weight) and "
+                                   "any possible Derringer-Suich "
+                                   f"desirability function: {utils.DerringerSuichDesirability().keys()}. "
+                                   "Only in the case of vina_scores [min and max] keys")
+        base *= d**w
+        exponent += w
+
+    # Check how to build the desirability
+    if vina_score_type == 'ensemble':
+        # In this case the user is looking for a minimum (potent binder)
+        docked = [vs for vs in Individual.vina_score if not np.isnan(vs)]
+        if 'SmallerTheBest' in vina_desirability_section['ensemble']:
+            vina_score_to_use = min(docked)
+        elif 'LargerTheBest' in vina_desirability_section['ensemble']:
+            vina_score_to_use = max(docked)
+        else:
+            raise RuntimeError(f"For {vina_score_type=} only Derringer-Suich desirability functions:"
+                               "SmallerTheBest and LargerTheBest are possible")
+
+        for key in vina_desirability_section['ensemble']:
+            if key == 'w':
+                w = vina_desirability_section['ensemble'][key]
+            elif key in utils.DerringerSuichDesirability():
+                d = utils.DerringerSuichDesirability()[key](vina_score_to_use, **vina_desirability_section['ensemble'][key])
+            else:
+                raise RuntimeError("Inside the desirability dictionary "
+                                   f"you provided for the variable = vina_scores['ensemble'] "
+                                   f"a non implemented key = {key}. Only are possible: 'w' (standing for weight) and "
+                                   "any possible Derringer-Suich "
+                                   f"desirability function: SmallerTheBest and LargerTheBest.")
+        if len(docked) < len(Individual.vina_score):
+            # Some receptor was not docked, the ensemble could still reach the target
+            d = 1
+        base *= d**w
+        exponent += w
+    else:
+        # Run only for vina_scores
+        for vs, vst in zip(Individual.vina_score, vina_score_type):
+            for key in vina_desirability_section[vst]:
+                if key == 'w':
+                    w = vina_desirability_section[vst][key]
+                elif key in utils.DerringerSuichDesirability():
+                    d = utils.DerringerSuichDesirability()[key](vs, **vina_desirability_section[vst][key])
+                else:
+                    raise RuntimeError("Inside the desirability dictionary "
+                                       f"you provided for the variable = vina_scores[{vst}] "
+                                       f"a non implemented key = {key}. Only are possible: 'w' (standing for weight) and "
+                                       "any possible Derringer-Suich "
+                                       f"desirability function: {utils.DerringerSuichDesirability().keys()}.")
+            if np.isnan(vs):
+                # Not docked receptor: best achievable desirability
+                d = 1
+            base *= d**w
+            exponent += w
+
+    # We are using a geometric mean. And because we are minimizing we have to return
+    return 1 - base**(1 / exponent)
+
+
 def CostMultiReceptors(
         Individual: utils.Individual,
         wd: str = '.vina_jobs',
@@ -774,6 +1285,15 @@ def CostMultiReceptors(
         constraint_receptor_pdb_path: List[str] = None,
         constraint_num_conf: int = 100,
         constraint_minimum_conf_rms: int = 0.01,
+        constraint_mcs_timeout: int = 10,
+        timeout: Union[float, None] = None,
+        timeout_retries: int = 1,
+        deadline: Union[float, None] = None,
+        vina_resources: Union[Dict, None] = None,
+        receptor_margin: Union[float, None] = None,
+        pose_seeding: Union[Dict, None] = None,
+        vina_results: Union[None, List[tuple]] = None,
+        cost_threshold: Union[None, float] = None,
         desirability: Dict = None):
     """
     This function is similar to :meth:`moldrug.fitness.Cost` but it will add the possibility
@@ -842,6 +1362,38 @@ def CostMultiReceptors(
         Maximum number of conformer to be generated internally by moldrug , by default 100
     constraint_minimum_conf_rms : int, optional
         RMS to filter duplicate conformers, by default 0.01
+    constraint_mcs_timeout : int, optional
+        Timeout (seconds) of the maximum common substructure search with constraint_ref, by default 10
+    timeout : Union[float, None], optional
+        Maximum wall-clock time (seconds) of every Vina run, by default None
+    timeout_retries : int, optional
+        Retries of the free docking with half of the exhaustiveness after a timeout, by default 1
+    deadline : Union[float, None], optional
+        Absolute time after which no Vina run is started (set by :meth:`moldrug.utils.GA`), by default None.
+        If the time budget is exceeded, vina_score is :data:`moldrug.utils.VINA_TIMEOUT_SCORE` and cost is inf.
+    vina_resources : Union[Dict, None], optional
+        Resource limits of every Vina process: cpus (CPU affinity), nice and/or memory_limit (bytes)
+        as in :meth:`moldrug.utils.launch`, by default None
+    receptor_margin : Union[float, None], optional
+        If provided, the receptor (and constraint_receptor_pdb_path) is cropped to the box plus receptor_margin
+        angstrom (see :meth:`moldrug.utils.crop_receptor`) before the docking, by default None
+    pose_seeding : Union[Dict, None], optional
+        Parent-pose seeding of the free docking: the offspring of :meth:`moldrug.utils.GA` are first locally
+        optimized from the docked pose of their parent (keys num_conf and tolerance,
+        see :meth:`moldrug.fitness._vinadock`). The attribute seeded of Individual is a list with one
+        value per receptor (True if the seeded pose was kept, False if the free docking was performed
+        and None if the receptor was not seeded), by default None
+    vina_results : Union[None, List[tuple]], optional
+        The already computed (vina score, pdbqt) or (vina score, pdbqt, seeded) of every receptor
+        (see :meth:`moldrug.fitness._receptor_docking`). If provided the docking is skipped.
+        It is used by the receptor fan-out of :meth:`moldrug.utils.GA` (see :meth:`moldrug.fitness.receptor_tasks`).
+        None items are receptors not docked because of the early termination, by default None
+    cost_threshold : Union[None, float], optional
+        Early termination (it is set by :meth:`moldrug.utils.GA` with early_stop=True). The receptors are docked
+        in the order of :meth:`moldrug.fitness.receptor_order` and the docking stops as soon as the best achievable
+        cost (the not docked receptors get their best desirability) is not lower than cost_threshold.
+        The not docked receptors get NaN as vina_score and 'EarlyStop' as pdbqt and the cost is the best achievable one,
+        by default None
     desirability : dict, optional
         Desirability definition to update the internal default values. The update use :meth:`moldrug.utils.deep_update`
         Each variable only will accept
@@ -898,121 +1450,154 @@ def CostMultiReceptors(
         ad4map = [None] * len(receptor_pdbqt_path)
 
     sascorer = utils.import_sascorer()
-    Individual.qed = QED.weights_mean(Chem.RemoveHs(Individual.mol))
+    with utils.stage('sa_qed'):
+        Individual.qed = QED.weights_mean(Chem.RemoveHs(Individual.mol))
 
-    # Getting synthetic accessibility score
-    Individual.sa_score = sascorer.calculateScore(Chem.RemoveHs(Individual.mol))
+        # Getting synthetic accessibility score
+        Individual.sa_score = sascorer.calculateScore(Chem.RemoveHs(Individual.mol))
 
     # Getting Vina score
     pdbqt_list = []
     Individual.vina_score = []
-    for (i, _) in enumerate(receptor_pdbqt_path):
-        # Getting vina_score and update pdbqt
-        if constraint:
-            vina_score, pdbqt = _vinadock(
-                Individual=Individual,
-                wd=wd,
-                vina_executable=vina_executable,
-                vina_seed=vina_seed,
-                receptor_pdbqt_path=receptor_pdbqt_path[i],
-                boxcenter=boxcenter[i],
-                boxsize=boxsize[i],
-                exhaustiveness=exhaustiveness,
-                ad4map=ad4map[i],
-                ncores=ncores,
-                num_modes=num_modes,
-                constraint=constraint,
-                constraint_type=constraint_type,
-                constraint_ref=constraint_ref,
-                constraint_receptor_pdb_path=constraint_receptor_pdb_path[i],
-                constraint_num_conf=constraint_num_conf,
-                constraint_minimum_conf_rms=constraint_minimum_conf_rms)
+    if vina_results is None:
+        vina_results = [None] * len(receptor_pdbqt_path)
+        if cost_threshold is None:
+            order = range(len(receptor_pdbqt_path))
         else:
-            vina_score, pdbqt = _vinadock(
-                Individual=Individual,
-                wd=wd,
-                vina_executable=vina_executable,
-                vina_seed=vina_seed,
-                receptor_pdbqt_path=receptor_pdbqt_path[i],
-                boxcenter=boxcenter[i],
-                boxsize=boxsize[i],
-                exhaustiveness=exhaustiveness,
-                ad4map=ad4map[i],
-                ncores=ncores,
-                num_modes=num_modes)
+            order = receptor_order(dict(vina_score_type=vina_score_type, desirability=desirability))
+        for i in order:
+            # Getting vina_score and update pdbqt
+            if constraint:
+                vina_results[i] = _receptor_docking(
+                    Individual=Individual,
+                    wd=wd,
+                    vina_executable=vina_executable,
+                    vina_seed=vina_seed,
+                    receptor_pdbqt_path=receptor_pdbqt_path[i],
+                    boxcenter=boxcenter[i],
+                    boxsize=boxsize[i],
+                    exhaustiveness=exhaustiveness,
+                    ad4map=ad4map[i],
+                    ncores=ncores,
+                    num_modes=num_modes,
+                    constraint=constraint,
+                    constraint_type=constraint_type,
+                    constraint_ref=constraint_ref,
+                    constraint_receptor_pdb_path=constraint_receptor_pdb_path[i],
+                    constraint_num_conf=constraint_num_conf,
+                    constraint_minimum_conf_rms=constraint_minimum_conf_rms,
+                    constraint_mcs_timeout=constraint_mcs_timeout,
+                    timeout=timeout,
+                    timeout_retries=timeout_retries,
+                    deadline=deadline,
+                    vina_resources=vina_resources,
+                    receptor_margin=receptor_margin,
+                    pose_seeding=pose_seeding,
+                    seed_pose=_seed_pose(Individual, i))
+            else:
+                vina_results[i] = _receptor_docking(
+                    Individual=Individual,
+                    wd=wd,
+                    vina_executable=vina_executable,
+                    vina_seed=vina_seed,
+                    receptor_pdbqt_path=receptor_pdbqt_path[i],
+                    boxcenter=boxcenter[i],
+                    boxsize=boxsize[i],
+                    exhaustiveness=exhaustiveness,
+                    ad4map=ad4map[i],
+                    ncores=ncores,
+                    num_modes=num_modes,
+                    timeout=timeout,
+                    timeout_retries=timeout_retries,
+                    deadline=deadline,
+                    vina_resources=vina_resources,
+                    receptor_margin=receptor_margin,
+                    pose_seeding=pose_seeding,
+                    seed_pose=_seed_pose(Individual, i))
+            if cost_threshold is not None:
+                Individual.vina_score = [np.nan if result is None else result[0] for result in vina_results]
+                with utils.stage('desirability'):
+                    bound = _multi_receptors_cost(Individual, vina_score_type, desirability)
+                if bound >= cost_threshold:
+                    break
+        Individual.vina_score = []
+    seeded = []
+    for result in vina_results:
+        vina_score, pdbqt = (np.nan, 'EarlyStop') if result is None else result[:2]
         Individual.vina_score.append(vina_score)
         pdbqt_list.append(pdbqt)
+        seeded.append(result[2] if result is not None and len(result) > 2 else None)
     # Update the pdbqt attribute
     Individual.pdbqt = pdbqt_list
+    if pose_seeding:
+        Individual.seeded = seeded
+
+    with utils.stage('desirability'):
+        Individual.cost = _multi_receptors_cost(Individual, vina_score_type, desirability)
+    # Timed out dockings are the worst solutions
+    if utils.is_timeout(Individual):
+        Individual.cost = np.inf
+    return Individual
 
-    # make a copy of the default values of desirability
-    # pops the region of vina_scores
-    desirability_to_work_with = desirability.copy()
-    vina_desirability_section = desirability_to_work_with.pop('vina_scores')
-    # Initialize base and exponent
-    base = 1
-    exponent = 0
-    # Runs for all properties different to vina_scores
-    for variable in desirability_to_work_with:
-        for key in desirability_to_work_with[variable]:
-            if key == 'w':
-                w = desirability_to_work_with[variable][key]
-            elif key in utils.DerringerSuichDesirability():
-                d = utils.DerringerSuichDesirability()[key](
-                    getattr(Individual, variable), **desirability_to_work_with[variable][key])
-            else:
-                raise RuntimeError(f"Inside the desirability dictionary you provided for the variable = {variable} "
-                                   f"a non implemented key = {key}. Only are possible: 'w' (standing for weight) and "
-                                   "any possible Derringer-Suich "
-                                   f"desirability function: {utils.DerringerSuichDesirability().keys()}. "
-                                   "Only in the case of vina_scores [min and max] keys")
-        base *= d**w
-        exponent += w
 
-    # Check how to build the desirability
+def _multi_receptors_only_vina_cost(vina_scores: List[float], vina_score_type: Union[str, List[str]],
+                                    desirability: Dict) -> float:
+    """Aggregate the vina scores in the cost of :meth:`moldrug.fitness.CostMultiReceptorsOnlyVina`.
+    The receptors with NaN vina score (not docked because of early termination) get their best achievable value,
+    in such case the returned cost is a lower bound of the cost.
+
+    Parameters
+    ----------
+    vina_scores : List[float]
+        The vina score on every receptor
+    vina_score_type : Union[str, List[str]]
+        See :meth:`moldrug.fitness.CostMultiReceptorsOnlyVina`
+    desirability : Dict
+        The vina_scores section of the desirability (already updated with the default values)
+
+    Returns
+    -------
+    float
+        The cost
+    """
     if vina_score_type == 'ensemble':
         # In this case the user is looking for a minimum (potent binder)
-        if 'SmallerTheBest' in vina_desirability_section['ensemble']:
-            vina_score_to_use = min(Individual.vina_score)
-        elif 'LargerTheBest' in vina_desirability_section['ensemble']:
-            vina_score_to_use = max(Individual.vina_score)
+        docked = [vs for vs in vina_scores if not np.isnan(vs)]
+        if 'SmallerTheBest' in desirability['ensemble']:
+            # A not docked receptor could still give any lower score
+            vina_score_to_use = min(docked) if len(docked) == len(vina_scores) else -np.inf
+        elif 'LargerTheBest' in desirability['ensemble']:
+            vina_score_to_use = max(docked)
         else:
             raise RuntimeError(f"For {vina_score_type=} only Derringer-Suich desirability functions:"
                                "SmallerTheBest and LargerTheBest are possible")
-
-        for key in vina_desirability_section['ensemble']:
-            if key == 'w':
-                w = vina_desirability_section['ensemble'][key]
-            elif key in utils.DerringerSuichDesirability():
-                d = utils.DerringerSuichDesirability()[key](vina_score_to_use, **vina_desirability_section['ensemble'][key])
-            else:
-                raise RuntimeError("Inside the desirability dictionary "
-                                   f"you provided for the variable = vina_scores['ensemble'] "
-                                   f"a non implemented key = {key}. Only are possible: 'w' (standing for weight) and "
-                                   "any possible Derringer-Suich "
-                                   f"desirability function: SmallerTheBest and LargerTheBest.")
-        base *= d**w
-        exponent += w
+        return vina_score_to_use
     else:
-        # Run only for vina_scores
-        for vs, vst in zip(Individual.vina_score, vina_score_type):
-            for key in vina_desirability_section[vst]:
+        # Initialize base and exponent
+        base = 1
+        exponent = 0
+        # Run for vina_scores
+        for vs, vst in zip(vina_scores, vina_score_type):
+            for key in desirability[vst]:
                 if key == 'w':
-                    w = vina_desirability_section[vst][key]
+                    w = desirability[vst][key]
                 elif key in utils.DerringerSuichDesirability():
-                    d = utils.DerringerSuichDesirability()[key](vs, **vina_desirability_section[vst][key])
+                    d = utils.DerringerSuichDesirability()[key](vs, **desirability[vst][key])
                 else:
-                    raise RuntimeError("Inside the desirability dictionary "
-                                       f"you provided for the variable = vina_scores[{vst}] "
-                                       f"a non implemented key = {key}. Only are possible: 'w' (standing for weight) and "
-                                       "any possible Derringer-Suich "
+                    raise RuntimeError("Inside the desirability dictionary you provided "
+                                       f"for the variable = vina_scores[{vst}] "
+                                       f"a non implemented key = {key}. "
+                                       "Only are possible: 'w' (standing for weight) "
+                                       "and any possible Derringer-Suich "
                                        f"desirability function: {utils.DerringerSuichDesirability().keys()}.")
+            if np.isnan(vs):
+                # Not docked receptor: best achievable desirability
+                d = 1
             base *= d**w
             exponent += w
 
-    # We are using a geometric mean. And because we are minimizing we have to return
-    Individual.cost = 1 - base**(1 / exponent)
-    return Individual
+        # We are using a geometric mean. And because we are minimizing we have to return
+        return 1 - base**(1 / exponent)
 
 
 def CostMultiReceptorsOnlyVina(
@@ -1034,6 +1619,15 @@ def CostMultiReceptorsOnlyVina(
         constraint_receptor_pdb_path: List[str] = None,
         constraint_num_conf: int = 100,
         constraint_minimum_conf_rms: int = 0.01,
+        constraint_mcs_timeout: int = 10,
+        timeout: Union[float, None] = None,
+        timeout_retries: int = 1,
+        deadline: Union[float, None] = None,
+        vina_resources: Union[Dict, None] = None,
+        receptor_margin: Union[float, None] = None,
+        pose_seeding: Union[Dict, None] = None,
+        vina_results: Union[None, List[tuple]] = None,
+        cost_threshold: Union[None, float] = None,
         desirability: Dict = None,
         wt_cutoff: Union[None, float] = None):
     """
@@ -1098,6 +1692,38 @@ def CostMultiReceptorsOnlyVina(
         Maximum number of conformer to be generated internally by moldrug , by default 100
     constraint_minimum_conf_rms : int, optional
         RMS to filter duplicate conformers, by default 0.01
+    constraint_mcs_timeout : int, optional
+        Timeout (seconds) of the maximum common substructure search with constraint_ref, by default 10
+    timeout : Union[float, None], optional
+        Maximum wall-clock time (seconds) of every Vina run, by default None
+    timeout_retries : int, optional
+        Retries of the free docking with half of the exhaustiveness after a timeout, by default 1
+    deadline : Union[float, None], optional
+        Absolute time after which no Vina run is started (set by :meth:`moldrug.utils.GA`), by default None.
+        If the time budget is exceeded, vina_score is :data:`moldrug.utils.VINA_TIMEOUT_SCORE` and cost is inf.
+    vina_resources : Union[Dict, None], optional
+        Resource limits of every Vina process: cpus (CPU affinity), nice and/or memory_limit (bytes)
+        as in :meth:`moldrug.utils.launch`, by default None
+    receptor_margin : Union[float, None], optional
+        If provided, the receptor (and constraint_receptor_pdb_path) is cropped to the box plus receptor_margin
+        angstrom (see :meth:`moldrug.utils.crop_receptor`) before the docking, by default None
+    pose_seeding : Union[Dict, None], optional
+        Parent-pose seeding of the free docking: the offspring of :meth:`moldrug.utils.GA` are first locally
+        optimized from the docked pose of their parent (keys num_conf and tolerance,
+        see :meth:`moldrug.fitness._vinadock`). The attribute seeded of Individual is a list with one
+        value per receptor (True if the seeded pose was kept, False if the free docking was performed
+        and None if the receptor was not seeded), by default None
+    vina_results : Union[None, List[tuple]], optional
+        The already computed (vina score, pdbqt) or (vina score, pdbqt, seeded) of every receptor
+        (see :meth:`moldrug.fitness._receptor_docking`). If provided the docking is skipped.
+        It is used by the receptor fan-out of :meth:`moldrug.utils.GA` (see :meth:`moldrug.fitness.receptor_tasks`).
+        None items are receptors not docked because of the early termination, by default None
+    cost_threshold : Union[None, float], optional
+        Early termination (it is set by :meth:`moldrug.utils.GA` with early_stop=True). The receptors are docked
+        in the order of :meth:`moldrug.fitness.receptor_order` and the docking stops as soon as the best achievable
+        cost (the not docked receptors get their best desirability) is not lower than cost_threshold.
+        The not docked receptors get NaN as vina_score and 'EarlyStop' as pdbqt and the cost is the best achievable one,
+        by default None
     desirability : dict, optional
         Desirability definition to update the internal default values. The update use :meth:`moldrug.utils.deep_update`
         Each variable only will accept
@@ -1187,79 +1813,209 @@ def CostMultiReceptorsOnlyVina(
     # Getting Vina score
     pdbqt_list = []
     Individual.vina_score = []
-    for (i, _) in enumerate(receptor_pdbqt_path):
-        # Getting vina_score and update pdbqt
-        if constraint:
-            vina_score, pdbqt = _vinadock(
-                Individual=Individual,
-                wd=wd,
-                vina_executable=vina_executable,
-                vina_seed=vina_seed,
-                receptor_pdbqt_path=receptor_pdbqt_path[i],
-                boxcenter=boxcenter[i],
-                boxsize=boxsize[i],
-                exhaustiveness=exhaustiveness,
-                ad4map=ad4map[i],
-                ncores=ncores,
-                num_modes=num_modes,
-                constraint=constraint,
-                constraint_type=constraint_type,
-                constraint_ref=constraint_ref,
-                constraint_receptor_pdb_path=constraint_receptor_pdb_path[i],
-                constraint_num_conf=constraint_num_conf,
-                constraint_minimum_conf_rms=constraint_minimum_conf_rms)
+    if vina_results is None:
+        vina_results = [None] * len(receptor_pdbqt_path)
+        if cost_threshold is None:
+            order = range(len(receptor_pdbqt_path))
         else:
-            vina_score, pdbqt = _vinadock(
-                Individual=Individual,
-                wd=wd,
-                vina_executable=vina_executable,
-                vina_seed=vina_seed,
-                receptor_pdbqt_path=receptor_pdbqt_path[i],
-                boxcenter=boxcenter[i],
-                boxsize=boxsize[i],
-                exhaustiveness=exhaustiveness,
-                ad4map=ad4map[i],
-                ncores=ncores,
-                num_modes=num_modes)
+            order = receptor_order(dict(vina_score_type=vina_score_type, desirability=desirability))
+        for i in order:
+            # Getting vina_score and update pdbqt
+            if constraint:
+                vina_results[i] = _receptor_docking(
+                    Individual=Individual,
+                    wd=wd,
+                    vina_executable=vina_executable,
+                    vina_seed=vina_seed,
+                    receptor_pdbqt_path=receptor_pdbqt_path[i],
+                    boxcenter=boxcenter[i],
+                    boxsize=boxsize[i],
+                    exhaustiveness=exhaustiveness,
+                    ad4map=ad4map[i],
+                    ncores=ncores,
+                    num_modes=num_modes,
+                    constraint=constraint,
+                    constraint_type=constraint_type,
+                    constraint_ref=constraint_ref,
+                    constraint_receptor_pdb_path=constraint_receptor_pdb_path[i],
+                    constraint_num_conf=constraint_num_conf,
+                    constraint_minimum_conf_rms=constraint_minimum_conf_rms,
+                    constraint_mcs_timeout=constraint_mcs_timeout,
+                    timeout=timeout,
+                    timeout_retries=timeout_retries,
+                    deadline=deadline,
+                    vina_resources=vina_resources,
+                    receptor_margin=receptor_margin,
+                    pose_seeding=pose_seeding,
+                    seed_pose=_seed_pose(Individual, i))
+            else:
+                vina_results[i] = _receptor_docking(
+                    Individual=Individual,
+                    wd=wd,
+                    vina_executable=vina_executable,
+                    vina_seed=vina_seed,
+                    receptor_pdbqt_path=receptor_pdbqt_path[i],
+                    boxcenter=boxcenter[i],
+                    boxsize=boxsize[i],
+                    exhaustiveness=exhaustiveness,
+                    ad4map=ad4map[i],
+                    ncores=ncores,
+                    num_modes=num_modes,
+                    timeout=timeout,
+                    timeout_retries=timeout_retries,
+                    deadline=deadline,
+                    vina_resources=vina_resources,
+                    receptor_margin=receptor_margin,
+                    pose_seeding=pose_seeding,
+                    seed_pose=_seed_pose(Individual, i))
+            if cost_threshold is not None:
+                Individual.vina_score = [np.nan if result is None else result[0] for result in vina_results]
+                with utils.stage('desirability'):
+                    bound = _multi_receptors_only_vina_cost(Individual.vina_score, vina_score_type, desirability)
+                if bound >= cost_threshold:
+                    break
+        Individual.vina_score = []
+    seeded = []
+    for result in vina_results:
+        vina_score, pdbqt = (np.nan, 'EarlyStop') if result is None else result[:2]
         Individual.vina_score.append(vina_score)
         pdbqt_list.append(pdbqt)
+        seeded.append(result[2] if result is not None and len(result) > 2 else None)
     # Update the pdbqt attribute
     Individual.pdbqt = pdbqt_list
+    if pose_seeding:
+        Individual.seeded = seeded
+
+    with utils.stage('desirability'):
+        Individual.cost = _multi_receptors_only_vina_cost(Individual.vina_score, vina_score_type, desirability)
+    # Timed out dockings are the worst solutions
+    if utils.is_timeout(Individual):
+        Individual.cost = np.inf
+    return Individual
 
-    if vina_score_type == 'ensemble':
-        # In this case the user is looking for a minimum (potent binder)
-        if 'SmallerTheBest' in desirability['ensemble']:
-            vina_score_to_use = min(Individual.vina_score)
-        elif 'LargerTheBest' in desirability['ensemble']:
-            vina_score_to_use = max(Individual.vina_score)
-        else:
-            raise RuntimeError(f"For {vina_score_type=} only Derringer-Suich desirability functions:"
-                               "SmallerTheBest and LargerTheBest are possible")
-        Individual.cost = vina_score_to_use
-    else:
-        # Initialize base and exponent
-        base = 1
-        exponent = 0
-        # Run for vina_scores
-        for vs, vst in zip(Individual.vina_score, vina_score_type):
-            for key in desirability[vst]:
-                if key == 'w':
-                    w = desirability[vst][key]
-                elif key in utils.DerringerSuichDesirability():
-                    d = utils.DerringerSuichDesirability()[key](vs, **desirability[vst][key])
-                else:
-                    raise RuntimeError("Inside the desirability dictionary you provided "
-                                       f"for the variable = vina_scores[{vst}] "
-                                       f"a non implemented key = {key}. "
-                                       "Only are possible: 'w' (standing for weight) "
-                                       "and any possible Derringer-Suich "
-                                       f"desirability function: {utils.DerringerSuichDesirability().keys()}.")
-            base *= d**w
-            exponent += w
 
-        # We are using a geometric mean. And because we are minimizing we have to return
-        Individual.cost = 1 - base**(1 / exponent)
-    return Individual
+def receptor_tasks(Individual: utils.Individual, costfunc_kwargs: Dict) -> List[Dict]:
+    """Split the docking of :meth:`moldrug.fitness.CostMultiReceptors` and
+    :meth:`moldrug.fitness.CostMultiReceptorsOnlyVina` in one independent task per receptor.
+    :meth:`moldrug.utils.GA` (and :meth:`moldrug.utils.Local`) use it when the evaluation runs in parallel:
+    every (individual, receptor) pair is scheduled on its own and the per receptor results are passed back
+    to the cost function (vina_results) for the desirability aggregation.
+    Every receptor works on its own sub-directory of wd.
+
+    Parameters
+    ----------
+    Individual : utils.Individual
+        The individual to dock
+    costfunc_kwargs : Dict
+        The keyword arguments of the cost function
+
+    Returns
+    -------
+    List[Dict]
+        The keyword arguments of :meth:`moldrug.fitness._vinadock` for every receptor.
+        Empty if the docking is not needed (wt_cutoff exceeded).
+
+    Example
+    -------
+    .. ipython:: python
+
+        from moldrug import utils, fitness
+        from rdkit import Chem
+        tasks = fitness.receptor_tasks(
+            utils.Individual(Chem.MolFromSmiles('CCO')),
+            dict(receptor_pdbqt_path=['r1.pdbqt', 'r2.pdbqt'], boxcenter=[[0, 0, 0], [1, 1, 1]],
+                 boxsize=[[10, 10, 10], [12, 12, 12]], vina_score_type=['min', 'max']))
+        print(tasks)
+    """
+    wt_cutoff = costfunc_kwargs.get('wt_cutoff')
+    if wt_cutoff and Descriptors.MolWt(Individual.mol) > wt_cutoff:
+        return []
+    parameters = signature(_vinadock).parameters
+    common = {key: value for key, value in costfunc_kwargs.items() if key in parameters}
+    wd = costfunc_kwargs.get('wd', parameters['wd'].default)
+    tasks = []
+    for i, receptor in enumerate(costfunc_kwargs['receptor_pdbqt_path']):
+        task = dict(common, receptor_pdbqt_path=receptor, wd=os.path.join(wd, f'receptor_{i}'))
+        for key in ['boxcenter', 'boxsize', 'ad4map', 'constraint_receptor_pdb_path']:
+            if costfunc_kwargs.get(key):
+                task[key] = costfunc_kwargs[key][i]
+        if costfunc_kwargs.get('pose_seeding'):
+            task['seed_pose'] = _seed_pose(Individual, i)
+        tasks.append(task)
+    return tasks
+
+
+def _receptor_docking(Individual: utils.Individual, ncores: int = 1, **kwargs) -> tuple:
+    """Docking on one receptor of :meth:`moldrug.fitness.CostMultiReceptors` and
+    :meth:`moldrug.fitness.CostMultiReceptorsOnlyVina` (serial loop and receptor fan-out).
+    The attribute seeded set by :meth:`moldrug.fitness._vinadock` is returned with the result,
+    on the fan-out the docking runs on a copy of the Individual.
+
+    Parameters
+    ----------
+    Individual : utils.Individual
+        The individual to dock
+    ncores : int, optional
+        Number of Vina threads, by default 1. It is explicit in order to be set
+        by :meth:`moldrug.utils._evaluate_auto` (njobs = 'auto')
+    **kwargs
+        The keyword arguments of :meth:`moldrug.fitness._vinadock` (see :meth:`moldrug.fitness.receptor_tasks`)
+
+    Returns
+    -------
+    tuple
+        (vina score, pdbqt, seeded). seeded is None if the parent-pose seeding was not used.
+    """
+    Individual.__dict__.pop('seeded', None)
+    vina_score, pdbqt = _vinadock(Individual=Individual, ncores=ncores, **kwargs)
+    return vina_score, pdbqt, Individual.__dict__.pop('seeded', None)
+
+
+def receptor_order(costfunc_kwargs: Dict) -> List[int]:
+    """Order in which the receptors are docked when the early termination is used (cost_threshold of
+    :meth:`moldrug.fitness.CostMultiReceptors` and :meth:`moldrug.fitness.CostMultiReceptorsOnlyVina`).
+    The receptors that can discard an individual faster go first: larger desirability weight first and,
+    for the same weight, the off-target receptors (vina_score_type = 'max') first, because one strong binding
+    on them is enough to make the individual uncompetitive. Otherwise the input order is kept.
+
+    Parameters
+    ----------
+    costfunc_kwargs : Dict
+        The keyword arguments of the cost function (receptor_pdbqt_path or vina_score_type and desirability are used)
+
+    Returns
+    -------
+    List[int]
+        The indexes of the receptors
+
+    Example
+    -------
+    .. ipython:: python
+
+        from moldrug import fitness
+        print(fitness.receptor_order(dict(vina_score_type=['min', 'min', 'max'])))
+    """
+    vina_score_type = costfunc_kwargs.get('vina_score_type')
+    if not isinstance(vina_score_type, (list, tuple)):
+        return list(range(len(costfunc_kwargs.get('receptor_pdbqt_path', []))))
+    desirability = costfunc_kwargs.get('desirability') or {}
+    # Both the desirability of CostMultiReceptors and CostMultiReceptorsOnlyVina are accepted
+    desirability = desirability.get('vina_scores', desirability)
+    default = __get_default_desirability(multireceptor=True)['vina_scores']
+
+    def key(i):
+        weight = desirability.get(vina_score_type[i], {}).get('w', default[vina_score_type[i]]['w'])
+        return (-weight, vina_score_type[i] != 'max', i)
+    return sorted(range(len(vina_score_type)), key=key)
+
+
+# Receptor fan-out (see moldrug.utils._evaluate)
+CostMultiReceptors.receptor_tasks = receptor_tasks
+CostMultiReceptors.receptor_docking = _receptor_docking
+CostMultiReceptors.receptor_order = receptor_order
+CostMultiReceptorsOnlyVina.receptor_tasks = receptor_tasks
+CostMultiReceptorsOnlyVina.receptor_docking = _receptor_docking
+CostMultiReceptorsOnlyVina.receptor_order = receptor_order
 
 
 if __name__ == '__main__':
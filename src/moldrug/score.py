@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming scoring of molecule libraries with the cost functions of :mod:`moldrug.fitness`.
+
+The input (SMILES or SDF, optionally gzip-compressed) is read in batches, so the memory does not grow with the
+size of the library. For every batch the conformers are generated in parallel, the cost function is evaluated
+through the same machinery of :meth:`moldrug.utils.GA` (``njobs``, ``'auto'`` and the evaluation backends)
+(optionally with the multi-fidelity evaluation) and the results are appended to the output:
+
+* ``.csv`` / ``.csv.gz``: one row per molecule (idx, name, smiles, cost and the attributes set by the cost function).
+* ``.sdf`` / ``.sdf.gz``: the docking poses.
+* ``.parquet``: a directory with one parquet file per batch (it needs pyarrow).
+
+After every batch the input offset and the output size are saved on ``{output}.progress``
+and the hashes of the scored molecules on ``{output}.keys``. With resume, the output is truncated to the last
+finished batch and the scoring continues from its offset. Repeated molecules (canonical SMILES, see
+:meth:`moldrug.utils.DedupIndex`) are only scored once, also between resumed runs.
+
+It is the function behind ``moldrug score``:
+
+.. code-block:: bash
+
+    moldrug score config.yml library.smi.gz -o scores.csv.gz --njobs auto
+"""
+import csv
+import gzip
+import io
+import json
+import multiprocessing as mp
+import os
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Union
+
+import numpy as np
+from rdkit import Chem
+
+from moldrug import utils
+
+FORMATS = {'.csv': 'csv', '.csv.gz': 'csv', '.sdf': 'sdf', '.sdf.gz': 'sdf', '.parquet': 'parquet'}
+
+
+def _open(path: str, mode: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't' if 'b' not in mode else mode)
+    return open(path, mode)
+
+
+def read_molecules(path: str, offset: int = 0) -> Iterator[tuple]:
+    """Read a SMILES or SDF file (optionally gzip-compressed) record by record.
+    The SMILES files have one molecule per line: the SMILES and optionally its name (white-space separated);
+    empty lines and lines starting with # are ignored.
+
+    Parameters
+    ----------
+    path : str
+        The file. The format is taken from the extension: .sdf or .sdf.gz for SDF, any other for SMILES.
+    offset : int, optional
+        Number of records to skip (they are not parsed), by default 0
+
+    Yields
+    ------
+    tuple
+        (index, name, mol). index is the position of the record in the file and mol is None
+        if RDKit could not parse it.
+    """
+    sdf = path.endswith(('.sdf', '.sdf.gz'))
+    index = 0
+    with _open(path, 'r') as f:
+        if sdf:
+            block = []
+            for line in f:
+                block.append(line)
+                if not line.startswith('$$$$'):
+                    continue
+                if index >= offset:
+                    name = block[0].strip() or str(index)
+                    yield index, name, Chem.MolFromMolBlock(''.join(block))
+                block = []
+                index += 1
+        else:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                if index >= offset:
+                    fields = line.split(maxsplit=1)
+                    name = fields[1] if len(fields) > 1 else str(index)
+                    yield index, name, Chem.MolFromSmiles(fields[0])
+                index += 1
+
+
+def _prepare(args: tuple) -> utils.Individual:
+    """Create the Individual (conformer generation). It is defined on the top level
+    of the module in order to be picklable by multiprocessing.
+
+    Parameters
+    ----------
+    args : tuple
+        (mol, index, name, randomseed)
+
+    Returns
+    -------
+    utils.Individual
+        The individual with the extra attribute name; pdbqt is None if the conformer generation failed.
+    """
+    mol, index, name, randomseed = args
+    individual = utils.Individual(mol, idx=index, randomseed=randomseed)
+    individual.name = name
+    return individual
+
+
+def _row(individual: utils.Individual) -> Dict:
+    row = {'idx': individual.idx, 'name': individual.name, 'smiles': individual.smiles, 'cost': individual.cost}
+    for key, value in vars(individual).items():
+        if key in ['mol', 'pdbqt'] or key in row:
+            continue
+        if isinstance(value, (list, tuple, np.ndarray)):
+            value = json.dumps(np.asarray(value).tolist())
+        row[key] = value
+    return row
+
+
+class _Output:
+    """Append-only output of :meth:`moldrug.score.score` that can be truncated to a previous size"""
+    def __init__(self, path: str) -> None:
+        for ext, fmt in FORMATS.items():
+            if path.endswith(ext):
+                self.format = fmt
+                break
+        else:
+            raise ValueError(f"The output {path} must end with one of: {', '.join(FORMATS)}")
+        self.path = path
+        self.columns = None
+        if self.format == 'parquet':
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError as e:
+                raise ImportError("The parquet output needs pyarrow. Install it with: pip install pyarrow") from e
+
+    def size(self) -> int:
+        """Bytes of the csv or sdf file, number of files of the parquet directory"""
+        if self.format == 'parquet':
+            return len(self._parts()) if os.path.isdir(self.path) else 0
+        return os.path.getsize(self.path) if os.path.isfile(self.path) else 0
+
+    def _parts(self) -> List[str]:
+        return sorted(name for name in os.listdir(self.path) if name.endswith('.parquet'))
+
+    def truncate(self, size: int):
+        """Remove everything written after size (see :meth:`size`)"""
+        if self.format == 'parquet':
+            os.makedirs(self.path, exist_ok=True)
+            for name in self._parts()[size:]:
+                os.remove(os.path.join(self.path, name))
+        else:
+            with open(self.path, 'ab') as f:
+                f.truncate(size)
+            if self.format == 'csv' and size:
+                with _open(self.path, 'r') as f:
+                    self.columns = next(csv.reader(f))
+
+    def write(self, individuals: List[utils.Individual], pool: Union[None, 'mp.pool.Pool'] = None):
+        """Append the individuals and flush the output to disk. pool is used for the pdbqt to sdf conversion"""
+        if not individuals:
+            return
+        if self.format == 'parquet':
+            import pyarrow.parquet as pq
+            table = utils.to_arrow(individuals, return_pdbqt=False)
+            tmp = os.path.join(self.path, f".part-{self.size():08d}.tmp")
+            pq.write_table(table, tmp)
+            os.replace(tmp, os.path.join(self.path, f"part-{self.size():08d}.parquet"))
+            return
+
+        if self.format == 'csv':
+            rows = [_row(individual) for individual in individuals]
+            header = self.columns is None
+            if header:
+                self.columns = list(rows[0])
+                for row in rows[1:]:
+                    self.columns += [key for key in row if key not in self.columns]
+            sio = io.StringIO()
+            writer = csv.DictWriter(sio, fieldnames=self.columns, extrasaction='ignore')
+            if header:
+                writer.writeheader()
+            writer.writerows(rows)
+            text = sio.getvalue()
+        else:
+            args_list = []
+            for individual in individuals:
+                pdbqt = individual.pdbqt[0] if isinstance(individual.pdbqt, list) else individual.pdbqt
+                args_list.append((pdbqt, f"name :: {individual.name}, idx :: {individual.idx}, "
+                                  f"smiles :: {individual.smiles}, cost :: {individual.cost}"))
+            if pool:
+                records = pool.map(utils._pdbqt_to_sdf_record, args_list)
+            else:
+                records = map(utils._pdbqt_to_sdf_record, args_list)
+            text = ''.join(record for record in records if record is not None)
+
+        # Every batch is a new gzip member, so the file can be truncated between batches
+        with _open(self.path, 'a') as f:
+            f.write(text)
+            f.flush()
+        with open(self.path, 'ab') as f:
+            os.fsync(f.fileno())
+
+
+def _write_json(path: str, data: Dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def score(input_path: str, output_path: str, costfunc: Callable, costfunc_kwargs: Dict,
+          njobs: Union[int, str] = 1, backend: Union[None, utils.EvaluationBackend] = None,
+          batch_size: int = 1000, resume: bool = False, randomseed: Union[None, int] = None,
+          fidelity: Union[None, Dict, List[Dict]] = None) -> Dict:
+    """Score a library of molecules with a cost function and stream the results to output_path.
+
+    Parameters
+    ----------
+    input_path : str
+        SMILES or SDF file, optionally gzip-compressed (see :meth:`moldrug.score.read_molecules`)
+    output_path : str
+        The output: .csv, .csv.gz, .sdf, .sdf.gz or .parquet (directory)
+    costfunc : Callable
+        A cost function, e.g. :meth:`moldrug.fitness.Cost`
+    costfunc_kwargs : Dict
+        The keyword arguments of the cost function
+    njobs : Union[int, str], optional
+        Number of jobs or 'auto' (see :meth:`moldrug.utils.split_cpus`), by default 1
+    backend : Union[None, utils.EvaluationBackend], optional
+        The evaluation backend of the cost function, e.g. :meth:`moldrug.broker.BrokerBackend`, by default None
+    batch_size : int, optional
+        Number of input records read, scored and written at a time, by default 1000
+    resume : bool, optional
+        Continue from the progress saved in ``{output_path}.progress``. If False, the output is
+        overwritten, by default False
+    randomseed : Union[None, int], optional
+        Seed of the conformer generation, by default None
+    fidelity : Union[None, Dict, List[Dict]], optional
+        Multi-fidelity evaluation (see the argument fidelity of :meth:`moldrug.utils.GA`). Every batch is scored
+        with the screening tiers and the molecules selected with the threshold and/or fraction of fidelity
+        are scored with the production setting (costfunc_kwargs). In the output, fidelity_cost has one
+        value per evaluated tier, by default None
+
+    Returns
+    -------
+    Dict
+        The progress: input offset, output size and the number of unique, scored, duplicated and invalid molecules
+        (and promoted, the ones scored with the production setting, if fidelity is used)
+
+    Example
+    -------
+    .. code-block:: python
+
+        from moldrug import fitness, score
+        from moldrug.data import get_data
+        data = get_data('x0161')
+        score.score('library.smi', 'scores.csv', fitness.CostOnlyVina,
+                    {'receptor_pdbqt_path': data['protein']['pdbqt'], 'boxcenter': data['box']['boxcenter'],
+                     'boxsize': data['box']['boxsize'], 'vina_executable': 'vina'}, njobs=4)
+    """
+    output = _Output(output_path)
+    fidelity = utils._fidelity_config(fidelity)
+    progress_path = f"{output_path}.progress"
+    keys_path = f"{output_path}.keys"
+    index = utils.DedupIndex()
+    progress = {'input': os.path.abspath(input_path), 'offset': 0, 'size': 0,
+                'unique': 0, 'scored': 0, 'duplicates': 0, 'invalid': 0}
+    if fidelity:
+        progress['promoted'] = 0
+    if resume and os.path.isfile(progress_path):
+        with open(progress_path, 'r') as f:
+            progress.update(json.load(f))
+        keys = np.fromfile(keys_path, dtype=np.uint64) if os.path.isfile(keys_path) else np.zeros(0, np.uint64)
+        index.merge(keys[:progress['unique']])
+        with open(keys_path, 'ab') as f:
+            f.truncate(8 * progress['unique'])
+        print(f"Resuming from the record {progress['offset']} of {input_path}.")
+    else:
+        if os.path.isfile(keys_path):
+            os.remove(keys_path)
+    output.truncate(progress['size'])
+
+    if njobs == 'auto':
+        prepare_jobs = utils.available_cpus()
+    else:
+        prepare_jobs = njobs
+    kwargs_copy, costfunc_jobs_tmp_dir = utils._make_kwargs_copy(costfunc, costfunc_kwargs)
+    scheduler = utils.TaskScheduler()
+    records = read_molecules(input_path, offset=progress['offset'])
+    pool = mp.Pool(prepare_jobs) if prepare_jobs > 1 else None
+    try:
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            args_list = []
+            keys = []
+            for record_index, name, mol in batch:
+                if mol is None:
+                    progress['invalid'] += 1
+                    continue
+                key = index.key(mol)
+                if not index._add_key(key):
+                    progress['duplicates'] += 1
+                    continue
+                keys.append(key)
+                args_list.append((mol, record_index, name, randomseed))
+
+            if pool:
+                individuals = pool.map(_prepare, args_list, chunksize=max(1, len(args_list) // (4 * prepare_jobs)))
+            else:
+                individuals = list(map(_prepare, args_list))
+            valid = [individual for individual in individuals if individual.pdbqt]
+            progress['invalid'] += len(individuals) - len(valid)
+            if valid and fidelity:
+                valid = utils._evaluate_fidelity(
+                    costfunc, [(individual, kwargs_copy) for individual in valid], fidelity['tiers'],
+                    promote=lambda individuals: utils._promote(individuals, fidelity),
+                    njobs=njobs, backend=backend, scheduler=scheduler)
+                progress['promoted'] += sum(len(individual.fidelity_cost) > len(fidelity['tiers'])
+                                            for individual in valid)
+            elif valid:
+                valid = utils._evaluate(costfunc, [(individual, kwargs_copy) for individual in valid],
+                                        njobs=njobs, backend=backend, scheduler=scheduler)
+            output.write(valid, pool=pool)
+
+            with open(keys_path, 'ab') as f:
+                f.write(np.array(keys, dtype=np.uint64).tobytes())
+            progress['offset'] = batch[-1][0] + 1
+            progress['size'] = output.size()
+            progress['unique'] += len(keys)
+            progress['scored'] += len(valid)
+            _write_json(progress_path, progress)
+            print(f"{progress['offset']} records processed: {progress['scored']} scored, "
+                  f"{progress['duplicates']} duplicates and {progress['invalid']} invalid.")
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        costfunc_jobs_tmp_dir.cleanup()
+    utils.tar_errors('error')
+    return progress
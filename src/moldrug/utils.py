@@ -2,31 +2,37 @@
 # -*- coding: utf-8 -*-
 import bz2
 import collections.abc
+import contextlib
 import datetime
+import gzip
+import hashlib
+import io
+import json
 import multiprocessing as mp
 import os
 import random
 import shutil
+import signal
+import socket
 import subprocess
 import tempfile
 import time
+import zlib
 from copy import deepcopy
 from inspect import signature
-from typing import Callable, Dict, Iterable, List, Union
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Union
 from warnings import warn
 
 import dill as pickle
 import numpy as np
-import pandas as pd
-import tqdm
-from crem.crem import grow_mol, mutate_mol
-from meeko import (MoleculePreparation, PDBQTMolecule, PDBQTWriterLegacy,
-                   RDKitMolCreate)
 from rdkit import Chem, RDLogger
-from rdkit.Chem import AllChem, DataStructs, Descriptors, Lipinski, rdFMCS
+from rdkit.Chem import Lipinski
 
 from moldrug import __version__
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 RDLogger.DisableLog('rdApp.*')
 # # in order to pickle the isotope properties of the molecule
 # Chem.SetDefaultPickleProperties(Chem.PropertyPickleOptions.AllProps)
@@ -36,7 +42,11 @@ RDLogger.DisableLog('rdApp.*')
 ################################################
 
 
-def run(command: str, shell: bool = True, executable: str = '/bin/bash'):
+# Vina score assigned when the docking exceeded its time budget (see moldrug.fitness._vinadock)
+VINA_TIMEOUT_SCORE = 1e6
+
+
+def run(command: str, shell: bool = True, executable: str = '/bin/bash', timeout: Union[None, float] = None):
     """This function is just a useful wrapper around subprocess.run
 
     Parameters
@@ -47,6 +57,9 @@ def run(command: str, shell: bool = True, executable: str = '/bin/bash'):
         keyword of ``subprocess.Popen`` and ``subprocess.Popen``, by default True
     executable : str, optional
         keyword of ``subprocess.Popen`` and ``subprocess.Popen``, by default '/bin/bash'
+    timeout : Union[None, float], optional
+        Maximum wall-clock time in seconds. The command runs in its own process group and,
+        if the time is exceeded, the whole group is killed (also the children of the shell), by default None
 
     Returns
     -------
@@ -57,15 +70,312 @@ def run(command: str, shell: bool = True, executable: str = '/bin/bash'):
     ------
     RuntimeError
         In case of non-zero exit status on the provided command.
+    subprocess.TimeoutExpired
+        In case that timeout is exceeded.
     """
 
-    process = subprocess.run(command, shell=shell, executable=executable,
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    with subprocess.Popen(command, shell=shell, executable=executable, start_new_session=True,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) as process:
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            _kill_process_group(process)
+            process.communicate()
+            raise
+        except BaseException:
+            _kill_process_group(process)
+            raise
     returncode = process.returncode
     if returncode != 0:
         # print(f'Command {command} returned non-zero exit status {returncode}')
-        raise RuntimeError(process.stderr)
-    return process
+        raise RuntimeError(stderr)
+    return subprocess.CompletedProcess(process.args, returncode, stdout, stderr)
+
+
+def _kill_process_group(process: subprocess.Popen):
+    """Kill the process group of process (created with ``start_new_session=True``)"""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def launch(args: List[str], timeout: Union[None, float] = None, cpus: Union[None, Iterable[int]] = None,
+           nice: Union[None, int] = None, memory_limit: Union[None, int] = None,
+           on_line: Union[None, Callable] = None, capture_stdout: bool = True, cwd: Union[None, str] = None):
+    """Execute a program directly (without shell) from an argument vector.
+    Contrary to :meth:`moldrug.utils.run` there is not an extra bash process per launch,
+    the arguments are not split on spaces (paths with spaces are safe) and the standard output
+    is read incrementally (line by line) while the program is running.
+
+    Parameters
+    ----------
+    args : List[str]
+        The program followed by its arguments. Non string items are converted with str.
+    timeout : Union[None, float], optional
+        Maximum wall-clock time in seconds. The program runs in its own process group and,
+        if the time is exceeded, the whole group is killed, by default None
+    cpus : Union[None, Iterable[int]], optional
+        CPU affinity of the program (Linux only), by default None
+    nice : Union[None, int], optional
+        Niceness increment of the program, by default None
+    memory_limit : Union[None, int], optional
+        Limit (bytes) of the address space of the program (``RLIMIT_AS``, Linux only), by default None
+    on_line : Union[None, Callable], optional
+        Function called with every line (str, without the end of line) of the standard output
+        as soon as it is written by the program, by default None
+    capture_stdout : bool, optional
+        If False, the standard output is not kept in memory (only passed to on_line), by default True
+    cwd : Union[None, str], optional
+        Working directory of the program, by default None
+
+    Returns
+    -------
+    subprocess.CompletedProcess
+        With the attributes args, returncode, stdout and stderr.
+
+    Raises
+    ------
+    RuntimeError
+        In case of non-zero exit status on the provided command.
+    subprocess.TimeoutExpired
+        In case that timeout is exceeded.
+
+    Example
+    -------
+    .. ipython:: python
+
+        from moldrug.utils import launch
+        launch(['echo', 'Hello World']).stdout
+    """
+    import selectors
+    args = [str(arg) for arg in args]
+    end = None if timeout is None else time.monotonic() + timeout
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True, cwd=cwd,
+                               preexec_fn=_process_limits(cpus=cpus, nice=nice, memory_limit=memory_limit))
+    stdout, stderr, pending = [], [], b''
+    try:
+        with selectors.DefaultSelector() as selector:
+            selector.register(process.stdout, selectors.EVENT_READ)
+            selector.register(process.stderr, selectors.EVENT_READ)
+            while selector.get_map():
+                wait = None if end is None else end - time.monotonic()
+                if wait is not None and wait <= 0:
+                    raise subprocess.TimeoutExpired(args, timeout)
+                for key, _ in selector.select(wait):
+                    data = os.read(key.fileobj.fileno(), 65536)
+                    if not data:
+                        selector.unregister(key.fileobj)
+                        if key.fileobj is process.stdout and pending:
+                            data, pending = pending + b'\n', b''
+                        else:
+                            continue
+                    elif key.fileobj is process.stderr:
+                        stderr.append(data)
+                        continue
+                    else:
+                        data, pending = pending + data, b''
+                    *lines, pending = data.split(b'\n')
+                    for line in lines:
+                        line = line.decode(errors='replace')
+                        if on_line:
+                            on_line(line)
+                        if capture_stdout:
+                            stdout.append(line)
+        returncode = process.wait(None if end is None else max(end - time.monotonic(), 0))
+    except BaseException:
+        _kill_process_group(process)
+        process.wait()
+        raise
+    finally:
+        process.stdout.close()
+        process.stderr.close()
+    stdout = '\n'.join(stdout) + '\n' if stdout else ''
+    stderr = b''.join(stderr).decode(errors='replace')
+    if returncode != 0:
+        raise RuntimeError(stderr)
+    return subprocess.CompletedProcess(args, returncode, stdout, stderr)
+
+
+def _process_limits(cpus: Union[None, Iterable[int]] = None, nice: Union[None, int] = None,
+                    memory_limit: Union[None, int] = None) -> Union[None, Callable]:
+    """Get the function that sets the CPU affinity, niceness and address space limit on the child process
+    before the program is executed (``preexec_fn`` of :class:`subprocess.Popen`), so the program and all its threads
+    start with them. The options not supported by the platform are ignored. None if there is nothing to set."""
+    if cpus is None and not nice and memory_limit is None:
+        return None
+    cpus = None if cpus is None else set(cpus)
+
+    def preexec():
+        if cpus is not None and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, cpus)
+        if nice:
+            os.nice(nice)
+        if memory_limit is not None:
+            import resource
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    return preexec
+
+
+def is_timeout(individual: object) -> bool:
+    """Check if the docking of individual exceeded its time budget
+
+    Parameters
+    ----------
+    individual : Individual
+        An evaluated individual
+
+    Returns
+    -------
+    bool
+        True if some vina_score is :data:`moldrug.utils.VINA_TIMEOUT_SCORE`
+    """
+    vina_score = getattr(individual, 'vina_score', None)
+    if isinstance(vina_score, (list, tuple)):
+        return VINA_TIMEOUT_SCORE in vina_score
+    return vina_score == VINA_TIMEOUT_SCORE
+
+
+def _cpu_time() -> float:
+    """CPU time (user and system) of the process and its finished children (e.g. Vina)"""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class StageTimer:
+    """Accumulator of wall-clock and CPU time (seconds) of named stages of the hot path
+    (selection, mutation, confgen, meeko, vina, sa_qed, desirability, ...).
+    The CPU time includes the finished child processes, so the Vina runs are counted.
+    Stages can be nested (e.g. ``evaluation`` includes the time of the workers waiting on ``vina``).
+    The stages measured on the evaluation workers are also kept per worker.
+
+    Example
+    -------
+    .. ipython:: python
+
+        import time
+        from moldrug.utils import StageTimer
+        timer = StageTimer()
+        with timer('selection'):
+            time.sleep(0.01)
+        timer.as_dict()
+    """
+    def __init__(self) -> None:
+        self.stages = dict()
+        self.workers = dict()
+
+    @contextlib.contextmanager
+    def __call__(self, name: str):
+        wall, cpu = time.perf_counter(), _cpu_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wall, _cpu_time() - cpu)
+
+    @staticmethod
+    def _add(stages: Dict, name: str, wall: float, cpu: float, calls: int = 1):
+        stage = stages.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+        stage['wall'] += wall
+        stage['cpu'] += cpu
+        stage['calls'] += calls
+
+    def add(self, name: str, wall: float, cpu: float, calls: int = 1):
+        """Add a measurement
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage
+        wall : float
+            Wall-clock time (seconds)
+        cpu : float
+            CPU time (seconds)
+        calls : int, optional
+            Number of calls measured, by default 1
+        """
+        self._add(self.stages, name, wall, cpu, calls)
+
+    def merge(self, stages: Dict, worker: Union[None, str] = None):
+        """Add the stages measured somewhere else (e.g. on an evaluation worker)
+
+        Parameters
+        ----------
+        stages : Dict
+            The attribute stages of other StageTimer
+        worker : Union[None, str], optional
+            Identifier of the worker, by default None
+        """
+        for name, stage in stages.items():
+            self._add(self.stages, name, stage['wall'], stage['cpu'], stage['calls'])
+            if worker is not None:
+                self._add(self.workers.setdefault(worker, dict()), name, stage['wall'], stage['cpu'], stage['calls'])
+
+    def as_dict(self) -> Dict:
+        """Get the record of the timer
+
+        Returns
+        -------
+        Dict
+            ``{'stages': {stage: {'wall', 'cpu', 'calls'}}, 'workers': {worker: {stage: {...}}}}``
+        """
+        return {'stages': deepcopy(self.stages), 'workers': deepcopy(self.workers)}
+
+
+# Timer of the current process, it is replaced by GA on every generation and by _call_costfunc on every evaluation
+_stage_timer = StageTimer()
+
+
+def stage(name: str):
+    """Measure a stage of the hot path with the timer of the current process (see :meth:`moldrug.utils.StageTimer`)
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage
+
+    Returns
+    -------
+    contextlib.AbstractContextManager
+        Use it on a with statement
+
+    Example
+    -------
+    .. ipython:: python
+
+        from moldrug import utils
+        with utils.stage('my_stage'):
+            pass
+    """
+    return _stage_timer(name)
+
+
+def _swap_stage_timer(timer: StageTimer) -> StageTimer:
+    """Set the timer of the current process and return the previous one"""
+    global _stage_timer
+    previous, _stage_timer = _stage_timer, timer
+    return previous
+
+
+_meeko_preparators = {}
+
+
+def _meeko_preparator():
+    """Return the ``meeko.MoleculePreparation`` instance of the current process.
+
+    The preparator holds only its options, so one instance per worker is reused
+    for every molecule instead of building a new one on each call.
+
+    Returns
+    -------
+    meeko.MoleculePreparation
+        The cached preparator.
+    """
+    pid = os.getpid()
+    if pid not in _meeko_preparators:
+        from meeko import MoleculePreparation
+        _meeko_preparators.clear()
+        _meeko_preparators[pid] = MoleculePreparation()
+    return _meeko_preparators[pid]
 
 
 def confgen(mol: Chem.rdchem.Mol, return_mol: bool = False, randomseed: Union[int, None] = None):
@@ -87,20 +397,23 @@ def confgen(mol: Chem.rdchem.Mol, return_mol: bool = False, randomseed: Union[in
         If ``return_mol = True`` it will return a tuple ``(str[pdbqt], Chem.rdchem.Mol)``,
         if not only a ``str`` that represents the pdbqt.
     """
+    from meeko import PDBQTWriterLegacy
+    from rdkit.Chem import AllChem
     mol = Chem.AddHs(mol)
     if randomseed is None:
         randomSeed = -1
     else:
         randomSeed = randomseed
 
-    AllChem.EmbedMolecule(mol, randomSeed=randomSeed)
-    # The optimization introduce some sort of non-reproducible results.
-    # For that reason is not used when randomseed is set
-    if not randomseed:
-        AllChem.MMFFOptimizeMolecule(mol, maxIters=500)
-    preparator = MoleculePreparation()
-    mol_setups = preparator.prepare(mol)
-    pdbqt_string = PDBQTWriterLegacy.write_string(mol_setups[0])[0]
+    with stage('confgen'):
+        AllChem.EmbedMolecule(mol, randomSeed=randomSeed)
+        # The optimization introduce some sort of non-reproducible results.
+        # For that reason is not used when randomseed is set
+        if not randomseed:
+            AllChem.MMFFOptimizeMolecule(mol, maxIters=500)
+    with stage('meeko'):
+        mol_setups = _meeko_preparator().prepare(mol)
+        pdbqt_string = PDBQTWriterLegacy.write_string(mol_setups[0])[0]
     if return_mol:
         return (pdbqt_string, mol)
     else:
@@ -134,6 +447,7 @@ def update_reactant_zone(parent: Chem.rdchem.Mol, offspring: Chem.rdchem.Mol,
         The function returns a tuple composed by two list of integers.
         The first list is offspring_replace_ids and the second one offspring_protected_ids.
     """
+    from rdkit.Chem import rdFMCS
 
     # Finding Maximum Common Substructure (MCS) and getting the SMARTS
     mcs = rdFMCS.FindMCS([parent, offspring], matchValences=True, ringMatchesRingOnly=True)
@@ -187,6 +501,7 @@ def get_sim(ms: List[Chem.rdchem.Mol], ref_fps: List):
     list[Chem.rdchem.Mol]
         A list of molecules with the higher similarity with their corresponded ref_fps value.
     """
+    from rdkit.Chem import AllChem, DataStructs
     output = []
     fps1 = [AllChem.GetMorganFingerprintAsBitVect(m, 2) for m in ms]
     for fp in fps1:
@@ -215,6 +530,7 @@ def get_similar_mols(mols: List, ref_mol: Chem.rdchem.Mol, pick: int, beta: floa
     list
         A list of picked molecules.
     """
+    from rdkit.Chem import AllChem, DataStructs
     if pick >= len(mols):
         return mols
     else:
@@ -230,6 +546,117 @@ def get_similar_mols(mols: List, ref_mol: Chem.rdchem.Mol, pick: int, beta: floa
         return [mols[index] for index in indexes]
 
 
+class SurrogateModel:
+    """A fast regression model (fingerprint -> cost) used by :meth:`moldrug.utils.GA` to pre-screen the offspring
+    before the evaluation of the cost function. It is a ridge regression on Morgan fingerprints
+    solved in closed form with NumPy (dual form if there are fewer samples than bits).
+
+    Any other object with the methods ``fit(mols, costs)`` and ``predict(mols)`` could be used instead
+    (e.g. a wrapper around a scikit-learn model with the featurizer of ``Contrib/using_models``).
+
+    Example
+    -------
+    .. ipython:: python
+
+        from moldrug import utils
+        from rdkit import Chem
+        mols = [Chem.MolFromSmiles(smi) for smi in ['CCO', 'CCCO', 'CCCCO', 'c1ccccc1O']]
+        model = utils.SurrogateModel(nBits=256).fit(mols, [0.9, 0.7, 0.5, 0.1])
+        print(model.predict([Chem.MolFromSmiles('CCCCCO')]))
+    """
+    def __init__(self, radius: int = 2, nBits: int = 1024, alpha: float = 1.0, max_train: int = 5000) -> None:
+        """Constructor
+
+        Parameters
+        ----------
+        radius : int, optional
+            Radius of the Morgan fingerprint, by default 2
+        nBits : int, optional
+            Length of the Morgan fingerprint, by default 1024
+        alpha : float, optional
+            Regularization strength, by default 1.0
+        max_train : int, optional
+            Maximum number of training samples, the last max_train provided to :meth:`fit` are used, by default 5000
+        """
+        self.radius = radius
+        self.nBits = nBits
+        self.alpha = alpha
+        self.max_train = max_train
+        self.coef_ = None
+        self.intercept_ = None
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.coef_ is not None
+
+    def featurize(self, mols: Iterable[Chem.rdchem.Mol]) -> np.ndarray:
+        """Morgan fingerprints as a matrix
+
+        Parameters
+        ----------
+        mols : Iterable[Chem.rdchem.Mol]
+            The molecules
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (len(mols), nBits)
+        """
+        from rdkit.Chem import AllChem
+        mols = list(mols)
+        X = np.zeros((len(mols), self.nBits), dtype=np.float64)
+        for i, mol in enumerate(mols):
+            fp = AllChem.GetMorganFingerprintAsBitVect(Chem.RemoveHs(mol), self.radius, nBits=self.nBits)
+            X[i, list(fp.GetOnBits())] = 1
+        return X
+
+    def fit(self, mols: Iterable[Chem.rdchem.Mol], costs: Iterable[float]):
+        """Fit the model. Samples with non-finite cost are ignored.
+
+        Parameters
+        ----------
+        mols : Iterable[Chem.rdchem.Mol]
+            The molecules
+        costs : Iterable[float]
+            The cost of each molecule
+
+        Returns
+        -------
+        SurrogateModel
+            The fitted model
+        """
+        mols, costs = list(mols), np.asarray(list(costs), dtype=np.float64)
+        finite = np.isfinite(costs)
+        mols = [mol for mol, keep in zip(mols, finite) if keep][-self.max_train:]
+        y = costs[finite][-self.max_train:]
+        if len(y) == 0:
+            raise ValueError("SurrogateModel needs at least one sample with finite cost.")
+        X = self.featurize(mols)
+        self.intercept_ = y.mean()
+        y = y - self.intercept_
+        if X.shape[0] <= X.shape[1]:
+            # Dual form: w = X^T (X X^T + alpha I)^-1 y
+            self.coef_ = X.T @ np.linalg.solve(X @ X.T + self.alpha * np.eye(X.shape[0]), y)
+        else:
+            self.coef_ = np.linalg.solve(X.T @ X + self.alpha * np.eye(X.shape[1]), X.T @ y)
+        return self
+
+    def predict(self, mols: Iterable[Chem.rdchem.Mol]) -> np.ndarray:
+        """Predict the cost
+
+        Parameters
+        ----------
+        mols : Iterable[Chem.rdchem.Mol]
+            The molecules
+
+        Returns
+        -------
+        np.ndarray
+            The predicted costs
+        """
+        return self.featurize(mols) @ self.coef_ + self.intercept_
+
+
 def lipinski_filter(mol: Chem.rdchem.Mol, maxviolation: int = 2):
     """Implementation of Lipinski filter.
 
@@ -245,6 +672,7 @@ def lipinski_filter(mol: Chem.rdchem.Mol, maxviolation: int = 2):
     bool
         True if the molecule present less than maxviolation violations; otherwise False.
     """
+    from rdkit.Chem import Descriptors
     filter_prop = {
         'NumHAcceptors': {'method': Lipinski.NumHAcceptors, 'cutoff': 10},
         'NumHDonors': {'method': Lipinski.NumHDonors, 'cutoff': 5},
@@ -276,6 +704,7 @@ def lipinski_profile(mol: Chem.rdchem.Mol):
     dict
         A dictionary with molecular properties.
     """
+    from rdkit.Chem import Descriptors
     properties = {
         'NumHAcceptors': {'method': Lipinski.NumHAcceptors, 'cutoff': 10},
         'NumHDonors': {'method': Lipinski.NumHDonors, 'cutoff': 5},
@@ -307,6 +736,86 @@ def lipinski_profile(mol: Chem.rdchem.Mol):
     return profile
 
 
+class PreFilter:
+    """Cheap filters applied on the 2D molecule of the offspring before the conformer generation
+    (see the argument prefilter of :meth:`moldrug.utils.GA`). The rejected molecules never pay for the
+    embedding nor the docking.
+
+    Example
+    -------
+    .. ipython:: python
+
+        from moldrug import utils
+        from rdkit import Chem
+        prefilter = utils.PreFilter(max_heavy_atoms=20, max_rotatable_bonds=5, blacklist=['[N+](=O)[O-]'])
+        for smi in ['CCO', 'CCCCCCCCCC', 'c1ccccc1[N+](=O)[O-]']:
+            print(smi, prefilter.reject(Chem.MolFromSmiles(smi)))
+    """
+    def __init__(self, max_wt: Union[None, float] = None, max_heavy_atoms: Union[None, int] = None,
+                 max_rotatable_bonds: Union[None, int] = None, lipinski: Union[None, int] = None,
+                 blacklist: Union[None, Iterable[Union[str, Chem.rdchem.Mol]]] = None) -> None:
+        """Constructor. The filters set to None are not applied.
+
+        Parameters
+        ----------
+        max_wt : Union[None, float], optional
+            Maximum molecular weight, by default None
+        max_heavy_atoms : Union[None, int], optional
+            Maximum number of heavy atoms, by default None
+        max_rotatable_bonds : Union[None, int], optional
+            Maximum number of rotatable bonds, by default None
+        lipinski : Union[None, int], optional
+            maxviolation of :meth:`moldrug.utils.lipinski_filter`, by default None
+        blacklist : Union[None, Iterable[Union[str, Chem.rdchem.Mol]]], optional
+            Forbidden substructures (SMARTS or RDKit molecules), by default None
+
+        Raises
+        ------
+        ValueError
+            In case of an invalid SMARTS on blacklist.
+        """
+        self.max_wt = max_wt
+        self.max_heavy_atoms = max_heavy_atoms
+        self.max_rotatable_bonds = max_rotatable_bonds
+        self.lipinski = lipinski
+        self.blacklist = []
+        for pattern in blacklist or []:
+            if isinstance(pattern, str):
+                query = Chem.MolFromSmarts(pattern)
+                if query is None:
+                    raise ValueError(f"Invalid SMARTS on blacklist: {pattern}")
+                pattern = query
+            self.blacklist.append(pattern)
+
+    def reject(self, mol: Chem.rdchem.Mol) -> Union[None, str]:
+        """Check the molecule, the cheapest filters first.
+
+        Parameters
+        ----------
+        mol : Chem.rdchem.Mol
+            An RDKit molecule.
+
+        Returns
+        -------
+        Union[None, str]
+            None if the molecule passes all the filters; otherwise the name of the first failed filter:
+            heavy_atoms, wt, rotatable_bonds, blacklist or lipinski.
+        """
+        if self.max_heavy_atoms is not None and mol.GetNumHeavyAtoms() > self.max_heavy_atoms:
+            return 'heavy_atoms'
+        if self.max_wt is not None:
+            from rdkit.Chem import Descriptors
+            if Descriptors.MolWt(mol) > self.max_wt:
+                return 'wt'
+        if self.max_rotatable_bonds is not None and Lipinski.NumRotatableBonds(mol) > self.max_rotatable_bonds:
+            return 'rotatable_bonds'
+        if any(mol.HasSubstructMatch(pattern) for pattern in self.blacklist):
+            return 'blacklist'
+        if self.lipinski is not None and not lipinski_filter(mol, maxviolation=self.lipinski):
+            return 'lipinski'
+        return None
+
+
 def LargerTheBest(Value: float, LowerLimit: float, Target: float, r: float = 1) -> float:
     """Desirability function used when larger values are the targets. If Value is higher
     or equal than the target it will return 1; if it is lower than LowerLimit it will return 0;
@@ -567,6 +1076,129 @@ def softmax(x, axis=None):
     x_max = np.amax(x, axis=axis, keepdims=True)
     exp_x_shifted = np.exp(x - x_max)
     return exp_x_shifted / np.sum(exp_x_shifted, axis=axis, keepdims=True)
+
+
+def cache_dir(name: str = '') -> str:
+    """Directory of the files cached by moldrug (e.g. the cropped receptors).
+    It is ``$MOLDRUG_CACHE`` if the environment variable is set, otherwise ``~/.cache/moldrug``.
+
+    Parameters
+    ----------
+    name : str, optional
+        Sub-directory, by default ''
+
+    Returns
+    -------
+    str
+        The path of the directory (it is created if needed).
+    """
+    path = os.path.join(os.environ.get('MOLDRUG_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'moldrug')), name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+# Digests of the files read by the current process: (path, mtime, size) -> sha1
+_file_digests = {}
+
+
+def _file_digest(path: str) -> str:
+    """SHA1 of the content of a file. It is only computed once per process for every version of the file.
+
+    Parameters
+    ----------
+    path : str
+        The file
+
+    Returns
+    -------
+    str
+        The hexadecimal digest.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key not in _file_digests:
+        with open(path, 'rb') as f:
+            _file_digests[key] = hashlib.sha1(f.read()).hexdigest()
+    return _file_digests[key]
+
+
+# Cropped receptors of the current process: (path, mtime, size, box, margin) -> cropped path
+_cropped_receptors = {}
+
+
+def crop_receptor(receptor_path: str, boxcenter: List[float], boxsize: List[float], margin: float = 8.0,
+                  cache: Union[None, str] = None) -> str:
+    """Write the receptor (PDB or PDBQT) cropped to the docking box plus margin. Only the residues with at least
+    one atom inside the extended box are kept (CONECT and ANISOU records are removed). The cropped file is cached
+    by the hash of the receptor, box and margin, so it is only written once for every receptor and box.
+    Receptors with flexible residues (ROOT records) are not cropped.
+
+    Parameters
+    ----------
+    receptor_path : str
+        The receptor file
+    boxcenter : List[float]
+        Center of the box (x, y, z)
+    boxsize : List[float]
+        Size of the box (x, y, z)
+    margin : float, optional
+        Distance (angstrom) added to every side of the box. Vina does not consider interactions
+        beyond 8 angstrom, by default 8.0
+    cache : Union[None, str], optional
+        Directory of the cropped files, by default None (``cache_dir('receptors')``)
+
+    Returns
+    -------
+    str
+        The path of the cropped receptor.
+
+    Example
+    -------
+    .. ipython:: python
+
+        import os
+        from moldrug import utils
+        from moldrug.data import get_data
+        data = get_data('x0161')
+        cropped = utils.crop_receptor(data['protein']['pdbqt'], data['box']['boxcenter'], data['box']['boxsize'])
+        print(os.path.getsize(cropped) / os.path.getsize(data['protein']['pdbqt']))
+    """
+    receptor_path = os.path.abspath(receptor_path)
+    stat = os.stat(receptor_path)
+    box = (tuple(float(x) for x in boxcenter), tuple(float(x) for x in boxsize), float(margin))
+    memo_key = (receptor_path, stat.st_mtime_ns, stat.st_size, box, cache)
+    if memo_key in _cropped_receptors and os.path.isfile(_cropped_receptors[memo_key]):
+        return _cropped_receptors[memo_key]
+    digest = hashlib.sha1(f"{_file_digest(receptor_path)}{box}".encode()).hexdigest()[:16]
+    root, ext = os.path.splitext(os.path.basename(receptor_path))
+    cropped_path = os.path.join(cache or cache_dir('receptors'), f"{root}_{digest}{ext}")
+    if not os.path.isfile(cropped_path):
+        with open(receptor_path, 'r') as f:
+            lines = f.readlines()
+        if any(line.startswith('ROOT') for line in lines):
+            # Flexible residues
+            return receptor_path
+        low = np.asarray(box[0]) - np.asarray(box[1]) / 2 - margin
+        high = np.asarray(box[0]) + np.asarray(box[1]) / 2 + margin
+        residues = set()
+        for line in lines:
+            if line.startswith(('ATOM', 'HETATM')):
+                xyz = np.array([float(line[30:38]), float(line[38:46]), float(line[46:54])])
+                if np.all(xyz >= low) and np.all(xyz <= high):
+                    # Residue name, chain, residue number and insertion code
+                    residues.add(line[17:27])
+        tmp = f"{cropped_path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            for line in lines:
+                if line.startswith(('CONECT', 'ANISOU')):
+                    continue
+                if line.startswith(('ATOM', 'HETATM')) and line[17:27] not in residues:
+                    continue
+                f.write(line)
+        os.replace(tmp, cropped_path)
+    _cropped_receptors[memo_key] = cropped_path
+    return cropped_path
 ###########################################################################
 #   Classes to work with Vina
 ###########################################################################
@@ -771,6 +1403,8 @@ class Individual:
     def __eq__(self, other: object) -> bool:
         if self.__class__ is other.__class__:
             return self.smiles == other.smiles  # self.cost == other.cost and
+        elif isinstance(other, CompactIndividual):
+            return self.smiles == other.smiles
         else:
             return False  # self.smiles == other
 
@@ -858,100 +1492,667 @@ class Individual:
         return result
 
 
-def make_sdf(individuals: List[Individual], sdf_name: str = 'out'):
-    """This function create a sdf file from a list of Individuals based on their pdbqt attribute
-    This assume that the cost function update the pdbqt attribute after the docking with the conformations obtained
-    In the case of multiple receptor the attribute should be a list of valid pdbqt strings.
-    Here will export several sdf depending how many pdbqt string are in the pdbqt attribute.
+class PropertyTable:
+    """Array-backed storage of the attributes of many individuals.
+    Numeric attributes (int and float) are kept on typed NumPy arrays with a presence mask;
+    any other attribute is kept on a sparse dictionary (row -> value).
+    It is used by :meth:`moldrug.utils.CompactIndividual`.
+    """
+    def __init__(self, capacity: int = 1024) -> None:
+        """Constructor
 
-    Parameters
-    ----------
-    individuals : list[Individual]
-        A list of individuals
-    sdf_name : str, optional
-        The name for the output file. Could be a ``path + sdf_name``.
-        The sdf extension will be added by the function, by default 'out'
+        Parameters
+        ----------
+        capacity : int, optional
+            Initial number of rows allocated for the numeric columns, by default 1024
+        """
+        self._capacity = capacity
+        self._n = 0
+        self._names = []
+        self._numeric = dict()  # name -> (values, mask)
+        self._objects = dict()  # name -> {row: value}
 
-    Example
-    -------
-    .. ipython:: python
+    def __len__(self):
+        return self._n
 
-        import tempfile, os
-        from moldrug import utils
-        from rdkit import Chem
-        # Create some temporal dir
-        tmp_path = tempfile.TemporaryDirectory()
-        # Creating two individuals
-        I1 = utils.Individual(Chem.MolFromSmiles('CCCCl'))
-        I2 = utils.Individual(Chem.MolFromSmiles('CCOCCCF'))
-        # Creating the pdbqt attribute as a list with the pdbqt attribute (this is just a silly example)
-        I1.pdbqt = [I1.pdbqt, I1.pdbqt]
-        I2.pdbqt = [I2.pdbqt, I2.pdbqt]
-        utils.make_sdf([I1, I2], sdf_name = os.path.join(tmp_path.name, 'out'))
-        # Two files were created
-        # In the other hand, if the attribute pdbqt is not a list, only one file is going to be created
-        # Set pdbqt to the original value
-        I1.pdbqt = I1.pdbqt[0]
-        I2.pdbqt = I2.pdbqt[0]
-        utils.make_sdf([I1, I2], sdf_name = os.path.join(tmp_path.name, 'out'))
-        # Only one file will be created if the pdbqt has not len in some of
-        # the individuals or they presents different lens as well.
-        # In this case the pdbqts will be completely ignored and pdbqt attribute
-        # will be used for the construction of the sdf file
-        I1.pdbqt = [I1.pdbqt, I1.pdbqt, I1.pdbqt]
-        I2.pdbqt = [I2.pdbqt, I2.pdbqt]
-        utils.make_sdf([I1, I2], sdf_name = os.path.join(tmp_path.name, 'out'))
-    """
-    pdbqt_tmp = tempfile.NamedTemporaryFile(suffix='.pdbqt')
+    @property
+    def names(self):
+        return list(self._names)
 
-    # Check for the attribute pdbqt in all passed individuals and that all of them have the same number of pdbqt
-    check = True
-    NumbOfpdbqt = set()
-    for individual in individuals:
-        if isinstance(individual.pdbqt, List):
-            NumbOfpdbqt.add(len(individual.pdbqt))
-        else:
+    def _grow(self):
+        self._capacity *= 2
+        for name, (values, mask) in self._numeric.items():
+            new_values = np.zeros(self._capacity, dtype=values.dtype)
+            new_values[:len(values)] = values
+            new_mask = np.zeros(self._capacity, dtype=bool)
+            new_mask[:len(mask)] = mask
+            self._numeric[name] = (new_values, new_mask)
+
+    def _to_objects(self, name: str):
+        values, mask = self._numeric.pop(name)
+        self._objects[name] = {row: values[row].item() for row in np.flatnonzero(mask[:self._n])}
+
+    def append(self, attributes: Dict) -> int:
+        """Add a new row
+
+        Parameters
+        ----------
+        attributes : Dict
+            Name and value of the attributes
+
+        Returns
+        -------
+        int
+            The row index
+        """
+        if self._n == self._capacity:
+            self._grow()
+        row = self._n
+        self._n += 1
+        for name, value in attributes.items():
+            if name not in self._numeric and name not in self._objects:
+                self._names.append(name)
+                if isinstance(value, (int, np.integer)) and not isinstance(value, (bool, np.bool_)):
+                    self._numeric[name] = (np.zeros(self._capacity, dtype=np.int64), np.zeros(self._capacity, dtype=bool))
+                elif isinstance(value, (float, np.floating)):
+                    self._numeric[name] = (np.zeros(self._capacity, dtype=np.float64), np.zeros(self._capacity, dtype=bool))
+                else:
+                    self._objects[name] = dict()
+
+            if name in self._numeric:
+                values, mask = self._numeric[name]
+                if isinstance(value, (int, np.integer)) and not isinstance(value, (bool, np.bool_)):
+                    pass
+                elif isinstance(value, (float, np.floating)):
+                    if values.dtype != np.float64:
+                        values = values.astype(np.float64)
+                        self._numeric[name] = (values, mask)
+                else:
+                    self._to_objects(name)
+            if name in self._numeric:
+                values, mask = self._numeric[name]
+                values[row] = value
+                mask[row] = True
+            else:
+                self._objects[name][row] = value
+        return row
+
+    def get(self, row: int, name: str):
+        """Get the value of an attribute
+
+        Parameters
+        ----------
+        row : int
+            The row index
+        name : str
+            The name of the attribute
+
+        Returns
+        -------
+        object
+            The value
+
+        Raises
+        ------
+        KeyError
+            If the attribute was not set for the row.
+        """
+        if name in self._numeric:
+            values, mask = self._numeric[name]
+            if mask[row]:
+                return values[row].item()
+        elif name in self._objects:
+            if row in self._objects[name]:
+                return self._objects[name][row]
+        raise KeyError(f"{name} is not defined for row {row}")
+
+    def row(self, row: int) -> Dict:
+        """Get all the attributes defined on a row
+
+        Parameters
+        ----------
+        row : int
+            The row index
+
+        Returns
+        -------
+        Dict
+            Name and value of the attributes
+        """
+        result = dict()
+        for name in self._names:
+            try:
+                result[name] = self.get(row, name)
+            except KeyError:
+                pass
+        return result
+
+
+class PoseStore:
+    """Append-only, on-disk storage for poses (pdbqt strings or list of pdbqt strings).
+    Every pose is pickled, compressed with zlib and appended to a single file; only the
+    offsets are kept in memory. It is used by :meth:`moldrug.utils.CompactIndividual`.
+    """
+    def __init__(self, path: Union[str, None] = None) -> None:
+        """Constructor
+
+        Parameters
+        ----------
+        path : Union[str, None], optional
+            The file where the poses will be stored. If None, a hidden file
+            is created in the current directory, by default None
+        """
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix='.moldrug_poses_', suffix='.bin', dir='.')
+            os.close(fd)
+        self.path = os.path.abspath(path)
+        self._offsets = np.zeros(0, dtype=np.int64)
+        self._sizes = np.zeros(0, dtype=np.int64)
+        self._n = 0
+        self._writer = None
+        self._reader = None
+
+    def __len__(self):
+        return self._n
+
+    def put(self, pose: Union[str, List[str]]) -> int:
+        """Store a pose
+
+        Parameters
+        ----------
+        pose : Union[str, List[str]]
+            The pose
+
+        Returns
+        -------
+        int
+            The key to retrieve the pose with :meth:`get`
+        """
+        if self._writer is None:
+            self._writer = open(self.path, 'ab')
+        data = zlib.compress(pickle.dumps(pose))
+        if self._n == len(self._offsets):
+            self._offsets = np.resize(self._offsets, max(1024, 2 * self._n))
+            self._sizes = np.resize(self._sizes, max(1024, 2 * self._n))
+        self._offsets[self._n] = self._writer.tell()
+        self._sizes[self._n] = len(data)
+        self._writer.write(data)
+        self._n += 1
+        return self._n - 1
+
+    def get(self, key: int) -> Union[str, List[str]]:
+        """Retrieve a pose
+
+        Parameters
+        ----------
+        key : int
+            The key returned by :meth:`put`
+
+        Returns
+        -------
+        Union[str, List[str]]
+            The pose
+        """
+        if key >= self._n:
+            raise KeyError(key)
+        if self._writer is not None:
+            self._writer.flush()
+        if self._reader is None:
+            self._reader = open(self.path, 'rb')
+        self._reader.seek(self._offsets[key])
+        return pickle.loads(zlib.decompress(self._reader.read(self._sizes[key])))
+
+    def close(self):
+        for handle in [self._writer, self._reader]:
+            if handle is not None:
+                handle.close()
+        self._writer = None
+        self._reader = None
+
+    def __getstate__(self):
+        if self._writer is not None:
+            self._writer.flush()
+        state = self.__dict__.copy()
+        state['_writer'] = None
+        state['_reader'] = None
+        return state
+
+
+class CompactIndividual:
+    """Compact and read-only record of an :meth:`moldrug.utils.Individual`.
+    It is used by :meth:`moldrug.utils.GA` (``compact_history = True``) to keep the history of
+    the simulation (``SawIndividuals``) with a small memory footprint:
+
+    * ``idx``, ``cost`` and ``smiles`` are stored on slots.
+    * The molecule is stored as the RDKit binary representation.
+    * The rest of the attributes are stored on a shared :meth:`moldrug.utils.PropertyTable`.
+    * The pdbqt attribute is stored on a shared :meth:`moldrug.utils.PoseStore` and only read on demand.
+
+    Like :meth:`moldrug.utils.Individual`, it is hashable based on the smiles attribute,
+    that is also used for '==' comparison (also against Individual); the cost is used for sorting.
+    """
+    __slots__ = ('idx', 'cost', 'smiles', '_mol_binary', '_row', '_table', '_pose_key', '_store')
+
+    def __init__(self, individual: Individual, table: PropertyTable, store: PoseStore) -> None:
+        """Constructor
+
+        Parameters
+        ----------
+        individual : Individual
+            The individual to compact
+        table : PropertyTable
+            Where the attributes will be stored
+        store : PoseStore
+            Where the pdbqt attribute will be stored
+        """
+        attributes = individual.__dict__.copy()
+        mol = attributes.pop('mol')
+        pdbqt = attributes.pop('pdbqt', None)
+        self.idx = attributes.pop('idx', 0)
+        self.cost = attributes.pop('cost', np.inf)
+        self.smiles = individual.smiles
+        self._mol_binary = mol.ToBinary()
+        self._table = table
+        self._row = table.append(attributes)
+        self._store = store
+        self._pose_key = store.put(pdbqt)
+
+    @property
+    def mol(self):
+        return Chem.Mol(self._mol_binary)
+
+    @property
+    def pdbqt(self):
+        return self._store.get(self._pose_key)
+
+    def __getattr__(self, name):
+        # Only called if the attribute is not found on the slots or properties
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._table.get(self._row, name)
+        except KeyError:
+            raise AttributeError(f"{self.__class__.__name__} object has no attribute {name}")
+
+    def as_dict(self) -> Dict:
+        """Get all the attributes. The heavy ones (mol and pdbqt) are returned as
+        :meth:`moldrug.utils.LazyAttribute`.
+
+        Returns
+        -------
+        Dict
+            Name and value of the attributes
+        """
+        result = {
+            'mol': LazyAttribute(self, 'mol'),
+            'pdbqt': LazyAttribute(self, 'pdbqt'),
+            'cost': self.cost,
+            'idx': self.idx,
+        }
+        result.update(self._table.row(self._row))
+        return result
+
+    def to_individual(self) -> Individual:
+        """Recover the full Individual
+
+        Returns
+        -------
+        Individual
+            The Individual with all its attributes.
+        """
+        individual = Individual.__new__(Individual)
+        individual.mol = self.mol
+        individual.pdbqt = self.pdbqt
+        individual.cost = self.cost
+        individual.idx = self.idx
+        for name, value in self._table.row(self._row).items():
+            setattr(individual, name, value)
+        return individual
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(idx = {self.idx}, smiles = {self.smiles}, cost = {self.cost})"
+
+    def __hash__(self):
+        return hash(self.smiles)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (Individual, CompactIndividual)):
+            return self.smiles == other.smiles
+        else:
+            return False
+
+    def __gt__(self, other: object) -> bool:
+        return self.cost > other.cost
+
+    def __ge__(self, other: object) -> bool:
+        return self.cost >= other.cost
+
+    def __lt__(self, other: object) -> bool:
+        return self.cost < other.cost
+
+    def __le__(self, other: object) -> bool:
+        return self.cost <= other.cost
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            object.__setattr__(self, slot, value)
+
+
+class DedupIndex:
+    """Set-like index of the identity of the molecules seen during a simulation.
+    It stores 64-bit hashes (blake2b) of the canonical SMILES on a NumPy-backed
+    open-addressing table (linear probing), so membership queries are O(1) and the memory
+    footprint is 8 bytes per slot without holding the molecules.
+    The index is picklable (it is saved with the GA checkpoint) and it can also be
+    saved/loaded by itself with :meth:`save` and :meth:`load`.
+    The SMILES strings are hashed as given (assumed to be canonical), use RDKit molecules
+    or Individuals to look up non canonical SMILES.
+
+    Example
+    -------
+    .. ipython:: python
+
+        from moldrug import utils
+        from rdkit import Chem
+        index = utils.DedupIndex()
+        index.add(utils.Individual(Chem.MolFromSmiles('CCO')))
+        print('CCO' in index, Chem.MolFromSmiles('OCC') in index, Chem.MolFromSmiles('CCCO') in index, len(index))
+    """
+    def __init__(self, capacity: int = 1024, max_load: float = 0.5) -> None:
+        """Constructor
+
+        Parameters
+        ----------
+        capacity : int, optional
+            Initial number of slots, it will be rounded to the next power of two, by default 1024
+        max_load : float, optional
+            Maximum fraction of occupied slots before the table is doubled, by default 0.5
+        """
+        capacity = 1 << max(3, int(capacity - 1).bit_length())
+        self.max_load = max_load
+        self._keys = np.zeros(capacity, dtype=np.uint64)
+        self._n = 0
+
+    def __len__(self):
+        return self._n
+
+    @staticmethod
+    def key(item: Union[str, Chem.rdchem.Mol, Individual]) -> int:
+        """Get the 64-bit hash of the canonical identity of item
+
+        Parameters
+        ----------
+        item : Union[str, Chem.rdchem.Mol, Individual]
+            A SMILES (assumed to be canonical), an RDKit molecule or any object with the attribute smiles
+            (e.g. :meth:`moldrug.utils.Individual`)
+
+        Returns
+        -------
+        int
+            The hash, 0 is never returned because it marks the empty slots
+        """
+        if isinstance(item, str):
+            smiles = item
+        elif isinstance(item, Chem.rdchem.Mol):
+            smiles = Chem.MolToSmiles(Chem.RemoveHs(item))
+        else:
+            smiles = item.smiles
+        return int.from_bytes(hashlib.blake2b(smiles.encode(), digest_size=8).digest(), 'little') or 1
+
+    def _slot(self, key: int) -> int:
+        mask = len(self._keys) - 1
+        i = key & mask
+        while True:
+            current = int(self._keys[i])
+            if current == key or current == 0:
+                return i
+            i = (i + 1) & mask
+
+    def _grow(self):
+        old_keys = self._keys[self._keys != 0]
+        self._keys = np.zeros(2 * len(self._keys), dtype=np.uint64)
+        for key in old_keys:
+            key = int(key)
+            self._keys[self._slot(key)] = key
+
+    def add(self, item: Union[str, Chem.rdchem.Mol, Individual]) -> bool:
+        """Add item to the index
+
+        Parameters
+        ----------
+        item : Union[str, Chem.rdchem.Mol, Individual]
+            See :meth:`key`
+
+        Returns
+        -------
+        bool
+            True if item was not already present
+        """
+        return self._add_key(self.key(item))
+
+    def _add_key(self, key: int) -> bool:
+        i = self._slot(key)
+        if self._keys[i]:
+            return False
+        self._keys[i] = key
+        self._n += 1
+        if self._n > self.max_load * len(self._keys):
+            self._grow()
+        return True
+
+    def update(self, items: Iterable):
+        """Add several items
+
+        Parameters
+        ----------
+        items : Iterable
+            See :meth:`key`
+        """
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item) -> bool:
+        key = self.key(item)
+        return bool(self._keys[self._slot(key)])
+
+    def keys(self) -> np.ndarray:
+        """Get the stored hashes
+
+        Returns
+        -------
+        np.ndarray
+            A copy of the non empty slots of the table (uint64)
+        """
+        return self._keys[self._keys != 0].copy()
+
+    def merge(self, other: Union['DedupIndex', np.ndarray]) -> int:
+        """Add the hashes of other to the index.
+        It is used to share the history between the islands of :meth:`moldrug.utils.IslandGA`.
+
+        Parameters
+        ----------
+        other : Union[DedupIndex, np.ndarray]
+            Another index or the output of :meth:`keys`
+
+        Returns
+        -------
+        int
+            Number of new hashes
+        """
+        if isinstance(other, DedupIndex):
+            other = other.keys()
+        return sum(self._add_key(int(key)) for key in other)
+
+    def save(self, file: str):
+        """Save the index in NumPy format (.npz)
+
+        Parameters
+        ----------
+        file : str
+            The output file
+        """
+        np.savez_compressed(file, keys=self._keys, n=self._n, max_load=self.max_load)
+
+    @classmethod
+    def load(cls, file: str):
+        """Load an index saved with :meth:`save`
+
+        Parameters
+        ----------
+        file : str
+            The file
+
+        Returns
+        -------
+        DedupIndex
+            The index
+        """
+        data = np.load(file)
+        index = cls.__new__(cls)
+        index._keys = data['keys']
+        index._n = int(data['n'])
+        index.max_load = float(data['max_load'])
+        return index
+
+
+def _pdbqt_to_sdf_record(args):
+    """Convert a pdbqt string to a SDF record. It is used by :meth:`moldrug.utils.make_sdf`
+    and it is defined on the top level of the module in order to be picklable by multiprocessing.
+
+    Parameters
+    ----------
+    args : tuple[str, str]
+        The pdbqt string and the name (``_Name`` property) to set on the molecule.
+
+    Returns
+    -------
+    Union[str, None]
+        The SDF record or None if the pdbqt is not valid.
+    """
+    from meeko import PDBQTMolecule, RDKitMolCreate
+    pdbqt, name = args
+    try:
+        pdbqt_mol = PDBQTMolecule(pdbqt, skip_typing=True)
+        mol = RDKitMolCreate.from_pdbqt_mol(pdbqt_mol)[0]
+        mol.SetProp("_Name", name)
+        sio = io.StringIO()
+        w = Chem.SDWriter(sio)
+        w.write(mol)
+        w.close()
+        return sio.getvalue()
+    except Exception:
+        return None
+
+
+def make_sdf(individuals: List[Individual], sdf_name: str = 'out', njobs: Union[int, str] = 1, compress: bool = False):
+    """This function create a sdf file from a list of Individuals based on their pdbqt attribute
+    This assume that the cost function update the pdbqt attribute after the docking with the conformations obtained
+    In the case of multiple receptor the attribute should be a list of valid pdbqt strings.
+    Here will export several sdf depending how many pdbqt string are in the pdbqt attribute.
+    The pdbqt strings are converted in memory (no temporal files) and the records are
+    streamed to the output file in the same order of individuals.
+
+    Parameters
+    ----------
+    individuals : list[Individual]
+        A list of individuals
+    sdf_name : str, optional
+        The name for the output file. Could be a ``path + sdf_name``.
+        The sdf extension will be added by the function, by default 'out'
+    njobs : Union[int, str], optional
+        Number of processes used for the pdbqt to sdf conversion, by default 1.
+        If 'auto', :meth:`moldrug.utils.available_cpus` is used
+    compress : bool, optional
+        If True, the output will be gzip-compressed and the extension .sdf.gz is used instead, by default False
+
+    Example
+    -------
+    .. ipython:: python
+
+        import tempfile, os
+        from moldrug import utils
+        from rdkit import Chem
+        # Create some temporal dir
+        tmp_path = tempfile.TemporaryDirectory()
+        # Creating two individuals
+        I1 = utils.Individual(Chem.MolFromSmiles('CCCCl'))
+        I2 = utils.Individual(Chem.MolFromSmiles('CCOCCCF'))
+        # Creating the pdbqt attribute as a list with the pdbqt attribute (this is just a silly example)
+        I1.pdbqt = [I1.pdbqt, I1.pdbqt]
+        I2.pdbqt = [I2.pdbqt, I2.pdbqt]
+        utils.make_sdf([I1, I2], sdf_name = os.path.join(tmp_path.name, 'out'))
+        # Two files were created
+        # In the other hand, if the attribute pdbqt is not a list, only one file is going to be created
+        # Set pdbqt to the original value
+        I1.pdbqt = I1.pdbqt[0]
+        I2.pdbqt = I2.pdbqt[0]
+        utils.make_sdf([I1, I2], sdf_name = os.path.join(tmp_path.name, 'out'))
+        # Only one file will be created if the pdbqt has not len in some of
+        # the individuals or they presents different lens as well.
+        # In this case the pdbqts will be completely ignored and pdbqt attribute
+        # will be used for the construction of the sdf file
+        I1.pdbqt = [I1.pdbqt, I1.pdbqt, I1.pdbqt]
+        I2.pdbqt = [I2.pdbqt, I2.pdbqt]
+        utils.make_sdf([I1, I2], sdf_name = os.path.join(tmp_path.name, 'out'))
+        # The output could also be compressed and the conversion done in parallel
+        utils.make_sdf([I1, I2], sdf_name = os.path.join(tmp_path.name, 'out'), njobs = 2, compress = True)
+    """
+    individuals = list(individuals)
+
+    # Check for the attribute pdbqt in all passed individuals and that all of them have the same number of pdbqt
+    check = True
+    NumbOfpdbqt = set()
+    for individual in individuals:
+        if isinstance(individual.pdbqt, List):
+            NumbOfpdbqt.add(len(individual.pdbqt))
+        else:
             check = False
             break
     if len(NumbOfpdbqt) > 1:
         check = False
 
     if check is True:
-        for i in range(list(NumbOfpdbqt)[0]):
-            with Chem.SDWriter(f"{sdf_name}_{i+1}.sdf") as w:
-                for individual in individuals:
-                    with open(pdbqt_tmp.name, 'w') as f:
-                        f.write(individual.pdbqt[i])
-                    try:
-                        pdbqt_mol = PDBQTMolecule.from_file(pdbqt_tmp.name, skip_typing=True)
-                        mol = RDKitMolCreate.from_pdbqt_mol(pdbqt_mol)[0]
-                        mol.SetProp("_Name",
-                                    f"idx :: {individual.idx}, smiles :: {individual.smiles}, "
-                                    f"cost :: {individual.cost}")
-                        w.write(mol)
-                    except Exception:
-                        # Should be that the pdbqt is not valid
-                        print(f"{individual} does not have a valid pdbqt: {individual.pdbqt}.")
-            print(f" File {sdf_name}_{i+1}.sdf was created!")
+        jobs = [(f"{sdf_name}_{i+1}", i) for i in range(list(NumbOfpdbqt)[0])]
+    elif len(NumbOfpdbqt) == 0:
+        jobs = [(sdf_name, None)]
     else:
-        with Chem.SDWriter(f"{sdf_name}.sdf") as w:
+        jobs = [(sdf_name, 0)]
+
+    ext = '.sdf.gz' if compress else '.sdf'
+    if njobs == 'auto':
+        njobs = available_cpus()
+    pool = mp.Pool(njobs) if njobs > 1 else None
+    try:
+        for name, i in jobs:
+            args_list = []
             for individual in individuals:
-                with open(pdbqt_tmp.name, 'w') as f:
-                    if len(NumbOfpdbqt) == 0:
-                        f.write(individual.pdbqt)
+                pdbqt = individual.pdbqt if i is None else individual.pdbqt[i]
+                args_list.append((pdbqt, f"idx :: {individual.idx}, smiles :: {individual.smiles}, "
+                                  f"cost :: {individual.cost}"))
+            if pool:
+                records = pool.imap(_pdbqt_to_sdf_record, args_list, chunksize=max(1, len(args_list) // (4 * njobs)))
+            else:
+                records = map(_pdbqt_to_sdf_record, args_list)
+
+            if compress:
+                f = gzip.open(f"{name}{ext}", 'wt')
+            else:
+                f = open(f"{name}{ext}", 'w')
+            with f:
+                for individual, record in zip(individuals, records):
+                    if record is None:
+                        # Should be that the pdbqt is not valid
+                        print(f"{individual} does not have a valid pdbqt: {individual.pdbqt}.")
                     else:
-                        f.write(individual.pdbqt[0])
-                try:
-                    pdbqt_mol = PDBQTMolecule.from_file(pdbqt_tmp.name, skip_typing=True)
-                    mol = RDKitMolCreate.from_pdbqt_mol(pdbqt_mol)[0]
-                    mol.SetProp("_Name",
-                                f"idx :: {individual.idx}, smiles :: {individual.smiles}, "
-                                f"cost :: {individual.cost}")
-                    w.write(mol)
-                except Exception:
-                    # Should be that the pdbqt is not valid
-                    print(f"{individual} does not have a valid pdbqt: {individual.pdbqt}.")
-        print(f"File {sdf_name}.sdf was createad!")
+                        f.write(record)
+            print(f"File {name}{ext} was created!")
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
 
 
 def _make_kwargs_copy(costfunc, costfunc_kwargs,):
@@ -960,14 +2161,830 @@ def _make_kwargs_copy(costfunc, costfunc_kwargs,):
 
     Returns
     -------
-    dict
-        A copy of self.costfunc_kwargs with wd changed if needed
+    dict
+        A copy of self.costfunc_kwargs with wd changed if needed
+    """
+    kwargs_copy = costfunc_kwargs.copy()
+    costfunc_jobs_tmp_dir = tempfile.TemporaryDirectory(prefix='.costfunc_moldrug_', dir='.')
+    if 'wd' in signature(costfunc).parameters:
+        # Absolute path, the jobs could run from other directory (see moldrug.broker)
+        kwargs_copy['wd'] = os.path.abspath(costfunc_jobs_tmp_dir.name)
+    return kwargs_copy, costfunc_jobs_tmp_dir
+
+
+def available_cpus() -> int:
+    """Get the number of CPUs available for the current process.
+    It takes into account the CPU affinity and the CPU quota of cgroups (v1 and v2), e.g. inside
+    containers or job schedulers.
+
+    Returns
+    -------
+    int
+        Number of available CPUs
+    """
+    try:
+        ncpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        ncpus = os.cpu_count() or 1
+    quota = None
+    try:
+        # cgroup v2
+        with open('/sys/fs/cgroup/cpu.max', 'r') as f:
+            limit, period = f.read().split()[:2]
+        if limit != 'max':
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us', 'r') as f:
+                limit = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us', 'r') as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota:
+        ncpus = min(ncpus, max(1, int(quota)))
+    return max(1, ncpus)
+
+
+def vina_max_threads(costfunc_kwargs: Dict) -> int:
+    """Get the number of threads that a Vina run can use efficiently.
+    Vina parallelizes the Monte Carlo runs of the free docking (as many as exhaustiveness);
+    ``--score_only`` and ``--local_only`` (used by the constraint docking) are single-threaded.
+
+    Parameters
+    ----------
+    costfunc_kwargs : Dict
+        The keyword arguments of the cost function
+
+    Returns
+    -------
+    int
+        The maximum useful number of threads
+    """
+    if costfunc_kwargs.get('constraint', False):
+        return 1
+    return max(1, int(costfunc_kwargs.get('exhaustiveness', 8)))
+
+
+def split_cpus(ntasks: int, costfunc_kwargs: Dict, ncpus: Union[None, int] = None) -> tuple:
+    """Choose the number of parallel jobs and Vina threads (``ncores``) for ntasks evaluations.
+    The throughput of several single-threaded runs is higher than the one of a multi-threaded run,
+    so the jobs are filled first and the spare CPUs (if any) are given as threads.
+
+    Parameters
+    ----------
+    ntasks : int
+        Number of evaluations
+    costfunc_kwargs : Dict
+        The keyword arguments of the cost function (see :meth:`vina_max_threads`)
+    ncpus : Union[None, int], optional
+        Number of CPUs, by default :meth:`available_cpus`
+
+    Returns
+    -------
+    tuple
+        (njobs, ncores)
+
+    Example
+    -------
+    .. ipython:: python
+
+        from moldrug import utils
+        print(utils.split_cpus(4, {'exhaustiveness': 8}, ncpus=32))
+        print(utils.split_cpus(100, {'exhaustiveness': 8}, ncpus=32))
+        print(utils.split_cpus(4, {'constraint': True}, ncpus=32))
+    """
+    if ncpus is None:
+        ncpus = available_cpus()
+    njobs = max(1, min(ntasks, ncpus))
+    ncores = max(1, min(vina_max_threads(costfunc_kwargs), ncpus // njobs))
+    return njobs, ncores
+
+
+def _call_costfunc(args: tuple):
+    """Evaluate a cost function. It is defined on the top level
+    of the module in order to be picklable by multiprocessing and the evaluation backends.
+
+    Parameters
+    ----------
+    args : tuple
+        (costfunc, individual, costfunc_kwargs)
+
+    Returns
+    -------
+    _TimedResult
+        The output of ``costfunc(individual, **costfunc_kwargs)`` with the stages measured during the call
+    """
+    costfunc, individual, kwargs = args
+    timer = StageTimer()
+    previous = _swap_stage_timer(timer)
+    try:
+        result = costfunc(individual, **kwargs)
+    finally:
+        _swap_stage_timer(previous)
+    return _TimedResult(result, timer.stages, f"{socket.gethostname()}-{os.getpid()}")
+
+
+class _TimedResult:
+    """Output of :meth:`moldrug.utils._call_costfunc`: the result and the stages measured on the worker"""
+    __slots__ = ('result', 'stages', 'worker')
+
+    def __init__(self, result: object, stages: Dict, worker: str):
+        self.result = result
+        self.stages = stages
+        self.worker = worker
+
+    def __getstate__(self):
+        return (self.result, self.stages, self.worker)
+
+    def __setstate__(self, state):
+        self.result, self.stages, self.worker = state
+
+
+def _untime(output: object) -> object:
+    """Merge the stages of a :meth:`moldrug.utils._TimedResult` on the timer of the current process
+    and return the result"""
+    if isinstance(output, _TimedResult):
+        _stage_timer.merge(output.stages, output.worker)
+        return output.result
+    return output
+
+
+class EvaluationBackend:
+    """Interface of the evaluation backends used by :meth:`moldrug.utils.GA`, :meth:`moldrug.utils.Local`
+    and :meth:`moldrug.utils.IslandGA` to run the cost function.
+    A backend only needs to implement :meth:`map`.
+    See :meth:`moldrug.utils.PoolBackend` and :meth:`moldrug.broker.BrokerBackend`.
+    """
+    def map(self, func: Callable, args_list: List) -> Iterable:
+        """Apply func to every item of args_list
+
+        Parameters
+        ----------
+        func : Callable
+            A picklable function of one argument
+        args_list : List
+            The arguments
+
+        Returns
+        -------
+        Iterable
+            The results in the same order of args_list
+        """
+        raise NotImplementedError
+
+    def map_incremental(self, func: Callable, args_list: List) -> Iterable:
+        """Apply func to every item of args_list, which can be extended while the results are consumed
+        (e.g. with the next task of an individual once its previous result is known).
+        By default the items are evaluated in rounds with :meth:`map`; the backends that can submit
+        a task at any moment (:meth:`moldrug.utils.PoolBackend`, :meth:`moldrug.broker.BrokerBackend`)
+        override it to run the new items as soon as they are added.
+
+        Parameters
+        ----------
+        func : Callable
+            A picklable function of one argument
+        args_list : List
+            The arguments, items appended during the iteration are also evaluated
+
+        Returns
+        -------
+        Iterable
+            (index, result) as they are completed
+        """
+        start = 0
+        while start < len(args_list):
+            end = len(args_list)
+            for index, result in enumerate(self.map(func, args_list[start:end]), start):
+                yield index, result
+            start = end
+
+    def close(self):
+        """Release the resources of the backend, by default nothing is done"""
+        pass
+
+
+class PoolBackend(EvaluationBackend):
+    """Evaluation backend based on :class:`multiprocessing.Pool` (the default).
+    """
+    def __init__(self, njobs: int = 1) -> None:
+        """Constructor
+
+        Parameters
+        ----------
+        njobs : int, optional
+            Number of processes, by default 1
+        """
+        self.njobs = njobs
+
+    def map(self, func: Callable, args_list: List) -> Iterable:
+        pool = mp.Pool(self.njobs)
+        try:
+            for result in pool.imap(func, args_list):
+                yield result
+        finally:
+            pool.close()
+
+    def map_incremental(self, func: Callable, args_list: List) -> Iterable:
+        import queue
+        pool = mp.Pool(self.njobs)
+        done = queue.Queue()
+        try:
+            submitted = running = 0
+            while submitted < len(args_list) or running:
+                # The items added during the iteration are submitted to the same pool
+                while submitted < len(args_list):
+                    pool.apply_async(func, (args_list[submitted],),
+                                     callback=lambda result, index=submitted: done.put((index, result, None)),
+                                     error_callback=lambda error: done.put((None, None, error)))
+                    submitted += 1
+                    running += 1
+                index, result, error = done.get()
+                running -= 1
+                if error is not None:
+                    raise error
+                yield index, result
+        finally:
+            pool.close()
+
+    def map_chunks(self, func: Callable, args_list: List, chunks: List[List[int]]) -> Iterable:
+        """Apply func to every item of args_list dispatching the chunks in the given order.
+
+        Parameters
+        ----------
+        func : Callable
+            A picklable function of one argument
+        args_list : List
+            The arguments
+        chunks : List[List[int]]
+            Chunks of indexes of args_list (see :meth:`moldrug.utils.TaskScheduler.chunks`)
+
+        Returns
+        -------
+        Iterable
+            (index, result, elapsed seconds) as they are completed
+        """
+        pool = mp.Pool(self.njobs)
+        try:
+            jobs = [(func, [(index, args_list[index]) for index in chunk]) for chunk in chunks]
+            for output in pool.imap_unordered(_call_costfunc_chunk, jobs):
+                for item in output:
+                    yield item
+        finally:
+            pool.close()
+
+
+def _call_costfunc_chunk(args: tuple) -> List[tuple]:
+    """Evaluate a chunk of tasks measuring the time of each one. It is used by
+    :meth:`moldrug.utils.PoolBackend.map_chunks` and it is defined on the top level
+    of the module in order to be picklable by multiprocessing.
+
+    Parameters
+    ----------
+    args : tuple
+        (func, [(index, task), ...])
+
+    Returns
+    -------
+    List[tuple]
+        [(index, result, elapsed seconds), ...]
+    """
+    func, chunk = args
+    output = []
+    for index, task in chunk:
+        start = time.perf_counter()
+        result = func(task)
+        output.append((index, result, time.perf_counter() - start))
+    return output
+
+
+class TaskScheduler:
+    """Cost-aware ordering and chunking of the cost function evaluations.
+    The cost of a task is estimated as ``multiplicity * (c0 + c1 * heavy atoms + c2 * rotatable bonds)``,
+    where multiplicity is the number of docking runs of the task (the number of receptors times
+    constraint_num_conf for constraint docking or times exhaustiveness / 8 for free docking).
+    The coefficients start with a heuristic and, after min_samples observations, they are the
+    ridge regression of the measured times of the run (updated after every evaluation).
+    The tasks are dispatched longest-first and the cheap ones are grouped in chunks of similar estimated cost,
+    this reduces the makespan of the generation without any change in the results.
+
+    Example
+    -------
+    .. ipython:: python
+
+        from moldrug import utils
+        from rdkit import Chem
+        scheduler = utils.TaskScheduler()
+        individuals = [utils.Individual(Chem.MolFromSmiles(smi)) for smi in ['CCO', 'CCCCCCCCCCO', 'c1ccccc1CCO']]
+        features, multiplicity = scheduler.features([(individual, {}) for individual in individuals])
+        print(scheduler.chunks(features, multiplicity, njobs=2))
+    """
+    def __init__(self, min_samples: int = 20, chunks_per_job: int = 4, alpha: float = 1e-3) -> None:
+        """Constructor
+
+        Parameters
+        ----------
+        min_samples : int, optional
+            Minimum number of observed times to use the learned model, by default 20
+        chunks_per_job : int, optional
+            The target estimated cost of a chunk is ``total cost / (chunks_per_job * njobs)``, by default 4
+        alpha : float, optional
+            Regularization of the ridge regression, by default 1e-3
+        """
+        self.min_samples = min_samples
+        self.chunks_per_job = chunks_per_job
+        self.alpha = alpha
+        # Heuristic coefficients (relative units)
+        self.coef = np.array([1.0, 0.1, 0.3])
+        self._XtX = np.zeros((3, 3))
+        self._Xty = np.zeros(3)
+        self.n_samples = 0
+
+    @staticmethod
+    def features(args_list: List[tuple]) -> tuple:
+        """Get the features of the tasks
+
+        Parameters
+        ----------
+        args_list : List[tuple]
+            List of (individual, costfunc_kwargs)
+
+        Returns
+        -------
+        tuple
+            (features, multiplicity). features is an array of shape (n, 3) with columns
+            [1, heavy atoms, rotatable bonds] and multiplicity an array of shape (n,)
+        """
+        features = np.ones((len(args_list), 3))
+        multiplicity = np.ones(len(args_list))
+        for i, (individual, kwargs) in enumerate(args_list):
+            mol = individual.mol
+            features[i, 1] = mol.GetNumHeavyAtoms()
+            features[i, 2] = Lipinski.NumRotatableBonds(mol)
+            receptors = kwargs.get('receptor_pdbqt_path')
+            if isinstance(receptors, (list, tuple)):
+                multiplicity[i] *= max(1, len(receptors))
+            if kwargs.get('constraint', False):
+                multiplicity[i] *= kwargs.get('constraint_num_conf', 100)
+            else:
+                # The search time of the free docking is proportional to the exhaustiveness
+                multiplicity[i] *= kwargs.get('exhaustiveness', 8) / 8
+        return features, multiplicity
+
+    def estimate(self, features: np.ndarray, multiplicity: np.ndarray) -> np.ndarray:
+        """Estimate the cost of the tasks
+
+        Parameters
+        ----------
+        features : np.ndarray
+            See :meth:`features`
+        multiplicity : np.ndarray
+            See :meth:`features`
+
+        Returns
+        -------
+        np.ndarray
+            The estimated costs (positive)
+        """
+        return multiplicity * np.maximum(features @ self.coef, 1e-3)
+
+    def chunks(self, features: np.ndarray, multiplicity: np.ndarray, njobs: int) -> List[List[int]]:
+        """Order the tasks longest-first and group the cheap ones
+
+        Parameters
+        ----------
+        features : np.ndarray
+            See :meth:`features`
+        multiplicity : np.ndarray
+            See :meth:`features`
+        njobs : int
+            Number of parallel jobs
+
+        Returns
+        -------
+        List[List[int]]
+            The chunks of task indexes in the order of dispatch
+        """
+        costs = self.estimate(features, multiplicity)
+        order = np.argsort(-costs, kind='stable')
+        target = costs.sum() / max(1, self.chunks_per_job * njobs)
+        chunks = []
+        chunk, chunk_cost = [], 0
+        for index in order:
+            chunk.append(int(index))
+            chunk_cost += costs[index]
+            if chunk_cost >= target:
+                chunks.append(chunk)
+                chunk, chunk_cost = [], 0
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def update(self, features: np.ndarray, multiplicity: np.ndarray, elapsed: np.ndarray):
+        """Update the model with the observed times
+
+        Parameters
+        ----------
+        features : np.ndarray
+            See :meth:`features`
+        multiplicity : np.ndarray
+            See :meth:`features`
+        elapsed : np.ndarray
+            The measured times (seconds), NaN values are ignored
+        """
+        mask = np.isfinite(elapsed)
+        if not mask.any():
+            return
+        X = features[mask]
+        y = elapsed[mask] / multiplicity[mask]
+        self._XtX += X.T @ X
+        self._Xty += X.T @ y
+        self.n_samples += int(mask.sum())
+        if self.n_samples >= self.min_samples:
+            self.coef = np.linalg.solve(self._XtX + self.alpha * np.eye(3), self._Xty)
+
+
+def _evaluate_auto(costfunc: Callable, args_list: List[tuple],
+                   scheduler: Union[None, TaskScheduler] = None) -> List:
+    """Evaluate the cost function choosing automatically the number of jobs and Vina threads
+    (see :meth:`moldrug.utils.split_cpus`). The tasks are dispatched one by one (longest-first
+    if scheduler is provided); during the tail of the evaluation, when there are less pending tasks than idle CPUs,
+    the remaining tasks get more Vina threads (up to :meth:`moldrug.utils.vina_max_threads`).
+
+    Parameters
+    ----------
+    costfunc : Callable
+        The cost function
+    args_list : List[tuple]
+        List of (individual, costfunc_kwargs)
+    scheduler : Union[None, TaskScheduler], optional
+        Used to order the tasks, by default None
+
+    Returns
+    -------
+    List
+        The evaluated individuals in the same order of args_list
+    """
+    import tqdm
+    ncpus = available_cpus()
+    kwargs0 = args_list[0][1]
+    uses_ncores = 'ncores' in signature(costfunc).parameters
+    max_threads = vina_max_threads(kwargs0) if uses_ncores else 1
+    njobs, ncores = split_cpus(len(args_list), kwargs0, ncpus)
+    if not uses_ncores:
+        ncores = 1
+
+    if scheduler is not None:
+        features, multiplicity = scheduler.features(args_list)
+        order = list(np.argsort(-scheduler.estimate(features, multiplicity), kind='stable'))
+    else:
+        order = list(range(len(args_list)))
+    order = collections.deque(int(index) for index in order)
+
+    results = [None] * len(args_list)
+    elapsed = np.full(len(args_list), np.nan)
+    running = dict()
+    busy = 0
+    pool = mp.Pool(njobs)
+    try:
+        with tqdm.tqdm(total=len(args_list)) as progress_bar:
+            while order or running:
+                while order and len(running) < njobs:
+                    cores = ncores
+                    # Tail: give the idle CPUs to the last tasks
+                    if len(order) <= njobs - len(running):
+                        cores = max(ncores, min(max_threads, (ncpus - busy) // len(order)))
+                    index = order.popleft()
+                    individual, kwargs = args_list[index]
+                    if uses_ncores:
+                        kwargs = dict(kwargs, ncores=cores)
+                    running[index] = (
+                        pool.apply_async(_call_costfunc_chunk,
+                                         ((_call_costfunc, [(index, (costfunc, individual, kwargs))]),)),
+                        cores)
+                    busy += cores
+                finished = [index for index, (job, _) in running.items() if job.ready()]
+                if not finished:
+                    time.sleep(0.01)
+                    continue
+                for index in finished:
+                    job, cores = running.pop(index)
+                    busy -= cores
+                    for index, result, seconds in job.get():
+                        results[index] = _untime(result)
+                        # Only the times with the regular number of threads are used to learn
+                        if cores == ncores:
+                            elapsed[index] = seconds
+                    progress_bar.update()
+    finally:
+        pool.close()
+    if scheduler is not None:
+        scheduler.update(features, multiplicity, elapsed)
+    return results
+
+
+def _evaluate_receptors(costfunc: Callable, args_list: List[tuple], njobs: Union[int, str] = 1,
+                        backend: Union[None, EvaluationBackend] = None,
+                        scheduler: Union[None, TaskScheduler] = None) -> List:
+    """Evaluate a multi receptor cost function using the (individual, receptor) pair as the unit of scheduling.
+    The dockings given by ``costfunc.receptor_tasks`` are evaluated with ``costfunc.receptor_docking``
+    through :meth:`moldrug.utils._evaluate` and the results of every individual are gathered back
+    to the cost function (keyword vina_results) that computes the rest of the properties and the cost.
+    If cost_threshold is on the keyword arguments (early termination), the receptors of an individual
+    are docked one after the other (in the order of ``costfunc.receptor_order``) on the same backend
+    (see :meth:`moldrug.utils.EvaluationBackend.map_incremental`): the next one is submitted as soon as
+    the previous docking returns, unless the best achievable cost is not lower than cost_threshold.
+
+    Parameters
+    ----------
+    costfunc : Callable
+        The cost function (e.g. :meth:`moldrug.fitness.CostMultiReceptors`)
+    args_list : List[tuple]
+        List of (individual, costfunc_kwargs)
+    njobs : Union[int, str], optional
+        See :meth:`moldrug.utils._evaluate`, by default 1
+    backend : Union[None, EvaluationBackend], optional
+        See :meth:`moldrug.utils._evaluate`, by default None
+    scheduler : Union[None, TaskScheduler], optional
+        See :meth:`moldrug.utils._evaluate`, by default None
+
+    Returns
+    -------
+    List
+        The evaluated individuals in the same order of args_list
+    """
+    tasks = [costfunc.receptor_tasks(individual, kwargs) for individual, kwargs in args_list]
+    vina_results = [[None] * len(receptor_tasks) for receptor_tasks in tasks]
+
+    # Docking order of the receptors of every individual
+    early_stop = any(kwargs.get('cost_threshold') is not None for _, kwargs in args_list) \
+        and getattr(costfunc, 'receptor_order', None) is not None
+    if not early_stop:
+        batch = [(i, j) for i, receptor_tasks in enumerate(tasks) for j in range(len(receptor_tasks))]
+        docking_results = _evaluate(costfunc.receptor_docking, [(args_list[i][0], tasks[i][j]) for i, j in batch],
+                                    njobs=njobs, backend=backend, scheduler=scheduler)
+        for (i, j), result in zip(batch, docking_results):
+            vina_results[i][j] = result
+        return [costfunc(deepcopy(individual), vina_results=vina_results[i], **kwargs)
+                for i, (individual, kwargs) in enumerate(args_list)]
+
+    import tqdm
+    # Early termination: the next receptor of an individual is submitted (to the same backend)
+    # as soon as its previous docking is done and it can still reach cost_threshold
+    pending, first = [], []
+    for i, ((_, kwargs), receptor_tasks) in enumerate(zip(args_list, tasks)):
+        if receptor_tasks and kwargs.get('cost_threshold') is not None:
+            pending.append(list(costfunc.receptor_order(kwargs)))
+            first.append((i, pending[i].pop(0)))
+        else:
+            pending.append([])
+            first.extend((i, j) for j in range(len(receptor_tasks)))
+    if scheduler is not None and first:
+        features, multiplicity = scheduler.features([(args_list[i][0], tasks[i][j]) for i, j in first])
+        first = [first[index] for index in np.argsort(-scheduler.estimate(features, multiplicity), kind='stable')]
+
+    ncores = None
+    if backend is None:
+        if njobs == 'auto':
+            njobs, ncores = split_cpus(max(1, len(first)), args_list[0][1])
+        backend = PoolBackend(njobs)
+        fallback = True
+    else:
+        fallback = False
+
+    docked, docking_args, elapsed = [], [], dict()
+
+    def submit(i: int, j: int):
+        task = tasks[i][j] if ncores is None else dict(tasks[i][j], ncores=ncores)
+        docked.append((i, j))
+        docking_args.append((_call_costfunc, [(len(docked) - 1, (costfunc.receptor_docking, args_list[i][0], task))]))
+
+    for i, j in first:
+        submit(i, j)
+    try:
+        with tqdm.tqdm(total=sum(map(len, tasks))) as progress_bar:
+            for index, output in backend.map_incremental(_call_costfunc_chunk, docking_args):
+                (_, result, seconds), = output
+                i, j = docked[index]
+                vina_results[i][j] = _untime(result)
+                elapsed[index] = seconds
+                progress_bar.update()
+                if pending[i]:
+                    # Stop the individual if it can not reach cost_threshold anymore
+                    individual, kwargs = args_list[i]
+                    bound = costfunc(deepcopy(individual), vina_results=vina_results[i], **kwargs).cost
+                    if bound >= kwargs['cost_threshold']:
+                        progress_bar.total -= len(pending[i])
+                        progress_bar.refresh()
+                        pending[i] = []
+                    else:
+                        submit(i, pending[i].pop(0))
+    except Exception:
+        if not fallback:
+            raise
+        warn("Parallelization did not work. Trying with serial...")
+        # The cost function docks the receptors one by one with its own early termination
+        return [_untime(_call_costfunc((costfunc, individual, kwargs))) for individual, kwargs in args_list]
+    if scheduler is not None and docked:
+        features, multiplicity = scheduler.features([(args_list[i][0], tasks[i][j]) for i, j in docked])
+        scheduler.update(features, multiplicity, np.array([elapsed.get(index, np.nan) for index in range(len(docked))]))
+    return [costfunc(deepcopy(individual), vina_results=vina_results[i], **kwargs)
+            for i, (individual, kwargs) in enumerate(args_list)]
+
+
+def _evaluate(costfunc: Callable, args_list: List[tuple], njobs: Union[int, str] = 1,
+              backend: Union[None, EvaluationBackend] = None,
+              scheduler: Union[None, TaskScheduler] = None) -> List:
+    """Evaluate the cost function on the individuals.
+    If backend is None, :meth:`moldrug.utils.PoolBackend` is used
+    and in case of failure the evaluation is repeated in serial.
+    If the cost function defines the attributes receptor_tasks and receptor_docking
+    (e.g. :meth:`moldrug.fitness.CostMultiReceptors`) and the evaluation is parallel,
+    the docking on every receptor is a task (see :meth:`moldrug.utils._evaluate_receptors`).
+
+    Parameters
+    ----------
+    costfunc : Callable
+        The cost function
+    args_list : List[tuple]
+        List of (individual, costfunc_kwargs)
+    njobs : Union[int, str], optional
+        Number of jobs for the default backend, by default 1. If 'auto' the number of jobs and the Vina threads
+        (ncores) are chosen automatically (see :meth:`moldrug.utils.split_cpus`)
+    backend : Union[None, EvaluationBackend], optional
+        The evaluation backend, by default None
+    scheduler : Union[None, TaskScheduler], optional
+        If provided, the default backend dispatches the tasks longest-first and in chunks
+        (see :meth:`moldrug.utils.TaskScheduler`). The scheduler is updated with the measured times, by default None
+
+    Returns
+    -------
+    List
+        The evaluated individuals in the same order of args_list
+
+    Raises
+    ------
+    RuntimeError
+        If the default backend and the serial evaluation fail.
+    """
+    import tqdm
+    if getattr(costfunc, 'receptor_tasks', None) is not None and (backend is not None or njobs == 'auto' or njobs > 1):
+        return _evaluate_receptors(costfunc, args_list, njobs=njobs, backend=backend, scheduler=scheduler)
+    tasks = [(costfunc, individual, kwargs) for individual, kwargs in args_list]
+    if backend is not None:
+        return [_untime(output) for output in tqdm.tqdm(backend.map(_call_costfunc, tasks), total=len(tasks))]
+    try:
+        if njobs == 'auto':
+            return _evaluate_auto(costfunc, args_list, scheduler=scheduler) if tasks else []
+        if scheduler is None or njobs < 2 or len(tasks) < 2:
+            return [_untime(output) for output in
+                    tqdm.tqdm(PoolBackend(njobs).map(_call_costfunc, tasks), total=len(tasks))]
+        features, multiplicity = scheduler.features(args_list)
+        results = [None] * len(tasks)
+        elapsed = np.full(len(tasks), np.nan)
+        with tqdm.tqdm(total=len(tasks)) as progress_bar:
+            chunks = scheduler.chunks(features, multiplicity, njobs)
+            for index, result, seconds in PoolBackend(njobs).map_chunks(_call_costfunc, tasks, chunks):
+                results[index] = _untime(result)
+                elapsed[index] = seconds
+                progress_bar.update()
+        scheduler.update(features, multiplicity, elapsed)
+        return results
+    except Exception as e1:
+        warn("Parallelization did not work. Trying with serial...")
+        try:
+            return [_untime(_call_costfunc(task)) for task in tqdm.tqdm(tasks, total=len(tasks))]
+        except Exception as e2:
+            raise RuntimeError("Serial did not work either. Here are the ucurred exceptions:\n"
+                               f"=========Parellel=========:\n {e1}\n"
+                               f"==========Serial==========:\n {e2}")
+
+
+def _fidelity_config(fidelity: Union[None, Dict, List[Dict]]) -> Union[None, Dict]:
+    """Check and complete the definition of the multi-fidelity evaluation.
+
+    Parameters
+    ----------
+    fidelity : Union[None, Dict, List[Dict]]
+        None, the list of tiers or a dict with the keys tiers, margin, threshold and fraction
+        (see the argument fidelity of :meth:`moldrug.utils.GA`).
+
+    Returns
+    -------
+    Union[None, Dict]
+        The complete definition or None if there are not screening tiers.
+
+    Raises
+    ------
+    ValueError
+        In case of an invalid definition.
+    """
+    if fidelity is None:
+        return None
+    if isinstance(fidelity, (list, tuple)):
+        fidelity = {'tiers': fidelity}
+    if not isinstance(fidelity, dict):
+        raise ValueError(f'fidelity must be None, a list or a dict instance. {fidelity} was provided')
+    unknown = set(fidelity) - {'tiers', 'margin', 'threshold', 'fraction'}
+    if unknown:
+        raise ValueError(f"Unknown keys on fidelity: {', '.join(sorted(unknown))}. "
+                         "Only are possible: tiers, margin, threshold and fraction")
+    config = {'tiers': [], 'margin': 0.0, 'threshold': None, 'fraction': None}
+    config.update(fidelity)
+    if not all(isinstance(tier, dict) for tier in config['tiers']):
+        raise ValueError(f"The tiers of fidelity must be dict instances. {config['tiers']} was provided")
+    config['tiers'] = [dict(tier) for tier in config['tiers']]
+    if config['fraction'] is not None and not 0 < config['fraction'] <= 1:
+        raise ValueError(f"The fraction of fidelity must be in (0, 1]. {config['fraction']} was provided")
+    return config if config['tiers'] else None
+
+
+def _promote(individuals: List[Individual], fidelity: Dict, bound: float = np.inf) -> List[int]:
+    """Select the individuals evaluated on a screening tier that are evaluated on the next one.
+
+    Parameters
+    ----------
+    individuals : List[Individual]
+        The individuals evaluated on the screening tier
+    fidelity : Dict
+        The output of :meth:`moldrug.utils._fidelity_config`
+    bound : float, optional
+        Only the individuals with ``cost - margin < bound`` are promoted, by default np.inf
+
+    Returns
+    -------
+    List[int]
+        The indexes (on individuals) of the promoted individuals.
+    """
+    costs = np.array([individual.cost for individual in individuals], dtype=float) - fidelity['margin']
+    keep = np.isfinite(costs) & (costs < bound)
+    if fidelity['threshold'] is not None:
+        keep &= costs <= fidelity['threshold']
+    if fidelity['fraction'] is not None:
+        best = np.zeros(len(individuals), dtype=bool)
+        best[np.argsort(costs, kind='stable')[:int(np.ceil(fidelity['fraction'] * len(individuals)))]] = True
+        keep &= best
+    return np.flatnonzero(keep).tolist()
+
+
+def _evaluate_fidelity(costfunc: Callable, args_list: List[tuple], tiers: List[Dict], promote: Callable,
+                       njobs: Union[int, str] = 1, backend: Union[None, EvaluationBackend] = None,
+                       scheduler: Union[None, TaskScheduler] = None) -> List:
+    """Multi-fidelity evaluation of the cost function. All the individuals are evaluated with the first tier,
+    only the promoted ones with the next tiers and finally with the production setting (costfunc_kwargs).
+    The cost of every evaluated tier is appended to the attribute ``fidelity_cost`` of the individuals
+    (and the vina_score to ``fidelity_vina_score``); the attributes of the individual are the ones of the
+    last evaluated tier. The docking of every tier starts from the initial pdbqt of the individual.
+
+    Parameters
+    ----------
+    costfunc : Callable
+        The cost function
+    args_list : List[tuple]
+        List of (individual, costfunc_kwargs)
+    tiers : List[Dict]
+        Keyword arguments that overwrite costfunc_kwargs on every screening tier (e.g. ``{'exhaustiveness': 1}``)
+    promote : Callable
+        It takes the list of individuals evaluated on a screening tier and
+        returns the indexes of the ones to evaluate on the next tier
+    njobs : Union[int, str], optional
+        See :meth:`moldrug.utils._evaluate`, by default 1
+    backend : Union[None, EvaluationBackend], optional
+        See :meth:`moldrug.utils._evaluate`, by default None
+    scheduler : Union[None, TaskScheduler], optional
+        See :meth:`moldrug.utils._evaluate`, by default None
+
+    Returns
+    -------
+    List
+        The evaluated individuals in the same order of args_list
     """
-    kwargs_copy = costfunc_kwargs.copy()
-    costfunc_jobs_tmp_dir = tempfile.TemporaryDirectory(prefix='.costfunc_moldrug_', dir='.')
-    if 'wd' in signature(costfunc).parameters:
-        kwargs_copy['wd'] = costfunc_jobs_tmp_dir.name
-    return kwargs_copy, costfunc_jobs_tmp_dir
+    pdbqts = [individual.pdbqt for individual, _ in args_list]
+    results = [individual for individual, _ in args_list]
+    for individual in results:
+        individual.fidelity_cost = []
+    pending = list(range(len(args_list)))
+    for level, overrides in enumerate(list(tiers) + [{}]):
+        if not pending:
+            break
+        if level:
+            print(f"Fidelity tier {level}: evaluating {len(pending)} / {len(args_list)} promoted individuals")
+        tier_args = []
+        for i in pending:
+            results[i].pdbqt = pdbqts[i]
+            tier_args.append((results[i], {**args_list[i][1], **overrides}))
+        for i, individual in zip(pending, _evaluate(costfunc, tier_args, njobs=njobs, backend=backend,
+                                                    scheduler=scheduler)):
+            individual.fidelity_cost = individual.fidelity_cost + [individual.cost]
+            if hasattr(individual, 'vina_score'):
+                individual.fidelity_vina_score = getattr(individual, 'fidelity_vina_score', []) + [individual.vina_score]
+            results[i] = individual
+        if level < len(tiers):
+            pending = [pending[j] for j in promote([results[i] for i in pending])]
+    return results
 
 
 def tar_errors(error_path: str = 'error'):
@@ -1012,28 +3029,173 @@ def roulette_wheel_selection(p: List[float]):
     return ind[0][0]
 
 
-def to_dataframe(individuals: List[Individual], return_mol: bool = False) -> pd.DataFrame:
-    """Convert a list of individuals to a DataFrame
+class LazyAttribute:
+    """A light reference to an attribute of an object. It is used by :meth:`moldrug.utils.to_dataframe`
+    to avoid the materialization of heavy columns (pdbqt and mol) on the DataFrame.
+    The value is only retrieved when :meth:`load` is called.
+    """
+    __slots__ = ('_obj', '_name')
+
+    def __init__(self, obj: object, name: str):
+        self._obj = obj
+        self._name = name
+
+    def load(self):
+        """Get the referenced value
+
+        Returns
+        -------
+        object
+            The value of the attribute
+        """
+        return getattr(self._obj, self._name)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self._name})"
+
+
+_HEAVY_COLUMNS = ('mol', 'pdbqt')
+
+
+def _to_columns(individuals: Iterable[Individual], return_mol: bool = False,
+                return_pdbqt: bool = True, lazy: bool = False) -> Dict[str, Union[np.ndarray, list]]:
+    """Collect the attributes of the individuals by columns.
+    The columns with only numeric (or boolean) values are converted to typed NumPy arrays;
+    missing values on numeric columns are set to NaN.
 
     Parameters
     ----------
-    individuals : List[Individual]
+    individuals : Iterable[Individual]
+        The individuals
+    return_mol : bool, optional
+        If True the column mol is returned, by default False
+    return_pdbqt : bool, optional
+        If True the column pdbqt is returned, by default True
+    lazy : bool, optional
+        If True the heavy columns (mol and pdbqt) are filled with :meth:`moldrug.utils.LazyAttribute`, by default False
+
+    Returns
+    -------
+    Dict[str, Union[np.ndarray, list]]
+        Column name and its values
+    """
+    skip = set()
+    if not return_mol:
+        skip.add('mol')
+    if not return_pdbqt:
+        skip.add('pdbqt')
+
+    columns = dict()
+    n = 0
+    for individual in individuals:
+        if isinstance(individual, CompactIndividual):
+            attributes = individual.as_dict()
+        else:
+            attributes = vars(individual)
+        for key, value in attributes.items():
+            if key in skip:
+                continue
+            if key not in columns:
+                columns[key] = [None] * n
+            if lazy and key in _HEAVY_COLUMNS:
+                if not isinstance(value, LazyAttribute):
+                    value = LazyAttribute(individual, key)
+            elif isinstance(value, LazyAttribute):
+                value = value.load()
+            columns[key].append(value)
+        n += 1
+        # Missing attributes in this individual
+        for values in columns.values():
+            if len(values) < n:
+                values.append(None)
+
+    for key, values in columns.items():
+        if key in _HEAVY_COLUMNS:
+            continue
+        types = set(type(value) for value in values)
+        if types <= {bool, np.bool_}:
+            columns[key] = np.array(values, dtype=bool)
+        elif types <= {int, np.int32, np.int64}:
+            columns[key] = np.array(values, dtype=np.int64)
+        elif types and types <= {int, float, bool, np.int32, np.int64, np.float32, np.float64, type(None)}:
+            columns[key] = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    return columns
+
+
+def to_dataframe(individuals: Iterable[Individual], return_mol: bool = False,
+                 return_pdbqt: bool = True, lazy: bool = False) -> 'pd.DataFrame':
+    """Convert a list of individuals to a DataFrame.
+    The DataFrame is built by columns and the numeric attributes are collected in typed arrays.
+
+    Parameters
+    ----------
+    individuals : Iterable[Individual]
         The list of individuals
     return_mol : bool, optional
-        If True the attribute mol will bot be return, by default False
+        If True the attribute mol will be return, by default False
+    return_pdbqt : bool, optional
+        If False the attribute pdbqt will not be return, by default True
+    lazy : bool, optional
+        If True the heavy columns (mol and pdbqt) are filled with :meth:`moldrug.utils.LazyAttribute`
+        references instead of the actual values, by default False
 
     Returns
     -------
     pd.DataFrame
         The DataFrame
     """
-    list_of_dictionaries = []
-    for individual in individuals:
-        dictionary = individual.__dict__.copy()
-        if not return_mol:
-            del dictionary['mol']
-        list_of_dictionaries.append(dictionary)
-    return pd.DataFrame(list_of_dictionaries)
+    import pandas as pd
+    return pd.DataFrame(_to_columns(individuals, return_mol=return_mol, return_pdbqt=return_pdbqt, lazy=lazy))
+
+
+def to_arrow(individuals: Iterable[Individual], return_pdbqt: bool = True):
+    """Convert a list of individuals to a ``pyarrow.Table``.
+    The attribute mol is never exported; set attributes (e.g. ``kept_gens``) are exported as sorted lists.
+    `pyarrow <https://arrow.apache.org/docs/python/>`_ must be installed.
+
+    Parameters
+    ----------
+    individuals : Iterable[Individual]
+        The list of individuals
+    return_pdbqt : bool, optional
+        If False the attribute pdbqt will not be return, by default True
+
+    Returns
+    -------
+    pyarrow.Table
+        The table
+
+    Raises
+    ------
+    ImportError
+        If pyarrow is not installed.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise ImportError("to_arrow needs pyarrow. Install it with: pip install pyarrow") from e
+
+    columns = _to_columns(individuals, return_mol=False, return_pdbqt=return_pdbqt)
+    for key, values in columns.items():
+        if isinstance(values, list):
+            columns[key] = [sorted(value) if isinstance(value, (set, frozenset)) else value for value in values]
+    return pa.table(columns)
+
+
+def to_parquet(individuals: Iterable[Individual], path: str, return_pdbqt: bool = True):
+    """Write a list of individuals to a parquet file through :meth:`moldrug.utils.to_arrow`.
+
+    Parameters
+    ----------
+    individuals : Iterable[Individual]
+        The list of individuals
+    path : str
+        The output parquet file
+    return_pdbqt : bool, optional
+        If False the attribute pdbqt will not be exported, by default True
+    """
+    import pyarrow.parquet as pq
+    pq.write_table(to_arrow(individuals, return_pdbqt=return_pdbqt), path)
 
 
 class Local:
@@ -1056,6 +3218,8 @@ class Local:
         The keyword arguments to pass to :meth:`crem.crem.grow_mol`.
     AddHs : bool
         In case explicit hydrogens should be added.
+    scheduler : :meth:`moldrug.utils.TaskScheduler`
+        Cost-aware ordering of the evaluations.
     pop : list[:meth:`moldrug.utils.Individuals`]
         The final population sorted by cost.
     """
@@ -1124,19 +3288,26 @@ class Local:
         self.grow_crem_kwargs = grow_crem_kwargs
         self.costfunc = costfunc
         self.costfunc_kwargs = costfunc_kwargs
+        self.scheduler = TaskScheduler()
         self.pop = [self.InitIndividual]
 
-    def __call__(self, njobs: int = 1, pick: int = None):
+    def __call__(self, njobs: Union[int, str] = 1, pick: int = None, backend: Union[None, EvaluationBackend] = None):
         """Call deffinition
 
         Parameters
         ----------
-        njobs : int, optional
-            The number of jobs for parallelization, the module multiprocessing will be used, by default 1
+        njobs : Union[int, str], optional
+            The number of jobs for parallelization, the module multiprocessing will be used, by default 1.
+            If 'auto', the number of jobs and the Vina threads (ncores) are chosen from the available CPUs
+            (see :meth:`moldrug.utils.split_cpus`)
         pick : int, optional
             How many molecules take from the generated throgh the grow_mol CReM operation,
             by default None which means all generated.
+        backend : Union[None, EvaluationBackend], optional
+            The backend used to evaluate the cost function (e.g. :meth:`moldrug.broker.BrokerBackend`).
+            If None, :meth:`moldrug.utils.PoolBackend` with njobs processes, by default None
         """
+        from crem.crem import grow_mol
         # Check version of moldrug
         if self.__moldrug_version != __version__:
             warn(f"{self.__class__.__name__} was initilized with moldrug-{self.__moldrug_version} "
@@ -1164,9 +3335,8 @@ class Local:
             args_list.append((individual, kwargs_copy))
 
         print('Calculating cost function...')
-        pool = mp.Pool(njobs)
-        self.pop = [individual for individual in tqdm.tqdm(pool.imap(self.__costfunc__, args_list), total=len(args_list))]
-        pool.close()
+        self.pop = _evaluate(self.costfunc, args_list, njobs=njobs, backend=backend,
+                             scheduler=getattr(self, 'scheduler', None))
 
         # Clean directory
         costfunc_jobs_tmp_dir.cleanup()
@@ -1201,15 +3371,16 @@ class Local:
         else:
             full_pickle(title, result)
 
-    def to_dataframe(self, return_mol: bool = False):
+    def to_dataframe(self, return_mol: bool = False, return_pdbqt: bool = True, lazy: bool = False):
         """Create a DataFrame from self.pop.
+        See :meth:`moldrug.utils.to_dataframe` for the meaning of the arguments.
 
         Returns
         -------
         pandas.DataFrame
             The DataFrame
         """
-        return to_dataframe(self.pop, return_mol=return_mol)
+        return to_dataframe(self.pop, return_mol=return_mol, return_pdbqt=return_pdbqt, lazy=lazy)
 
 
 #######################
@@ -1259,10 +3430,39 @@ class GA:
         executions update this number acordennly.
     SawIndividuals : set[:meth:`moldrug.utils.Individuals`]
         All the Individulas saw during the optimizations.
+        If compact_history is True the set holds :meth:`moldrug.utils.CompactIndividual` records.
+    SawIndex : :meth:`moldrug.utils.DedupIndex`
+        Hashed index of the canonical SMILES of SawIndividuals. It is used to skip already seen offspring.
+    scheduler : :meth:`moldrug.utils.TaskScheduler`
+        Cost-aware ordering of the evaluations, it learns the docking times during the simulation.
+    compact_history : bool
+        Store the history (SawIndividuals) as compact records.
     acceptance : dict
         A dictionary with key the Generation id and as value another dictionary
         with keys ``accepeted`` and ``generated`` with the number of accepted and genereated
-        individuals on the generation respectively.
+        individuals on the generation respectively. ``timeouts`` is the number of evaluated individuals which
+        docking exceeded the time budget (and ``screened`` the offspring discarded by the pre-screening, if used).
+        With early_stop, ``early_stopped`` is the number of offspring which docking was stopped.
+        ``prefiltered`` is a dictionary with the number of offspring rejected before the conformer generation:
+        ``duplicate`` (already seen) and the filters of prefilter.
+    prefilter : Union[None, :meth:`moldrug.utils.PreFilter`]
+        Cheap filters applied on the offspring before the conformer generation.
+    fidelity : Union[None, dict]
+        Definition of the multi-fidelity evaluation of the offspring (keys tiers, margin, threshold and fraction).
+        With fidelity, ``promoted`` of acceptance is the number of offspring evaluated with the production setting.
+    generation_timeout : Union[None, float]
+        Wall-clock budget (seconds) for the evaluation of every generation.
+    early_stop : bool
+        Pass the cost of the worst individual of the population as cost_threshold to the cost function.
+    timings : dict
+        Per generation record of the wall-clock and CPU time (seconds) of the stages of the hot path:
+        ``{gen: {'wall': float, 'stages': {stage: {'wall', 'cpu', 'calls'}}, 'workers': {worker: {stage: {...}}}}}``.
+        The stages are: selection, reactant_zone, mutation, dedup, prefilter, confgen, meeko, prescreen, evaluation,
+        checkpoint and sdf_export on the main process and confgen, meeko, vina, sa_qed and desirability
+        on the evaluation workers (for the cost functions of :mod:`moldrug.fitness`).
+        See :meth:`moldrug.utils.StageTimer`.
+    timings_file : Union[None, str]
+        JSON lines file where every record of timings is appended.
     AddHs : bool
         In case explicit hydrogens should be added for all genreated molecules.
     _seed_mol : list[Chem.rdchem.Mol]
@@ -1289,7 +3489,11 @@ class GA:
                  costfunc: Callable, costfunc_kwargs: Dict, crem_db_path: str, maxiter: int = 10, popsize: int = 20,
                  beta: float = 0.001, pc: float = 1, get_similar: bool = False, mutate_crem_kwargs: Union[None, Dict] = None,
                  save_pop_every_gen: int = 0, checkpoint: bool = False, deffnm: str = 'ga',
-                 AddHs: bool = False, randomseed: Union[None, int] = None) -> None:
+                 AddHs: bool = False, randomseed: Union[None, int] = None, compact_history: bool = False,
+                 prescreen: Union[None, Dict] = None, generation_timeout: Union[None, float] = None,
+                 early_stop: bool = False, timings_file: Union[None, str] = None,
+                 prefilter: Union[None, Dict, PreFilter] = None,
+                 fidelity: Union[None, Dict, List[Dict]] = None) -> None:
         """Constructor
 
         Parameters
@@ -1300,7 +3504,9 @@ class GA:
         costfunc : Callable
             The cost function to work with (any from :mod:`moldrug.fitness` or a valid user defined).
         costfunc_kwargs : Dict
-            The keyword arguments of the selected cost function
+            The keyword arguments of the selected cost function. If pose_seeding is set (cost functions of
+            :mod:`moldrug.fitness`), every offspring carries the docked pose of its parent (attribute seed_pose)
+            during its evaluation
         crem_db_path : str
             Path to the CReM data base.
         maxiter : int, optional
@@ -1328,12 +3534,66 @@ class GA:
            If True the explicit hydrogens will be added, by default False
         randomseed : Union[None, int], optional
            Set a random seed for reproducibility, by default None
+        compact_history : bool, optional
+            If True, SawIndividuals will store :meth:`moldrug.utils.CompactIndividual` records instead
+            of the full Individuals. The poses are written to ``{deffnm}_poses.bin``
+            and only loaded on demand, by default False
+        prescreen : Union[None, Dict], optional
+            Activate the pre-screening of the offspring with a surrogate model trained online on SawIndividuals.
+            The keys are (all optional):
+
+            * pool_factor (int, default 3): ``pool_factor * nc`` offspring are generated.
+            * fraction (float, default ``1 / pool_factor``): fraction of the best predicted offspring that is evaluated.
+            * refit_every (int, default 1): refit the model every refit_every generations.
+            * min_train (int, default ``2 * popsize``): minimum number of individuals with finite cost to start.
+            * model (default :meth:`moldrug.utils.SurrogateModel`): an object with the methods ``fit(mols, costs)``
+              and ``predict(mols)``.
+
+            By default None (no pre-screening)
+        generation_timeout : Union[None, float], optional
+            Wall-clock budget (seconds) for the evaluation of every generation. It is passed as
+            ``deadline`` to the cost function (if it accepts it, like the ones of :mod:`moldrug.fitness`);
+            after the deadline the pending dockings are not run and get :data:`moldrug.utils.VINA_TIMEOUT_SCORE`.
+            The per-Vina-run timeout is set with the keyword timeout of costfunc_kwargs. By default None
+        early_stop : bool, optional
+            Bound-based early termination of the evaluation of the offspring. The cost of the worst individual
+            of the population is passed as ``cost_threshold`` to the cost function (if it accepts it, like
+            :meth:`moldrug.fitness.CostMultiReceptors` and :meth:`moldrug.fitness.CostMultiReceptorsOnlyVina`),
+            which stops the docking of the remaining receptors once the individual can not be accepted anymore.
+            The cost of those individuals is their best achievable cost (not lower than the threshold),
+            so the selection is not affected, by default False
+        timings_file : Union[None, str], optional
+            If provided, the timing record of every generation (see the attribute timings) is appended to it
+            as a JSON line, by default None
+        prefilter : Union[None, Dict, PreFilter], optional
+            Filters applied on the 2D molecule of the offspring (and of the generated molecules of the initial population)
+            before the conformer generation. A dict is passed as keyword arguments to :meth:`moldrug.utils.PreFilter`
+            (max_wt, max_heavy_atoms, max_rotatable_bonds, lipinski and blacklist). The offspring already seen
+            are always discarded before the conformer generation. By default None
+        fidelity : Union[None, Dict, List[Dict]], optional
+            Multi-fidelity evaluation of the offspring. The keys are:
+
+            * tiers (list of dict): keyword arguments that overwrite costfunc_kwargs on every screening tier,
+              e.g. ``[{'exhaustiveness': 1, 'num_modes': 1}]``. A list is equivalent to ``{'tiers': list}``.
+            * margin (float, default 0): it is subtracted from the cost of the screening tiers before the promotion.
+            * threshold (float, default None): only the individuals with ``cost - margin <= threshold`` are promoted.
+            * fraction (float, default None): only the best fraction of every tier is promoted.
+
+            All the offspring are evaluated with the first tier and only the ones which cost (minus margin)
+            would enter the population are evaluated with the next tier, and so on until the production setting
+            (costfunc_kwargs). The costs of the evaluated tiers are stored on the attribute fidelity_cost of the
+            individuals (and the vina scores on fidelity_vina_score). The initial population is always evaluated
+            with the production setting. By default None
         Raises
         ------
         TypeError
             In case that seed_mol is a wrong input.
         ValueError
             In case of incorrect definition of mutate_crem_kwargs. It must be None or a dict instance.
+        ValueError
+            In case of incorrect definition of prefilter.
+        ValueError
+            In case of incorrect definition of fidelity (see :meth:`moldrug.utils._fidelity_config`).
         ValueError
             In case of crem_db_path deos not exist.
         """
@@ -1386,7 +3646,40 @@ class GA:
         self.NumCalls = 0
         self.NumGens = 0
         self.SawIndividuals = set()
+        self.SawIndex = DedupIndex()
+        self.scheduler = TaskScheduler()
         self.acceptance = dict()
+        self.compact_history = compact_history
+        self.generation_timeout = generation_timeout
+        self.early_stop = early_stop
+        self.timings = dict()
+        self.timings_file = timings_file
+        if prescreen is None:
+            self.prescreen = None
+        elif isinstance(prescreen, dict):
+            self.prescreen = {
+                'pool_factor': 3,
+                'refit_every': 1,
+                'min_train': 2 * popsize,
+                'model': None,
+            }
+            self.prescreen.update(prescreen)
+            if 'fraction' not in self.prescreen:
+                self.prescreen['fraction'] = 1 / self.prescreen['pool_factor']
+            if self.prescreen['model'] is None:
+                self.prescreen['model'] = SurrogateModel()
+        else:
+            raise ValueError(f'prescreen must be None or a dict instance. {prescreen} was provided')
+        if prefilter is None or isinstance(prefilter, PreFilter):
+            self.prefilter = prefilter
+        elif isinstance(prefilter, dict):
+            self.prefilter = PreFilter(**prefilter)
+        else:
+            raise ValueError(f'prefilter must be None, a dict or a PreFilter instance. {prefilter} was provided')
+        self.fidelity = _fidelity_config(fidelity)
+        if self.compact_history:
+            self._history_table = PropertyTable()
+            self._pose_store = PoseStore(f"{self.deffnm}_poses.bin")
 
         # work with the seed molecule or population
         self.AddHs = AddHs
@@ -1408,20 +3701,39 @@ class GA:
         self.InitIndividual = Individual(self._seed_mol[0], idx=0, randomseed=self.randomseed)
         self.pop = []
 
-    def __call__(self, njobs: int = 1):
+    def __call__(self, njobs: Union[int, str] = 1, backend: Union[None, EvaluationBackend] = None):
         """Call definition
 
         Parameters
         ----------
-        njobs : int, optional
-            The number of jobs for parallelization, the module multiprocessing will be used, by default 1,
+        njobs : Union[int, str], optional
+            The number of jobs for parallelization, the module multiprocessing will be used, by default 1.
+            If 'auto', the number of jobs and the Vina threads (ncores) are chosen from the available CPUs
+            (see :meth:`moldrug.utils.split_cpus`) on every generation.
+        backend : Union[None, EvaluationBackend], optional
+            The backend used to evaluate the cost function (e.g. :meth:`moldrug.broker.BrokerBackend`).
+            If None, :meth:`moldrug.utils.PoolBackend` with njobs processes, by default None
 
         Raises
         ------
         RuntimeError
             Error during the initialization of the population.
         """
+        previous_timer = _stage_timer
+        try:
+            self._call(njobs=njobs, backend=backend)
+        finally:
+            # Restore the timer of the process also if the simulation fails
+            _swap_stage_timer(previous_timer)
+
+    def _call(self, njobs: Union[int, str] = 1, backend: Union[None, EvaluationBackend] = None):
+        """Body of :meth:`__call__`, it does not restore the stage timer of the process"""
+        from crem.crem import mutate_mol
         ts = time.time()
+        # Timer of the hot path stages of the initialization
+        timer = StageTimer()
+        _swap_stage_timer(timer)
+        gen_start = time.perf_counter()
         # Counting the calls
         self.NumCalls += 1
 
@@ -1437,18 +3749,23 @@ class GA:
 
         # Initialize Population
         # In case that the populating exist there is not need to initialize.
-        if len(self.pop) == 0:
+        initialized = len(self.pop) == 0
+        if initialized:
             GenInitStructs = []
+            prefiltered = collections.Counter()
             # in case that the input has the popsize memebers there is not need to generate new structures
             if len(self._seed_mol) < self.popsize:
                 for mol in self._seed_mol:
-                    tmp_GenInitStructs = list(mutate_mol(mol, self.crem_db_path, **self.mutate_crem_kwargs))
+                    with stage('mutation'):
+                        tmp_GenInitStructs = list(mutate_mol(mol, self.crem_db_path, **self.mutate_crem_kwargs))
                     tmp_GenInitStructs = [mol for (_, mol) in tmp_GenInitStructs]
                     GenInitStructs += tmp_GenInitStructs
+                GenInitStructs = self._prefilter(GenInitStructs, prefiltered)
                 # Checking for possible scenarios
                 if len(GenInitStructs) == 0:
                     raise RuntimeError("Something really strange happened. The seed_mol did not "
-                                       "generate any new molecule during the initialization of the population. "
+                                       "generate any new molecule during the initialization of the population "
+                                       "(or all of them were rejected by prefilter). "
                                        "Check the provided crem parameters!")
                 if len(GenInitStructs) < (self.popsize - len(self._seed_mol)):
                     print('The initial population has repeated elements')
@@ -1488,22 +3805,14 @@ class GA:
             # Make a copy of the self.costfunc_kwargs
             kwargs_copy, costfunc_jobs_tmp_dir = _make_kwargs_copy(self.costfunc, self.costfunc_kwargs)
 
+            self._set_deadline(kwargs_copy)
             for individual in self.pop:
                 args_list.append((individual, kwargs_copy))
 
             print(f'\n\nCreating the first population with {len(self.pop)} members:')
-            try:
-                pool = mp.Pool(njobs)
-                self.pop = [individual for individual in tqdm.tqdm(pool.imap(self.__costfunc__, args_list), total=len(args_list))]
-                pool.close()
-            except Exception as e1:
-                warn("Parallelization did not work. Trying with serial...")
-                try:
-                    self.pop = [self.__costfunc__(args) for args in tqdm.tqdm(args_list, total=len(args_list))]
-                except Exception as e2:
-                    raise RuntimeError("Serial did not work either. Here are the ucurred exceptions:\n"
-                                       f"=========Parellel=========:\n {e1}\n"
-                                       f"==========Serial==========:\n {e2}")
+            with stage('evaluation'):
+                self.pop = _evaluate(self.costfunc, args_list, njobs=njobs, backend=backend,
+                                     scheduler=getattr(self, 'scheduler', None))
             # Clean directory
             costfunc_jobs_tmp_dir.cleanup()
 
@@ -1514,7 +3823,9 @@ class GA:
 
             self.acceptance[self.NumGens] = {
                 'accepted': len(self.pop[:]),
-                'generated': len(self.pop[:])
+                'generated': len(self.pop[:]),
+                'timeouts': sum(is_timeout(individual) for individual in self.pop),
+                'prefiltered': dict(prefiltered),
             }
 
             # Get the same order population in case cost is the same. Sorted by idx and then by cost
@@ -1541,26 +3852,40 @@ class GA:
 
         # Saving tracking variables, the first population, outside the if to take into account second calls
         # with different population provided by the user.
-        self.SawIndividuals.update(self.pop)
+        with stage('dedup'):
+            self._update_history(self.pop)
 
         # Saving population in disk if it was required
         if self.save_pop_every_gen:
-            compressed_pickle(f"{self.deffnm}_pop", (self.NumGens, sorted(self.pop)))
-            make_sdf(sorted(self.pop), sdf_name=f"{self.deffnm}_pop")
+            with stage('checkpoint'):
+                compressed_pickle(f"{self.deffnm}_pop", (self.NumGens, sorted(self.pop)))
+            with stage('sdf_export'):
+                make_sdf(sorted(self.pop), sdf_name=f"{self.deffnm}_pop", njobs=njobs)
             if self.checkpoint:
-                compressed_pickle('cpt', self)
+                with stage('checkpoint'):
+                    compressed_pickle('cpt', self)
+        if initialized:
+            self._record_timings(timer, time.perf_counter() - gen_start)
 
         # Main Loop
         # Another control variable. In case that the __call__ method is used more than ones.
         number_of_previous_generations = len(self.best_cost)
+        # Only the 2D molecule is needed until the offspring pass dedup and prefilter (see mutate_mol)
+        mutate_overridden = type(self).mutate is not GA.mutate
         for it in range(self.maxiter):
             # Saving Number of Generations
             self.NumGens += 1
+            # On subsequent calls the stages before the first generation are added to it
+            if it or initialized:
+                timer = StageTimer()
+                _swap_stage_timer(timer)
+                gen_start = time.perf_counter()
 
             # Probabilities Selections
-            probs = softmax((-self.beta * np.array(self.pop)).astype('float64'))
-            if any(np.isnan(probs)):
-                probs = np.nan_to_num(probs)
+            with stage('selection'):
+                probs = softmax((-self.beta * np.array(self.pop)).astype('float64'))
+                if any(np.isnan(probs)):
+                    probs = np.nan_to_num(probs)
             
             
             # TODO: This cycle should run in this way only if no user generetor was provided
@@ -1573,19 +3898,66 @@ class GA:
             # in this case other identifier like the aa sequnce should be ued intead. For that the user may need a different Individual instance
             # a one more efficient, there are a lot of if here :`-)
             popc = []
-            for _ in range(self.nc):
+            # (2D molecule, parent, Individual if mutate was overridden) of the offspring
+            candidates = []
+            popc_index = set()
+            prefiltered = collections.Counter()
+            with stage('prescreen'):
+                prescreen_on = self._fit_surrogate()
+            if prescreen_on:
+                NumbOfCandidates = int(self.prescreen['pool_factor'] * self.nc)
+            else:
+                NumbOfCandidates = self.nc
+            for _ in range(NumbOfCandidates):
                 # Perform Roulette Wheel Selection
-                parent = self.pop[roulette_wheel_selection(probs)]
+                with stage('selection'):
+                    parent = self.pop[roulette_wheel_selection(probs)]
 
                 # Perform Mutation (this mutation is some kind of crossover but with CReM library)
-                children = self.mutate(parent)
+                if mutate_overridden:
+                    # Subclasses that override mutate get the Individual with its conformer
+                    children = self.mutate(parent)
+                    mol = children.mol
+                else:
+                    children = None
+                    mol = self.mutate_mol(parent)
 
                 # Save offspring population
-                # I will save only those offsprings that were not seen and that have a correct pdbqt file
-                if children not in self.SawIndividuals and children not in popc and children.pdbqt:
-                    children.genID = self.NumGens
-                    children.kept_gens = set()
-                    popc.append(children)
+                # I will save only those offsprings that were not seen, that pass the pre-filters
+                # and the pre-screening (all checked before the conformer generation) and that have a correct pdbqt file
+                children_smiles = Chem.MolToSmiles(Chem.RemoveHs(mol))
+                with stage('dedup'):
+                    is_new = children_smiles not in self.SawIndex and children_smiles not in popc_index
+                if not is_new:
+                    prefiltered['duplicate'] += 1
+                    continue
+                if not self._prefilter([mol], prefiltered):
+                    continue
+                candidates.append((mol, parent, children))
+                popc_index.add(children_smiles)
+
+            # Keep only the best predicted offspring
+            NumbOfScreened = 0
+            if prescreen_on and candidates:
+                with stage('prescreen'):
+                    kept = self._prescreen(
+                        [mol for mol, _, _ in candidates],
+                        max(1, round(self.prescreen['fraction'] * self.prescreen['pool_factor'] * self.nc)))
+                NumbOfScreened = len(candidates) - len(kept)
+                candidates = [candidates[i] for i in kept]
+
+            # Conformer generation
+            for mol, parent, children in candidates:
+                if children is None:
+                    children = Individual(mol, randomseed=self.randomseed)
+                if not children.pdbqt:
+                    continue
+                if self.costfunc_kwargs.get('pose_seeding') and hasattr(parent, 'vina_score'):
+                    # Parent-pose seeding (see moldrug.fitness._vinadock)
+                    children.seed_pose = (parent.pdbqt, parent.vina_score)
+                children.genID = self.NumGens
+                children.kept_gens = set()
+                popc.append(children)
 
             if popc:  # Only if there are new members
                 # Calculating cost of each offspring individual (Doing Docking)
@@ -1595,6 +3967,8 @@ class GA:
                 # Make a copy of the self.costfunc_kwargs
                 kwargs_copy, costfunc_jobs_tmp_dir = _make_kwargs_copy(self.costfunc, self.costfunc_kwargs)
 
+                self._set_deadline(kwargs_copy)
+                self._set_cost_threshold(kwargs_copy)
                 NumbOfSawIndividuals = len(self.SawIndividuals)
                 for (i, individual) in enumerate(popc):
                     # Add idx label to each individual
@@ -1604,24 +3978,31 @@ class GA:
                 print(f'Evaluating generation {self.NumGens} / {self.maxiter + number_of_previous_generations}:')
 
                 # Calculating cost fucntion in parallel
-                try:
-                    pool = mp.Pool(njobs)
-                    popc = [individual for individual in tqdm.tqdm(pool.imap(self.__costfunc__, args_list), total=len(args_list))]
-                    pool.close()
-                except Exception as e1:
-                    warn("Parallelization did not work. Trying with serial...")
-                    try:
-                        popc = [self.__costfunc__(args) for args in tqdm.tqdm(args_list, total=len(args_list))]
-                    except Exception as e2:
-                        raise RuntimeError("Serial did not work either. Here are the ucurred exceptions:\n"
-                                           f"=========Parellel=========:\n {e1}\n"
-                                           f"==========Serial==========:\n {e2}")
+                with stage('evaluation'):
+                    if getattr(self, 'fidelity', None):
+                        # Only the offspring that would enter the population are evaluated with the next tier
+                        bound = max(individual.cost for individual in self.pop) \
+                            if len(self.pop) >= self.popsize else np.inf
+                        popc = _evaluate_fidelity(
+                            self.costfunc, args_list, self.fidelity['tiers'],
+                            promote=lambda individuals: _promote(individuals, self.fidelity, bound),
+                            njobs=njobs, backend=backend, scheduler=getattr(self, 'scheduler', None))
+                    else:
+                        popc = _evaluate(self.costfunc, args_list, njobs=njobs, backend=backend,
+                                         scheduler=getattr(self, 'scheduler', None))
 
                 # Clean directory
                 costfunc_jobs_tmp_dir.cleanup()
+                for individual in popc:
+                    individual.__dict__.pop('seed_pose', None)
 
             # Merge, Sort and Select
-            self.pop += popc
+            if getattr(self, 'fidelity', None):
+                # The offspring that were not evaluated with the production setting can not enter the population
+                self.pop += [individual for individual in popc
+                             if len(individual.fidelity_cost) > len(self.fidelity['tiers'])]
+            else:
+                self.pop += popc
             if self.randomseed:
                 self.pop = sorted(self.pop, key=lambda x: x.idx)
             self.pop = sorted(self.pop)
@@ -1630,8 +4011,18 @@ class GA:
             # Update the kept_gens attribute
             self.acceptance[self.NumGens] = {
                 'accepted': 0,
-                'generated': len(popc)
+                'generated': len(popc),
+                'timeouts': sum(is_timeout(individual) for individual in popc),
+                'prefiltered': dict(prefiltered),
             }
+            if getattr(self, 'early_stop', False):
+                self.acceptance[self.NumGens]['early_stopped'] = sum(
+                    isinstance(individual.pdbqt, list) and 'EarlyStop' in individual.pdbqt for individual in popc)
+            if prescreen_on:
+                self.acceptance[self.NumGens]['screened'] = NumbOfScreened
+            if getattr(self, 'fidelity', None):
+                self.acceptance[self.NumGens]['promoted'] = sum(
+                    len(individual.fidelity_cost) > len(self.fidelity['tiers']) for individual in popc)
             for individual in self.pop:
                 if not individual.kept_gens:
                     self.acceptance[self.NumGens]['accepted'] += 1
@@ -1644,20 +4035,35 @@ class GA:
             self.avg_cost.append(np.mean(self.pop))
 
             # Saving tracking variables
-            self.SawIndividuals.update(popc)
+            with stage('dedup'):
+                self._update_history(popc)
 
             # Saving population in disk if it was required
             if self.save_pop_every_gen:
                 # Save every save_pop_every_gen and always the last population
                 if self.NumGens % self.save_pop_every_gen == 0 or it + 1 == self.maxiter:
-                    compressed_pickle(f"{self.deffnm}_pop", (self.NumGens, self.pop))
-                    make_sdf(self.pop, sdf_name=f"{self.deffnm}_pop")
+                    with stage('checkpoint'):
+                        compressed_pickle(f"{self.deffnm}_pop", (self.NumGens, self.pop))
+                    with stage('sdf_export'):
+                        make_sdf(self.pop, sdf_name=f"{self.deffnm}_pop", njobs=njobs)
                     if self.checkpoint:
-                        compressed_pickle('cpt', self)
+                        with stage('checkpoint'):
+                            compressed_pickle('cpt', self)
+            self._record_timings(timer, time.perf_counter() - gen_start)
 
             # Show Iteration Information
             print(f"Generation {self.NumGens}: Best Individual: {self.pop[0]}.")
             print(f"Accepted rate: {self.acceptance[self.NumGens]['accepted']} / {self.acceptance[self.NumGens]['generated']}\n")
+            if self.acceptance[self.NumGens]['timeouts']:
+                print(f"Timed out dockings: {self.acceptance[self.NumGens]['timeouts']}\n")
+            if self.acceptance[self.NumGens].get('early_stopped'):
+                print(f"Early stopped dockings: {self.acceptance[self.NumGens]['early_stopped']}\n")
+            if 'promoted' in self.acceptance[self.NumGens]:
+                print(f"Evaluated with the production setting: {self.acceptance[self.NumGens]['promoted']} / "
+                      f"{self.acceptance[self.NumGens]['generated']}\n")
+            if any(self.acceptance[self.NumGens]['prefiltered'].values()):
+                print("Pre-filtered offspring: " + ", ".join(
+                    f"{reason} = {count}" for reason, count in self.acceptance[self.NumGens]['prefiltered'].items()) + "\n")
 
         # Printing summary information
         print(f"\n{50*'=+'}\n")
@@ -1681,8 +4087,149 @@ class GA:
         # This is just to use the progress bar on pool.imap
         return self.costfunc(individual, **kwargs)
 
+    def _set_deadline(self, kwargs: Dict):
+        """Add the deadline of the evaluation to the keyword arguments of the cost function
+        if generation_timeout is set and the cost function accepts it.
+
+        Parameters
+        ----------
+        kwargs : Dict
+            The copy of costfunc_kwargs used on the evaluation
+        """
+        generation_timeout = getattr(self, 'generation_timeout', None)
+        if generation_timeout and 'deadline' in signature(self.costfunc).parameters:
+            kwargs['deadline'] = time.time() + generation_timeout
+
+    def _record_timings(self, timer: StageTimer, wall: float):
+        """Store the stages measured during the current generation on timings
+        (and append them to timings_file if it was set).
+
+        Parameters
+        ----------
+        timer : StageTimer
+            The timer of the generation
+        wall : float
+            Wall-clock time of the generation (seconds)
+        """
+        if not hasattr(self, 'timings'):
+            # GA instances created with older versions of moldrug
+            self.timings = dict()
+        self.timings[self.NumGens] = {'wall': wall, **timer.as_dict()}
+        if getattr(self, 'timings_file', None):
+            with open(self.timings_file, 'a') as f:
+                f.write(json.dumps({'gen': self.NumGens, **self.timings[self.NumGens]}) + '\n')
+
+    def _set_cost_threshold(self, kwargs: Dict):
+        """Add the cost of the worst individual of the population as cost_threshold to the keyword arguments
+        of the cost function if early_stop is set and the cost function accepts it.
+
+        Parameters
+        ----------
+        kwargs : Dict
+            The copy of costfunc_kwargs used on the evaluation
+        """
+        if getattr(self, 'early_stop', False) and 'cost_threshold' in signature(self.costfunc).parameters:
+            # An offspring is accepted only if it is better than the worst individual of the population
+            kwargs['cost_threshold'] = max(individual.cost for individual in self.pop)
+
+    def _fit_surrogate(self) -> bool:
+        """(Re)fit the surrogate model of the pre-screening on SawIndividuals if needed.
+
+        Returns
+        -------
+        bool
+            True if the model is ready to be used on the current generation.
+        """
+        if not getattr(self, 'prescreen', None):
+            return False
+        model = self.prescreen['model']
+        last_fit = getattr(self, '_surrogate_gen', None)
+        fitted = getattr(model, 'is_fitted', last_fit is not None)
+        if fitted and last_fit is not None and (self.NumGens - last_fit) < self.prescreen['refit_every']:
+            return True
+        train = [individual for individual in self.SawIndividuals if np.isfinite(individual.cost)]
+        if len(train) < self.prescreen['min_train']:
+            return fitted
+        train = sorted(train, key=lambda x: x.idx)
+        model.fit([individual.mol for individual in train], [individual.cost for individual in train])
+        self._surrogate_gen = self.NumGens
+        return True
+
+    def _prescreen(self, mols: List[Chem.rdchem.Mol], NumbToKeep: int) -> List[int]:
+        """Rank the 2D molecules of the offspring with the surrogate model and keep the best predicted ones.
+        It is applied before the conformer generation.
+
+        Parameters
+        ----------
+        mols : List[Chem.rdchem.Mol]
+            The molecules of the offspring
+        NumbToKeep : int
+            How many offspring to keep
+
+        Returns
+        -------
+        List[int]
+            The indexes (on mols) of the offspring that will be evaluated with the cost function,
+            from the best to the worst predicted.
+        """
+        if NumbToKeep >= len(mols):
+            return list(range(len(mols)))
+        predictions = np.asarray(self.prescreen['model'].predict(mols))
+        return [int(i) for i in np.argsort(predictions, kind='stable')[:NumbToKeep]]
+
+    def _update_history(self, individuals: Iterable[Individual]):
+        """Add individuals to SawIndividuals. If compact_history is True
+        they are stored as :meth:`moldrug.utils.CompactIndividual`.
+
+        Parameters
+        ----------
+        individuals : Iterable[Individual]
+            Evaluated individuals
+        """
+        if not hasattr(self, 'SawIndex'):
+            # GA instances created with older versions of moldrug
+            self.SawIndex = DedupIndex()
+            self.SawIndex.update(self.SawIndividuals)
+        if getattr(self, 'compact_history', False):
+            for individual in individuals:
+                if individual not in self.SawIndividuals:
+                    self.SawIndividuals.add(CompactIndividual(individual, self._history_table, self._pose_store))
+        else:
+            self.SawIndividuals.update(individuals)
+        self.SawIndex.update(individuals)
+
+    def _prefilter(self, mols: List[Chem.rdchem.Mol], counts: collections.Counter) -> List[Chem.rdchem.Mol]:
+        """Apply prefilter on the 2D molecules.
+
+        Parameters
+        ----------
+        mols : List[Chem.rdchem.Mol]
+            The molecules
+        counts : collections.Counter
+            It is updated with the number of rejected molecules by filter
+
+        Returns
+        -------
+        List[Chem.rdchem.Mol]
+            The molecules that pass the filters.
+        """
+        prefilter = getattr(self, 'prefilter', None)
+        if prefilter is None:
+            return mols
+        passed = []
+        with stage('prefilter'):
+            for mol in mols:
+                reason = prefilter.reject(mol)
+                if reason:
+                    counts[reason] += 1
+                else:
+                    passed.append(mol)
+        return passed
+
     def mutate(self, individual: Individual):
-        """Genetic operators
+        """Genetic operators. It is :meth:`mutate_mol` plus the creation of the Individual (conformer generation).
+        If a subclass overrides it, ``__call__`` uses it instead of :meth:`mutate_mol`, but then the conformers
+        are generated also for the offspring discarded by dedup and prefilter; override :meth:`mutate_mol` instead.
 
         Parameters
         ----------
@@ -1694,35 +4241,56 @@ class GA:
         Individual
             A new Individual.
         """
+        return Individual(self.mutate_mol(individual), randomseed=self.randomseed)
+
+    def mutate_mol(self, individual: Individual) -> Chem.rdchem.Mol:
+        """Genetic operators without the conformer generation. This is the method used by ``__call__``
+        to create the offspring; the Individual is only built for the ones that are not discarded
+        by dedup, prefilter and prescreen.
+
+        Parameters
+        ----------
+        individual : Individual
+            The individual to mutate.
+
+        Returns
+        -------
+        Chem.rdchem.Mol
+            The 2D molecule of the new Individual.
+        """
+        from crem.crem import mutate_mol
 
         # Here is were I have to check if replace_ids or protected_ids where provided.
         mutate_crem_kwargs_to_work_with = self.mutate_crem_kwargs.copy()
-        if 'replace_ids' in self.mutate_crem_kwargs and 'protected_ids' in self.mutate_crem_kwargs:
-            mutate_crem_kwargs_to_work_with['replace_ids'], mutate_crem_kwargs_to_work_with['protected_ids'] = update_reactant_zone(
-                self.InitIndividual.mol, individual.mol, parent_replace_ids=self.mutate_crem_kwargs['replace_ids'],
-                parent_protected_ids=self.mutate_crem_kwargs['protected_ids'])
-        elif 'replace_ids' in self.mutate_crem_kwargs:
-            mutate_crem_kwargs_to_work_with['replace_ids'], _ = update_reactant_zone(
-                self.InitIndividual.mol, individual.mol, parent_replace_ids=self.mutate_crem_kwargs['replace_ids'])
-        elif 'protected_ids' in self.mutate_crem_kwargs:
-            _, mutate_crem_kwargs_to_work_with['protected_ids'] = update_reactant_zone(
-                self.InitIndividual.mol, individual.mol,
-                parent_protected_ids=self.mutate_crem_kwargs['protected_ids'])
+        with stage('reactant_zone'):
+            if 'replace_ids' in self.mutate_crem_kwargs and 'protected_ids' in self.mutate_crem_kwargs:
+                mutate_crem_kwargs_to_work_with['replace_ids'], mutate_crem_kwargs_to_work_with['protected_ids'] = \
+                    update_reactant_zone(
+                        self.InitIndividual.mol, individual.mol, parent_replace_ids=self.mutate_crem_kwargs['replace_ids'],
+                        parent_protected_ids=self.mutate_crem_kwargs['protected_ids'])
+            elif 'replace_ids' in self.mutate_crem_kwargs:
+                mutate_crem_kwargs_to_work_with['replace_ids'], _ = update_reactant_zone(
+                    self.InitIndividual.mol, individual.mol, parent_replace_ids=self.mutate_crem_kwargs['replace_ids'])
+            elif 'protected_ids' in self.mutate_crem_kwargs:
+                _, mutate_crem_kwargs_to_work_with['protected_ids'] = update_reactant_zone(
+                    self.InitIndividual.mol, individual.mol,
+                    parent_protected_ids=self.mutate_crem_kwargs['protected_ids'])
 
         try:
-            mutants = list(mutate_mol(individual.mol, self.crem_db_path, **mutate_crem_kwargs_to_work_with))
-            # Bias the searching to similar molecules
-            if self.get_similar:
-                mol = get_similar_mols(mols=[mol for _, mol in mutants],
-                                       ref_mol=self.InitIndividual.mol, pick=1, beta=0.01)[0]
-            else:
-                _, mol = random.choice(mutants)  # nosec
+            with stage('mutation'):
+                mutants = list(mutate_mol(individual.mol, self.crem_db_path, **mutate_crem_kwargs_to_work_with))
+                # Bias the searching to similar molecules
+                if self.get_similar:
+                    mol = get_similar_mols(mols=[mol for _, mol in mutants],
+                                           ref_mol=self.InitIndividual.mol, pick=1, beta=0.01)[0]
+                else:
+                    _, mol = random.choice(mutants)  # nosec
         except Exception:
             print(f'Note: The mutation on {individual} did not work, it will be returned the same individual')
             mol = individual.mol
         if self.AddHs:
             mol = Chem.AddHs(mol)
-        return Individual(mol, randomseed=self.randomseed)
+        return mol
 
     def pickle(self, title: str, compress: bool = False):
         """Method to pickle the whole GA class
@@ -1744,15 +4312,401 @@ class GA:
         else:
             full_pickle(title, result)
 
-    def to_dataframe(self, return_mol: bool = False):
+    def to_dataframe(self, return_mol: bool = False, return_pdbqt: bool = True, lazy: bool = False):
         """Create a DataFrame from self.SawIndividuals.
+        See :meth:`moldrug.utils.to_dataframe` for the meaning of the arguments.
+
+        Returns
+        -------
+        pandas.DataFrame
+            The DataFrame
+        """
+        return to_dataframe(self.SawIndividuals, return_mol=return_mol, return_pdbqt=return_pdbqt, lazy=lazy)
+
+    def to_parquet(self, path: str, return_pdbqt: bool = True):
+        """Write self.SawIndividuals to a parquet file. See :meth:`moldrug.utils.to_parquet`.
+
+        Parameters
+        ----------
+        path : str
+            The output parquet file
+        return_pdbqt : bool, optional
+            If False the attribute pdbqt will not be exported, by default True
+        """
+        to_parquet(self.SawIndividuals, path, return_pdbqt=return_pdbqt)
+
+
+def _abspath_kwargs(kwargs: Dict) -> Dict:
+    """Get a copy of kwargs where the values (or items of list/tuple values) that are paths
+    to existing files or directories are converted to absolute paths.
+    It is used by :meth:`moldrug.utils.IslandGA` because every island runs in its own directory.
+
+    Parameters
+    ----------
+    kwargs : Dict
+        Keyword arguments (e.g. costfunc_kwargs)
+
+    Returns
+    -------
+    Dict
+        The copy of kwargs
+    """
+    def _abspath(value):
+        if isinstance(value, str) and os.path.exists(value):
+            return os.path.abspath(value)
+        return value
+
+    new_kwargs = dict()
+    for key, value in kwargs.items():
+        if isinstance(value, (list, tuple)):
+            new_kwargs[key] = type(value)(_abspath(item) for item in value)
+        else:
+            new_kwargs[key] = _abspath(value)
+    return new_kwargs
+
+
+def _island_worker(island: GA, workdir: str, njobs: Union[int, str], backend: Union[None, EvaluationBackend],
+                   migrants: int, inbox, outbox, cpus: Union[None, List[int]] = None):
+    """Target of the processes of :meth:`moldrug.utils.IslandGA`. It is defined on the top level
+    of the module in order to be picklable by multiprocessing.
+
+    The messages on inbox are ``(maxiter, immigrants, keys)`` to run maxiter generations
+    or None to finish. The answers on outbox are ``('ok', emigrants, keys)``, ``('done', island)``
+    or ``('error', traceback)``.
+    """
+    import traceback
+
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    # The processes inherit the state of the random module of the parent
+    random.seed(island.randomseed)
+    try:
+        while True:
+            message = inbox.get()
+            if message is None:
+                break
+            maxiter, immigrants, keys = message
+            island.SawIndex.merge(keys)
+            IslandGA._immigrate(island, immigrants)
+            island.maxiter = maxiter
+            island(njobs=njobs, backend=backend)
+            outbox.put(('ok', island.pop[:migrants], island.SawIndex.keys()))
+        outbox.put(('done', island))
+    except Exception:
+        outbox.put(('error', traceback.format_exc()))
+
+
+class IslandGA:
+    """Island model of :meth:`moldrug.utils.GA`. n_islands sub-populations (islands) evolve in
+    separate processes, each one with its own CReM mutation loop and docking workers.
+    Every migration_interval generations the best migrants individuals of each island are sent
+    to other island (ring or random topology) where they replace the worst individuals.
+    Each island keeps its own SawIndividuals, but the hashed indexes (:meth:`moldrug.utils.DedupIndex`)
+    are merged in the main process and shared back, so an island does not evaluate
+    molecules already seen by other islands.
+
+    Every island works inside the directory ``{deffnm}_island{i}``,
+    relative paths of costfunc_kwargs are converted to absolute paths.
+
+    Attributes
+    ----------
+    islands : list[:meth:`moldrug.utils.GA`]
+        The islands. They are updated at the end of every call.
+    n_islands : int
+        Number of islands.
+    migration_interval : int
+        Number of generations between migrations.
+    migrants : int
+        Number of individuals that each island sends on every migration.
+    topology : str
+        ``ring`` (island i sends to island i + 1) or ``random``.
+    maxiter : int
+        Number of generations to perform (on every island).
+    NumGens : int
+        The number of generations performed.
+    SawIndex : :meth:`moldrug.utils.DedupIndex`
+        The shared index of the molecules seen by all the islands.
+    migrations : list[dict]
+        For each migration, the generation and the list of (source, destination) pairs.
+        The immigrants get a new idx on the destination island and keep the (island, idx)
+        where they were created on the attribute origin.
+    pop : list[:meth:`moldrug.utils.Individuals`]
+        The union of the final populations of the islands, sorted by cost.
+    best_cost : list[float]
+        The best cost (among islands) of each generation.
+    """
+    def __init__(self, seed_mol: Union[Chem.rdchem.Mol, Iterable[Chem.rdchem.Mol]],
+                 costfunc: Callable, costfunc_kwargs: Dict, crem_db_path: str, n_islands: int = 4,
+                 migration_interval: int = 5, migrants: int = 1, topology: str = 'ring', maxiter: int = 10,
+                 deffnm: str = 'islands', randomseed: Union[None, int] = None, **ga_kwargs) -> None:
+        """Constructor
+
+        Parameters
+        ----------
+        seed_mol : Union[Chem.rdchem.Mol, Iterable[Chem.rdchem.Mol]]
+            The seed molecule(s), the same for every island. See :meth:`moldrug.utils.GA`.
+        costfunc : Callable
+            The cost function.
+        costfunc_kwargs : Dict
+            The keyword arguments of the selected cost function.
+        crem_db_path : str
+            Path to the CReM data base.
+        n_islands : int, optional
+            Number of islands, by default 4
+        migration_interval : int, optional
+            Number of generations between migrations, by default 5
+        migrants : int, optional
+            Number of individuals sent by every island on every migration, by default 1
+        topology : str, optional
+            Migration topology: ``ring`` or ``random``, by default 'ring'
+        maxiter : int, optional
+            Number of generations, by default 10
+        deffnm : str, optional
+            Prefix of the islands directories and files, by default 'islands'
+        randomseed : Union[None, int], optional
+           Set a random seed for reproducibility. Island i will use randomseed + i, by default None
+        ga_kwargs : optional
+            Any other keyword argument of :meth:`moldrug.utils.GA` (e.g. popsize, beta, pc, ...),
+            popsize is the size of every island.
+
+        Raises
+        ------
+        ValueError
+            In case of invalid topology, n_islands, migration_interval or migrants.
+        """
+        if topology not in ['ring', 'random']:
+            raise ValueError(f"topology must be 'ring' or 'random'. {topology} was provided")
+        if n_islands < 1:
+            raise ValueError(f"n_islands must be a positive integer. {n_islands} was provided")
+        if migration_interval < 1:
+            raise ValueError(f"migration_interval must be a positive integer. {migration_interval} was provided")
+        popsize = ga_kwargs.get('popsize', signature(GA).parameters['popsize'].default)
+        if not 0 <= migrants < popsize:
+            raise ValueError(f"migrants must be in [0, popsize). {migrants} was provided")
+
+        self.__moldrug_version__ = __version__
+        self.n_islands = n_islands
+        self.migration_interval = migration_interval
+        self.migrants = migrants
+        self.topology = topology
+        self.maxiter = maxiter
+        self.deffnm = deffnm
+        self.randomseed = randomseed
+        if self.randomseed is not None:
+            random.seed(randomseed)
+
+        costfunc_kwargs = _abspath_kwargs(costfunc_kwargs)
+        self.islands = []
+        for i in range(n_islands):
+            self.islands.append(
+                GA(seed_mol, costfunc=costfunc, costfunc_kwargs=costfunc_kwargs, crem_db_path=crem_db_path,
+                   maxiter=maxiter, deffnm=f"{deffnm}_island{i}",
+                   randomseed=None if randomseed is None else randomseed + i, **ga_kwargs))
+
+        # Tracking parameters
+        self.NumCalls = 0
+        self.NumGens = 0
+        self.SawIndex = DedupIndex()
+        self.migrations = []
+        self.pop = []
+        self.best_cost = []
+
+    def __call__(self, njobs: Union[int, str] = 1, backend: Union[None, EvaluationBackend] = None):
+        """Call definition
+
+        Parameters
+        ----------
+        njobs : Union[int, str], optional
+            The number of jobs for parallelization used by each island, by default 1.
+            The total number of processes is n_islands * njobs. If 'auto', the available CPUs are split
+            between the islands (CPU affinity) and every island uses the 'auto' mode of :meth:`moldrug.utils.GA`.
+        backend : Union[None, EvaluationBackend], optional
+            The backend used by the islands to evaluate the cost function, by default None
+
+        Raises
+        ------
+        RuntimeError
+            If some island failed.
+        """
+        ts = time.time()
+        self.NumCalls += 1
+        if self.__moldrug_version__ != __version__:
+            warn(f"{self.__class__.__name__} was initialized with moldrug-{self.__moldrug_version__} "
+                 f"but was called with moldrug-{__version__}")
+
+        # Split the CPUs between the islands
+        island_cpus = [None] * len(self.islands)
+        if njobs == 'auto' and hasattr(os, 'sched_getaffinity'):
+            cpus = sorted(os.sched_getaffinity(0))
+            if len(cpus) >= len(self.islands):
+                island_cpus = [cpus[i::len(self.islands)] for i in range(len(self.islands))]
+
+        inboxes = [mp.Queue() for _ in self.islands]
+        outboxes = [mp.Queue() for _ in self.islands]
+        processes = [
+            mp.Process(target=_island_worker,
+                       args=(island, island.deffnm, njobs, backend, self.migrants, inbox, outbox, cpus))
+            for island, inbox, outbox, cpus in zip(self.islands, inboxes, outboxes, island_cpus)]
+        for process in processes:
+            process.start()
+
+        try:
+            immigrants = [[] for _ in self.islands]
+            done = 0
+            while done < self.maxiter:
+                maxiter = min(self.migration_interval, self.maxiter - done)
+                keys = self.SawIndex.keys()
+                for inbox, island_immigrants in zip(inboxes, immigrants):
+                    inbox.put((maxiter, island_immigrants, keys))
+                emigrants = []
+                for outbox, process in zip(outboxes, processes):
+                    island_emigrants, island_keys = self._receive(outbox, process)
+                    emigrants.append(island_emigrants)
+                    self.SawIndex.merge(island_keys)
+                done += maxiter
+                self.NumGens += maxiter
+                print(f"IslandGA: generation {self.NumGens}, {len(self.SawIndex)} unique individuals seen.")
+                if done < self.maxiter:
+                    immigrants = self._migrate(emigrants)
+                else:
+                    immigrants = [[] for _ in self.islands]
+
+            for inbox in inboxes:
+                inbox.put(None)
+            self.islands = [self._receive(outbox, process)[0] for outbox, process in zip(outboxes, processes)]
+        finally:
+            for process in processes:
+                process.join(timeout=10)
+                if process.is_alive():
+                    process.terminate()
+
+        self.pop = sorted(set(individual for island in self.islands for individual in island.pop))
+        self.best_cost = np.min([island.best_cost for island in self.islands], axis=0).tolist()
+
+        print(f"\n{50*'=+'}\n")
+        print(f"The island simulation finished successfully after {self.NumGens} generations "
+              f"with {self.n_islands} islands. "
+              f"A total number of {len(self.SawIndex)} Individuals were seen during the simulation.")
+        print(f"Final Individual: {self.pop[0]}")
+        print(f"Total time ({self.maxiter} generations): {time.time() - ts:>5.2f} (s).\n"
+              f"Finished at {datetime.datetime.now().strftime('%c')}.\n")
+
+    @staticmethod
+    def _receive(outbox, process) -> tuple:
+        """Wait for the answer of an island
+
+        Raises
+        ------
+        RuntimeError
+            If the island reported an exception or its process died.
+        """
+        import queue
+
+        while True:
+            try:
+                status, *payload = outbox.get(timeout=5)
+                break
+            except queue.Empty:
+                if not process.is_alive():
+                    raise RuntimeError(f"The island process {process.name} died with exit code {process.exitcode}")
+        if status == 'error':
+            raise RuntimeError(f"An island failed with:\n{payload[0]}")
+        return payload
+
+    def _migrate(self, emigrants: List[List[Individual]]) -> List[List[Individual]]:
+        """Get the immigrants of every island according to the topology
+
+        Parameters
+        ----------
+        emigrants : List[List[Individual]]
+            The individuals sent by every island
+
+        Returns
+        -------
+        List[List[Individual]]
+            The individuals received by every island
+        """
+        immigrants = [[] for _ in emigrants]
+        if len(emigrants) < 2 or not self.migrants:
+            return immigrants
+        moves = []
+        for destination in range(len(emigrants)):
+            if self.topology == 'ring':
+                source = (destination - 1) % len(emigrants)
+            else:
+                source = random.choice([i for i in range(len(emigrants)) if i != destination])  # nosec
+            immigrants[destination] = emigrants[source]
+            for individual in emigrants[source]:
+                # Island and idx where the individual was created (it keeps the first one)
+                if getattr(individual, 'origin', None) is None:
+                    individual.origin = (source, individual.idx)
+            moves.append((source, destination))
+        self.migrations.append({'generation': self.NumGens, 'moves': moves})
+        return immigrants
+
+    @staticmethod
+    def _immigrate(island: GA, immigrants: List[Individual]):
+        """Replace the worst individuals of island with immigrants (those not already in its population).
+        The immigrants get the idx of the island (the one of its history if they were already seen,
+        a new one otherwise); the island and idx where they were created are kept on the attribute origin.
+
+        Parameters
+        ----------
+        island : GA
+            The island
+        immigrants : List[Individual]
+            The evaluated individuals coming from other island
+        """
+        immigrants = [individual for individual in immigrants if individual not in island.pop]
+        if not immigrants:
+            return
+        seen = {individual: individual.idx for individual in island.SawIndividuals}
+        next_idx = len(island.SawIndividuals)
+        for individual in immigrants:
+            # Do not count them as accepted offspring
+            individual.kept_gens = set([island.NumGens])
+            if individual in seen:
+                individual.idx = seen[individual]
+            else:
+                individual.idx = next_idx
+                next_idx += 1
+        island.pop = sorted(sorted(island.pop)[:island.popsize - len(immigrants)] + immigrants)
+        island._update_history(immigrants)
+
+    @property
+    def SawIndividuals(self) -> set:
+        """The union of the SawIndividuals of the islands"""
+        return set().union(*[island.SawIndividuals for island in self.islands])
+
+    def pickle(self, title: str, compress: bool = False):
+        """Method to pickle the whole IslandGA class
+
+        Parameters
+        ----------
+        title : str
+            Name of the object which will be completed with the corresponding
+            extension depending if compress is set to True or False.
+        compress : bool, optional
+            Use compression, by default False. If True :meth:`moldrug.utils.compressed_pickle` will be used;
+            if not :meth:`moldrug.utils.full_pickle` will be used instead.
+        """
+        if compress:
+            compressed_pickle(title, self)
+        else:
+            full_pickle(title, self)
+
+    def to_dataframe(self, return_mol: bool = False, return_pdbqt: bool = True, lazy: bool = False):
+        """Create a DataFrame from the SawIndividuals of all the islands.
+        See :meth:`moldrug.utils.to_dataframe` for the meaning of the arguments.
 
         Returns
         -------
         pandas.DataFrame
             The DataFrame
         """
-        return to_dataframe(self.SawIndividuals, return_mol=return_mol)
+        return to_dataframe(self.SawIndividuals, return_mol=return_mol, return_pdbqt=return_pdbqt, lazy=lazy)
 
 
 if __name__ == '__main__':
@@ -4,11 +4,14 @@ import copy
 import gzip
 import os
 import shutil
+import subprocess
 import sys
 import tempfile
+import time
 from multiprocessing import cpu_count
 
 import get_vina
+import numpy as np
 import requests
 import yaml
 from rdkit import Chem
@@ -154,6 +157,34 @@ def test_multi_receptor(maxiter=1, popsize=2, njobs=3, NumbCalls=1):
     vina_out.chunks[0].write()
 
 
+def test_IslandGA(njobs=2):
+    out = utils.IslandGA(
+        seed_mol=Chem.MolFromSmiles(TEST_DATA['x0161']['smiles']),
+        costfunc=fitness.CostOnlyVina,
+        costfunc_kwargs={
+            'vina_executable': vina_executable,
+            'receptor_pdbqt_path': TEST_DATA['x0161']['protein']['pdbqt'],
+            'boxcenter': TEST_DATA['x0161']['box']['boxcenter'],
+            'boxsize': TEST_DATA['x0161']['box']['boxsize'],
+            'exhaustiveness': 1,
+            'num_modes': 1,
+        },
+        crem_db_path=crem_db_path,
+        n_islands=2,
+        migration_interval=1,
+        migrants=1,
+        maxiter=2,
+        popsize=2,
+        deffnm='test_islands',
+        randomseed=123)
+    out(njobs=njobs)
+    assert out.NumGens == 2
+    assert len(out.migrations) == 1
+    assert all(island.NumGens == 2 for island in out.islands)
+    assert len(out.SawIndex) == len(out.SawIndividuals)
+    out.pickle('result_test_islands', compress=True)
+
+
 def test_local_command_line():
     Config = {
         "main": {
@@ -316,6 +347,596 @@ def test_Individual():
     assert I1**I2 == 100
 
 
+def test_make_sdf():
+    I1 = utils.Individual(Chem.MolFromSmiles('CCCCl'))
+    I2 = utils.Individual(Chem.MolFromSmiles('CCOCCCF'))
+    I3 = utils.Individual(Chem.MolFromSmiles('CCOCC'), pdbqt='This is a corrupted pdbqt')
+    utils.make_sdf([I1, I2, I3], sdf_name='make_sdf_single')
+    with open('make_sdf_single.sdf', 'r') as f:
+        assert f.read().count('$$$$') == 2
+    I1.pdbqt = [I1.pdbqt, I1.pdbqt]
+    I2.pdbqt = [I2.pdbqt, I2.pdbqt]
+    utils.make_sdf([I1, I2], sdf_name='make_sdf_multi', njobs=2, compress=True)
+    for i in [1, 2]:
+        with gzip.open(f'make_sdf_multi_{i}.sdf.gz', 'rt') as f:
+            assert f.read().count('$$$$') == 2
+
+
+def test_to_dataframe():
+    I1 = utils.Individual(Chem.MolFromSmiles('CCCCl'), idx=1, cost=1)
+    I2 = utils.Individual(Chem.MolFromSmiles('CCOCCCF'), idx=2)
+    I1.qed = 0.5
+    I2.vina_score = [-7.0, -5.0]
+    df = utils.to_dataframe([I1, I2])
+    assert 'mol' not in df.columns
+    assert df['cost'].dtype == 'float64'
+    assert df['idx'].dtype == 'int64'
+    assert df['qed'].isna().iloc[1]
+    df = utils.to_dataframe([I1, I2], return_mol=True, lazy=True)
+    assert df['pdbqt'].iloc[0].load() == I1.pdbqt
+    assert 'pdbqt' not in utils.to_dataframe([I1, I2], return_pdbqt=False).columns
+    utils.to_parquet([I1, I2], 'to_dataframe.parquet')
+
+
+def test_CompactIndividual():
+    table = utils.PropertyTable(capacity=2)
+    store = utils.PoseStore('test_compact_poses.bin')
+    individuals, records = [], []
+    for i, smi in enumerate(['CCO', 'CCCO', 'CCCCO']):
+        individual = utils.Individual(Chem.MolFromSmiles(smi), idx=i, cost=float(i))
+        individual.genID = i
+        individual.kept_gens = set([i])
+        individual.vina_score = [-float(i), 0.0]
+        individuals.append(individual)
+        records.append(utils.CompactIndividual(individual, table, store))
+    assert individuals[0] in set(records)
+    assert records[1] == individuals[1]
+    assert records[2].genID == 2
+    assert records[2].vina_score == [-2.0, 0.0]
+    assert records[1].pdbqt == individuals[1].pdbqt
+    assert min(records).idx == 0
+    individuals[0].kept_gens.add(1)
+    assert records[0].kept_gens == {0, 1}
+    assert records[1].to_individual().smiles == individuals[1].smiles
+    assert len(utils.to_dataframe(records)) == 3
+    store.close()
+
+
+def test_DedupIndex():
+    index = utils.DedupIndex(capacity=4)
+    smiles = ['C' * i + 'O' for i in range(1, 100)]
+    for smi in smiles:
+        assert index.add(smi)
+    assert not index.add('CO')
+    assert len(index) == len(smiles)
+    assert Chem.MolFromSmiles('OCC') in index
+    assert utils.Individual(Chem.MolFromSmiles('CCN')) not in index
+    index.save('test_dedup_index.npz')
+    loaded = utils.DedupIndex.load('test_dedup_index.npz')
+    assert all(smi in loaded for smi in smiles)
+    other = utils.DedupIndex()
+    other.update(['CCN', 'CO'])
+    assert index.merge(other) == 1
+    assert 'CCN' in index
+
+
+def test_SurrogateModel():
+    mols = [Chem.MolFromSmiles(smi) for smi in ['CCO', 'CCCO', 'CCCCO', 'c1ccccc1O']]
+    model = utils.SurrogateModel(nBits=256)
+    assert not model.is_fitted
+    model.fit(mols, [0.9, 0.7, 0.5, float('inf')])
+    assert model.is_fitted
+    assert model.predict(mols).shape == (4,)
+
+
+def test_TaskScheduler():
+    scheduler = utils.TaskScheduler(min_samples=3)
+    smiles = ['C', 'CCO', 'CCCCCCCCCCCCO', 'c1ccccc1CCO', 'CCN']
+    args_list = [(utils.Individual(Chem.MolFromSmiles(smi)), {}) for smi in smiles]
+    features, multiplicity = scheduler.features(args_list)
+    chunks = scheduler.chunks(features, multiplicity, njobs=2)
+    # Longest first and every task is dispatched once
+    assert chunks[0][0] == 2
+    assert sorted(sum(chunks, [])) == list(range(len(smiles)))
+    # Constraint docking multiplies the cost
+    _, multiplicity = scheduler.features([(args_list[0][0], {'constraint': True, 'constraint_num_conf': 10})])
+    assert multiplicity[0] == 10
+    # Learn the times
+    scheduler.update(features, np.ones(len(smiles)), 0.5 + 0.2 * features[:, 1])
+    assert np.allclose(scheduler.coef, [0.5, 0.2, 0], atol=0.05)
+
+
+def test_split_cpus():
+    assert utils.available_cpus() >= 1
+    assert utils.split_cpus(4, {'exhaustiveness': 8}, ncpus=32) == (4, 8)
+    assert utils.split_cpus(100, {'exhaustiveness': 8}, ncpus=32) == (32, 1)
+    assert utils.split_cpus(2, {'exhaustiveness': 4, 'constraint': True}, ncpus=32) == (2, 1)
+
+
+def test_run_timeout():
+    import subprocess
+    import time
+    start = time.time()
+    try:
+        utils.run('sleep 60 & sleep 60', timeout=0.5)
+        raise AssertionError('utils.run did not raise subprocess.TimeoutExpired')
+    except subprocess.TimeoutExpired:
+        pass
+    assert time.time() - start < 10
+    assert utils.run('echo moldrug', timeout=10).stdout.strip() == 'moldrug'
+    individual = utils.Individual(Chem.MolFromSmiles('CCO'))
+    individual.vina_score = [-7, utils.VINA_TIMEOUT_SCORE]
+    assert utils.is_timeout(individual)
+
+
+def test_launch():
+    import subprocess
+    lines = []
+    result = utils.launch(['python', '-c', 'print("Affinity: -7.1 (kcal/mol)"); print("a b")'],
+                          on_line=lines.append, cpus=[0], nice=1)
+    assert lines == ['Affinity: -7.1 (kcal/mol)', 'a b']
+    assert result.stdout == 'Affinity: -7.1 (kcal/mol)\na b\n'
+    assert utils.launch(['echo', 'path with spaces'], capture_stdout=False).stdout == ''
+    # The limits are already set when the program starts
+    cpu = min(os.sched_getaffinity(0))
+    result = utils.launch(['python', '-c', 'import os, resource; print(sorted(os.sched_getaffinity(0)), os.nice(0), '
+                           'resource.getrlimit(resource.RLIMIT_AS)[0])'], cpus=[cpu], nice=1, memory_limit=2**34)
+    assert result.stdout == f'[{cpu}] {os.nice(0) + 1} {2**34}\n'
+    try:
+        utils.launch(['sleep', '60'], timeout=0.5)
+        raise AssertionError('utils.launch did not raise subprocess.TimeoutExpired')
+    except subprocess.TimeoutExpired:
+        pass
+    try:
+        utils.launch(['python', '-c', 'import sys; sys.exit("moldrug")'])
+        raise AssertionError('utils.launch did not raise RuntimeError')
+    except RuntimeError as e:
+        assert 'moldrug' in str(e)
+
+
+def test_receptor_tasks():
+    individual = utils.Individual(Chem.MolFromSmiles('CCO'))
+    costfunc_kwargs = dict(
+        wd='wd', receptor_pdbqt_path=['r1.pdbqt', 'r2.pdbqt'], boxcenter=[[0, 0, 0], [1, 1, 1]],
+        boxsize=[[10, 10, 10], [12, 12, 12]], vina_score_type=['min', 'max'], exhaustiveness=4)
+    tasks = fitness.receptor_tasks(individual, costfunc_kwargs)
+    assert [task['receptor_pdbqt_path'] for task in tasks] == ['r1.pdbqt', 'r2.pdbqt']
+    assert [task['boxcenter'] for task in tasks] == [[0, 0, 0], [1, 1, 1]]
+    assert len({task['wd'] for task in tasks}) == 2
+    assert all(task['exhaustiveness'] == 4 and 'vina_score_type' not in task for task in tasks)
+    assert fitness.receptor_tasks(individual, dict(costfunc_kwargs, wt_cutoff=10)) == []
+    # The per receptor results are gathered back to the cost function
+    NewI = fitness.CostMultiReceptorsOnlyVina(
+        individual, vina_results=[(-7, 'pdbqt1'), (-5, 'pdbqt2')], **costfunc_kwargs)
+    assert NewI.vina_score == [-7, -5] and NewI.pdbqt == ['pdbqt1', 'pdbqt2']
+    # Early termination: not docked receptors get the best achievable desirability
+    assert fitness.receptor_order(dict(vina_score_type=['min', 'min', 'max'])) == [2, 0, 1]
+    NewI = fitness.CostMultiReceptorsOnlyVina(
+        individual, vina_results=[(-7, 'pdbqt1'), None], **costfunc_kwargs)
+    assert NewI.vina_score[0] == -7 and np.isnan(NewI.vina_score[1]) and NewI.pdbqt == ['pdbqt1', 'EarlyStop']
+    assert NewI.cost <= fitness.CostMultiReceptorsOnlyVina(
+        individual, vina_results=[(-7, 'pdbqt1'), (-10, 'pdbqt2')], **costfunc_kwargs).cost
+
+
+def _fake_vinadock(Individual, seed_pose=None, **kwargs):
+    if seed_pose is not None:
+        Individual.seeded = seed_pose[1] < -6.5
+    return -7.0, 'pdbqt'
+
+
+def test_receptor_seeded():
+    individual = utils.Individual(Chem.MolFromSmiles('CCO'))
+    costfunc_kwargs = dict(
+        wd='wd', receptor_pdbqt_path=['r1.pdbqt', 'r2.pdbqt'], boxcenter=[[0, 0, 0], [1, 1, 1]],
+        boxsize=[[10, 10, 10], [12, 12, 12]], vina_score_type=['min', 'max'], pose_seeding={'num_conf': 2})
+    vinadock = fitness._vinadock
+    fitness._vinadock = _fake_vinadock
+    try:
+        # The flag set on the docked copy (receptor fan-out) comes back with the result
+        child = copy.deepcopy(individual)
+        assert fitness._receptor_docking(child, seed_pose=('pdbqt', -7.0)) == (-7.0, 'pdbqt', True)
+        assert not hasattr(child, 'seeded')
+        assert fitness._receptor_docking(child) == (-7.0, 'pdbqt', None)
+        for costfunc in [fitness.CostMultiReceptors, fitness.CostMultiReceptorsOnlyVina]:
+            # One value per receptor
+            NewI = costfunc(copy.deepcopy(individual), vina_results=[(-7, 'pdbqt1', True), (-5, 'pdbqt2', False)],
+                            **costfunc_kwargs)
+            assert NewI.seeded == [True, False] and NewI.vina_score == [-7, -5]
+            NewI = costfunc(copy.deepcopy(individual), vina_results=[(-7, 'pdbqt1'), None], **costfunc_kwargs)
+            assert NewI.seeded == [None, None]
+            # Serial loop
+            child = copy.deepcopy(individual)
+            child.seed_pose = (['pdbqt1', 'pdbqt2'], [-7.0, -6.0])
+            assert costfunc(child, **costfunc_kwargs).seeded == [True, False]
+    finally:
+        fitness._vinadock = vinadock
+
+
+def _ncores_vinadock(Individual, wd='.vina_jobs', ncores=1, **kwargs):
+    return -float(ncores), 'pdbqt'
+
+
+def test_receptor_auto_ncores():
+    individuals = [utils.Individual(Chem.MolFromSmiles(smiles)) for smiles in ['CCO', 'CCN']]
+    # ncores given by the user must not be used by njobs = 'auto'
+    costfunc_kwargs = dict(
+        wd='wd', receptor_pdbqt_path=['r1.pdbqt', 'r2.pdbqt'], boxcenter=[[0, 0, 0], [1, 1, 1]],
+        boxsize=[[10, 10, 10], [12, 12, 12]], vina_score_type=['min', 'max'], exhaustiveness=8, ncores=8)
+    vinadock, available_cpus = fitness._vinadock, utils.available_cpus
+    fitness._vinadock = _ncores_vinadock
+    utils.available_cpus = lambda: 16
+    try:
+        # 4 tasks on 16 CPUs: split_cpus gives (4, 4) and the tail does not exceed the CPUs
+        results = utils._evaluate_receptors(
+            fitness.CostMultiReceptorsOnlyVina, [(individual, costfunc_kwargs) for individual in individuals],
+            njobs='auto')
+    finally:
+        fitness._vinadock, utils.available_cpus = vinadock, available_cpus
+    assert [result.vina_score for result in results] == [[-4.0, -4.0], [-4.0, -4.0]]
+
+
+def _offtarget_vinadock(Individual, wd='.vina_jobs', ncores=1, receptor_pdbqt_path=None, **kwargs):
+    if receptor_pdbqt_path == 'r2.pdbqt':
+        # Strong off-target binding only for ethanol
+        return (-9.0 if Chem.MolToSmiles(Individual.mol) == 'CCO' else -3.0), 'pdbqt2'
+    return -7.0, 'pdbqt1'
+
+
+def test_receptor_early_stop():
+    individuals = [utils.Individual(Chem.MolFromSmiles(smiles)) for smiles in ['CCO', 'CCN']]
+    costfunc_kwargs = dict(
+        wd='wd', receptor_pdbqt_path=['r1.pdbqt', 'r2.pdbqt'], boxcenter=[[0, 0, 0], [1, 1, 1]],
+        boxsize=[[10, 10, 10], [12, 12, 12]], vina_score_type=['min', 'max'], cost_threshold=0.7)
+    vinadock, Pool = fitness._vinadock, utils.mp.Pool
+    pools = []
+
+    def counting_pool(*args, **kwargs):
+        pools.append(args)
+        return Pool(*args, **kwargs)
+    fitness._vinadock = _offtarget_vinadock
+    utils.mp.Pool = counting_pool
+    try:
+        serial = [fitness.CostMultiReceptorsOnlyVina(copy.deepcopy(individual), **costfunc_kwargs)
+                  for individual in individuals]
+        results = utils._evaluate_receptors(
+            fitness.CostMultiReceptorsOnlyVina, [(individual, costfunc_kwargs) for individual in individuals], njobs=2)
+    finally:
+        fitness._vinadock, utils.mp.Pool = vinadock, Pool
+    # One pool for all the dockings
+    assert len(pools) == 1
+    # Ethanol is stopped after the off-target receptor
+    assert np.isnan(results[0].vina_score[0]) and results[0].vina_score[1] == -9.0
+    assert results[1].vina_score == [-7.0, -3.0]
+    for result, expected in zip(results, serial):
+        assert result.cost == expected.cost
+        assert np.array_equal(result.vina_score, expected.vina_score, equal_nan=True)
+
+
+def test_vina_retries():
+    exhaustiveness = []
+
+    def timed_out_vina(vina_args, **kwargs):
+        exhaustiveness.append(vina_args[vina_args.index('--exhaustiveness') + 1])
+        raise subprocess.TimeoutExpired(vina_args, kwargs['timeout'])
+
+    run_vina = fitness._run_vina
+    fitness._run_vina = timed_out_vina
+    try:
+        result = fitness._vinadock(
+            utils.Individual(Chem.MolFromSmiles('CCO'), randomseed=1), wd='test_vina_retries',
+            receptor_pdbqt_path=TEST_DATA['x0161']['protein']['pdbqt'], boxcenter=TEST_DATA['x0161']['box']['boxcenter'],
+            boxsize=TEST_DATA['x0161']['box']['boxsize'], exhaustiveness=8, timeout=1, timeout_retries=2)
+    finally:
+        fitness._run_vina = run_vina
+    # Every retry halves the exhaustiveness
+    assert exhaustiveness == [8, 4, 2]
+    assert result == (utils.VINA_TIMEOUT_SCORE, 'VinaTimeout')
+
+
+def test_stage_timer():
+    timer = utils.StageTimer()
+    previous = utils._swap_stage_timer(timer)
+    try:
+        with utils.stage('vina'):
+            time.sleep(0.05)
+        with utils.stage('vina'):
+            pass
+        # The stages of a worker are reported back and merged
+        output = utils._call_costfunc((len, ['a', 'b'], {}))
+        assert output.result == 2 and output.stages == {}
+        assert utils._untime(output) == 2
+        timer.merge({'meeko': {'wall': 1, 'cpu': 0.5, 'calls': 2}}, worker='node-1')
+    finally:
+        utils._swap_stage_timer(previous)
+    timings = timer.as_dict()
+    assert timings['stages']['vina']['calls'] == 2 and timings['stages']['vina']['wall'] >= 0.05
+    assert timings['stages']['meeko'] == {'wall': 1, 'cpu': 0.5, 'calls': 2}
+    assert timings['workers']['node-1']['meeko']['calls'] == 2
+
+
+def test_lazy_imports():
+    import subprocess
+    # The heavy dependencies are imported on first use
+    for module in ['moldrug.cli', 'moldrug.utils', 'moldrug.fitness', 'moldrug.broker']:
+        loaded = subprocess.run(
+            [sys.executable, '-c', f"import sys, {module}; "
+             "print(*[m for m in ['pandas', 'tqdm', 'crem', 'meeko'] if m in sys.modules])"],
+            capture_output=True, text=True, check=True).stdout.split()
+        assert loaded == [], f"{module} imports {loaded}"
+
+
+def test_prefilter():
+    prefilter = utils.PreFilter(max_wt=300, max_heavy_atoms=20, max_rotatable_bonds=5, lipinski=2,
+                                blacklist=['[N+](=O)[O-]', Chem.MolFromSmiles('Br')])
+    assert prefilter.reject(Chem.MolFromSmiles('CC(=O)Nc1ccc(O)cc1')) is None
+    assert prefilter.reject(Chem.MolFromSmiles('C' * 21)) == 'heavy_atoms'
+    assert prefilter.reject(Chem.MolFromSmiles('IC(I)CI')) == 'wt'
+    assert prefilter.reject(Chem.MolFromSmiles('CCCCCCCCC')) == 'rotatable_bonds'
+    assert prefilter.reject(Chem.MolFromSmiles('c1ccccc1[N+](=O)[O-]')) == 'blacklist'
+    assert prefilter.reject(Chem.MolFromSmiles('BrCCO')) == 'blacklist'
+    # Nothing is applied by default
+    assert utils.PreFilter().reject(Chem.MolFromSmiles('C' * 50)) is None
+
+
+def test_fidelity():
+    assert utils._fidelity_config(None) is None
+    assert utils._fidelity_config([]) is None
+    fidelity = utils._fidelity_config([{'exhaustiveness': 1}])
+    assert fidelity == {'tiers': [{'exhaustiveness': 1}], 'margin': 0.0, 'threshold': None, 'fraction': None}
+    for wrong in [{'tiers': [{'exhaustiveness': 1}], 'unknown': 1}, {'tiers': [1]},
+                  {'tiers': [{'exhaustiveness': 1}], 'fraction': 0}, 'exhaustiveness']:
+        try:
+            utils._fidelity_config(wrong)
+            raise AssertionError(f'utils._fidelity_config did not raise ValueError with {wrong}')
+        except ValueError:
+            pass
+    individuals = [utils.Individual(Chem.MolFromSmiles('CCO'), pdbqt='pdbqt', cost=cost)
+                   for cost in [-5, -7, np.inf, -6, -8]]
+    # Only the individuals that would enter the population
+    assert utils._promote(individuals, fidelity, bound=-6) == [1, 4]
+    fidelity['margin'] = 1
+    assert utils._promote(individuals, fidelity, bound=-6) == [1, 3, 4]
+    fidelity['fraction'] = 0.4
+    assert utils._promote(individuals, fidelity) == [1, 4]
+    fidelity['threshold'] = -8.5
+    assert utils._promote(individuals, fidelity) == [4]
+
+
+def test_seed_pose():
+    parent = utils.Individual(Chem.MolFromSmiles('CC(=O)Nc1ccc(O)cc1'), randomseed=1)
+    pose = fitness._pose_to_mol(parent.pdbqt)
+    assert pose.GetNumHeavyAtoms() == 11 and pose.GetNumConformers() == 1
+    assert fitness._pose_to_mol('VinaFailed') is None
+    child = utils.Individual(Chem.MolFromSmiles('CC(=O)Nc1ccc(OC)cc1'), randomseed=1)
+    assert fitness._seed_pose(child) is None
+    child.seed_pose = (parent.pdbqt, -7.0)
+    assert fitness._seed_pose(child) == (parent.pdbqt, -7.0) and fitness._seed_pose(child, 0) is None
+    # Multiple receptors
+    child.seed_pose = (['pdbqt_0', 'pdbqt_1'], [-7.0, -8.0])
+    assert fitness._seed_pose(child) is None and fitness._seed_pose(child, 1) == ('pdbqt_1', -8.0)
+
+
+def test_crop_receptor():
+    data = get_data('x0161')
+    with tempfile.TemporaryDirectory() as cache:
+        cropped = utils.crop_receptor(data['protein']['pdbqt'], data['box']['boxcenter'], data['box']['boxsize'],
+                                      cache=cache)
+        assert os.path.getsize(cropped) < os.path.getsize(data['protein']['pdbqt'])
+        # Cached by hash
+        assert utils.crop_receptor(data['protein']['pdbqt'], data['box']['boxcenter'], data['box']['boxsize'],
+                                   cache=cache) == cropped
+        smaller = utils.crop_receptor(data['protein']['pdbqt'], data['box']['boxcenter'], data['box']['boxsize'],
+                                      margin=2, cache=cache)
+        assert smaller != cropped and os.path.getsize(smaller) < os.path.getsize(cropped)
+        cropped_pdb = utils.crop_receptor(data['protein']['pdb'], data['box']['boxcenter'], data['box']['boxsize'],
+                                          cache=cache)
+        assert 0 < Chem.MolFromPDBFile(cropped_pdb).GetNumAtoms() < Chem.MolFromPDBFile(data['protein']['pdb']).GetNumAtoms()
+
+
+def test_prepared_maps():
+    data = get_data('x0161')
+    receptor, boxcenter, boxsize = data['protein']['pdbqt'], data['box']['boxcenter'], data['box']['boxsize']
+    with tempfile.TemporaryDirectory() as cache:
+        assert fitness.prepared_maps(receptor, boxcenter, boxsize, cache=cache) is None
+        prefix = fitness._maps_prefix(receptor, boxcenter, boxsize, cache=cache)
+        os.makedirs(os.path.dirname(prefix))
+        with open(f"{prefix}.moldrug.json", 'w') as f:
+            f.write('{}')
+        # Content-addressed: the same receptor and box
+        assert fitness.prepared_maps(receptor, boxcenter, boxsize, cache=cache) == prefix
+        assert fitness.prepare_maps(receptor, boxcenter, boxsize, vina_executable='nonexistent', cache=cache) == prefix
+        assert fitness.prepared_maps(receptor, boxcenter, [20, 20, 20], cache=cache) is None
+
+
+def test_conformer_pdbqts():
+    from meeko import MoleculePreparation, PDBQTWriterLegacy
+    from rdkit.Chem import AllChem
+    assert utils._meeko_preparator() is utils._meeko_preparator()
+    # The second molecule gets pseudo atoms (flexible macrocycle)
+    for smi in ['CC(=O)Nc1ccc(O)cc1', 'C1CCCCCCCCCCC1CC(=O)O']:
+        mol = Chem.AddHs(Chem.MolFromSmiles(smi))
+        AllChem.EmbedMultipleConfs(mol, 3, randomSeed=123)
+        mol = Chem.RemoveHs(mol)
+        pdbqts = fitness._conformer_pdbqts(mol)
+        assert [conf_id for conf_id, _ in pdbqts] == [conf.GetId() for conf in mol.GetConformers()]
+        # Same output as preparing every conformer from scratch
+        for conf_id, pdbqt in pdbqts:
+            mol_setups = MoleculePreparation().prepare(Chem.AddHs(Chem.Mol(mol, confId=conf_id), addCoords=True))
+            assert pdbqt == PDBQTWriterLegacy.write_string(mol_setups[0])[0]
+
+
+def _qed_cost(Individual):
+    from rdkit.Chem import QED
+    Individual.cost = -QED.qed(Chem.RemoveHs(Individual.mol))
+    return Individual
+
+
+class _MutateCounter(utils.GA):
+    def mutate(self, individual):
+        self.mutate_calls = getattr(self, 'mutate_calls', 0) + 1
+        return super().mutate(individual)
+
+
+def test_GA_mutate():
+    out = _MutateCounter(Chem.MolFromSmiles(TEST_DATA['x0161']['smiles']), costfunc=_qed_cost, costfunc_kwargs={},
+                         crem_db_path=crem_db_path, maxiter=1, popsize=4, randomseed=123, deffnm='test_GA_mutate')
+    out(njobs=1)
+    # A subclass that overrides mutate is still used to create the offspring
+    assert out.mutate_calls == out.nc
+    assert utils.GA.mutate(out, out.pop[0]).pdbqt
+
+
+def test_GA_prescreen():
+    out = utils.GA(Chem.MolFromSmiles(TEST_DATA['x0161']['smiles']), costfunc=_qed_cost, costfunc_kwargs={},
+                   crem_db_path=crem_db_path, maxiter=1, popsize=6, randomseed=123, deffnm='test_GA_prescreen',
+                   prescreen={'pool_factor': 4, 'min_train': 1})
+    confgen = utils.confgen
+    calls = []
+
+    def counting_confgen(*args, **kwargs):
+        calls.append(args[0])
+        return confgen(*args, **kwargs)
+
+    utils.confgen = counting_confgen
+    try:
+        out(njobs=1)
+    finally:
+        utils.confgen = confgen
+    assert out.acceptance[1]['screened'] > 0
+    # The conformers are only generated for the initial population and the offspring kept by the surrogate model
+    assert len(calls) <= out.popsize + out.nc
+
+
+def _failing_cost(Individual):
+    raise ValueError('This cost function always fails')
+
+
+def test_IslandGA_immigrants():
+    out = utils.IslandGA(Chem.MolFromSmiles(TEST_DATA['x0161']['smiles']), costfunc=_qed_cost, costfunc_kwargs={},
+                         crem_db_path=crem_db_path, n_islands=2, migration_interval=1, migrants=2, maxiter=2,
+                         popsize=4, deffnm='test_IslandGA_immigrants', randomseed=123)
+    out(njobs=1)
+    for destination, island in enumerate(out.islands):
+        # The idx values of the history are not repeated
+        idx = [individual.idx for individual in island.SawIndividuals]
+        assert len(idx) == len(set(idx))
+        immigrants = [individual for individual in island.SawIndividuals if getattr(individual, 'origin', None)]
+        assert immigrants and all(individual.origin[0] != destination for individual in immigrants)
+
+
+def test_GA_stage_timer():
+    timer = utils._stage_timer
+    out = utils.GA(Chem.MolFromSmiles(TEST_DATA['x0161']['smiles']), costfunc=_failing_cost, costfunc_kwargs={},
+                   crem_db_path=crem_db_path, maxiter=1, popsize=4, randomseed=123, deffnm='test_GA_stage_timer')
+    try:
+        out(njobs=1)
+        raise AssertionError('GA did not fail with a failing cost function')
+    except (RuntimeError, ValueError):
+        pass
+    # The timer of the process is restored
+    assert utils._stage_timer is timer
+
+
+def test_read_molecules():
+    from moldrug import score
+    with gzip.open('test_read_molecules.smi.gz', 'wt') as f:
+        f.write("# library\nCCO ethanol\n\nnot_a_smiles\nc1ccccc1 benzene\nOCC\n")
+    records = list(score.read_molecules('test_read_molecules.smi.gz'))
+    assert [(index, name) for index, name, _ in records] == [(0, 'ethanol'), (1, '1'), (2, 'benzene'), (3, '3')]
+    assert records[1][2] is None
+    # The skipped records are not parsed
+    assert [index for index, _, _ in score.read_molecules('test_read_molecules.smi.gz', offset=2)] == [2, 3]
+    # The output is truncated to the last committed batch on resume
+    output = score._Output('test_read_molecules.csv')
+    with open(output.path, 'w') as f:
+        f.write("idx,name\n0,ethanol\n")
+    size = output.size()
+    with open(output.path, 'a') as f:
+        f.write("1,partial")
+    output.truncate(size)
+    assert output.columns == ['idx', 'name']
+    assert open(output.path).read() == "idx,name\n0,ethanol\n"
+
+
+def _scaled_qed_cost(Individual, scale=1.0, fail_on=None):
+    if Individual.smiles == fail_on:
+        raise ValueError(f'{fail_on} can not be scored')
+    Individual = _qed_cost(Individual)
+    Individual.cost *= scale
+    return Individual
+
+
+def test_score():
+    import csv
+    import pyarrow.parquet as pq
+    from moldrug import score
+    smiles = ['CCO', 'OCC', 'not_a_smiles', 'c1ccccc1O', 'CC(=O)O', 'CCN', 'Oc1ccccc1', 'CCCl', 'CCCO']
+    with gzip.open('test_score.smi.gz', 'wt') as f:
+        f.write(''.join(f"{smi} mol{i}\n" for i, smi in enumerate(smiles)))
+
+    def read_rows(path):
+        with gzip.open(path, 'rt') as f:
+            return list(csv.DictReader(f))
+
+    progress = score.score('test_score.smi.gz', 'test_score.csv.gz', _scaled_qed_cost, {}, batch_size=3, randomseed=1)
+    # OCC repeats a molecule of the same batch and Oc1ccccc1 the one of a previous batch
+    assert (progress['scored'], progress['duplicates'], progress['invalid'], progress['unique']) == (6, 2, 1, 6)
+    rows = read_rows('test_score.csv.gz')
+    assert [row['name'] for row in rows] == ['mol0', 'mol3', 'mol4', 'mol5', 'mol7', 'mol8']
+
+    # Interrupted on the second batch and with a partial write after the first one
+    try:
+        score.score('test_score.smi.gz', 'test_score_resume.csv.gz', _scaled_qed_cost, {'fail_on': 'CCN'},
+                    batch_size=3, randomseed=1)
+        raise AssertionError('score did not fail with a failing cost function')
+    except RuntimeError:
+        pass
+    with gzip.open('test_score_resume.csv.gz', 'at') as f:
+        f.write("99,partial")
+    with open('test_score_resume.csv.gz.keys', 'ab') as f:
+        f.write(b'\0' * 8)
+    resumed = score.score('test_score.smi.gz', 'test_score_resume.csv.gz', _scaled_qed_cost, {},
+                          batch_size=3, randomseed=1, resume=True)
+    for key in ['offset', 'unique', 'scored', 'duplicates', 'invalid']:
+        assert resumed[key] == progress[key]
+    assert read_rows('test_score_resume.csv.gz') == rows
+    # The keys of the scored molecules are kept between the resumed runs
+    assert resumed == score.score('test_score.smi.gz', 'test_score_resume.csv.gz', _scaled_qed_cost, {},
+                                  batch_size=3, randomseed=1, resume=True)
+
+    # Half of every batch (rounded up) is promoted to the production setting
+    progress = score.score('test_score.smi.gz', 'test_score.sdf', _scaled_qed_cost, {}, batch_size=3, randomseed=1,
+                           fidelity={'tiers': [{'scale': 0.5}], 'fraction': 0.5})
+    assert progress['promoted'] == 4
+    with open('test_score.sdf') as f:
+        assert f.read().count('$$$$') == 6
+    score.score('test_score.smi.gz', 'test_score.parquet', _scaled_qed_cost, {}, batch_size=3, randomseed=1)
+    table = pq.read_table('test_score.parquet')
+    assert table.num_rows == 6
+    assert np.allclose(sorted(table.column('cost').to_pylist()), sorted(float(row['cost']) for row in rows))
+
+
+def test_broker():
+    from moldrug import broker
+    backend = broker.BrokerBackend('test_broker', poll=0.05, local_workers=2)
+    assert list(backend.map(abs, [-3, -2, -1, 0])) == [3, 2, 1, 0]
+    # The items added during the iteration are also evaluated
+    for incremental_backend in [backend, utils.PoolBackend(2)]:
+        args_list, results = [-2, -1], dict()
+        for index, result in incremental_backend.map_incremental(abs, args_list):
+            results[index] = result
+            if result == 2:
+                args_list.append(-5)
+        assert results == {0: 2, 1: 1, 2: 5}
+    # A task claimed by a lost worker is resubmitted
+    file_broker = broker.FileBroker('test_broker')
+    file_broker.submit('task', abs, -1)
+    assert file_broker.claim('lost')[0] == 'task'
+    assert file_broker.requeue_lost(heartbeat_timeout=1) == ['task']
+    assert broker.worker('test_broker', max_tasks=1) == 1
+    assert file_broker.pop_result('task') == ('ok', 1)
+
+
 def test_miscellanea():
     obj0 = []
     for i in range(0, 50):
@@ -345,6 +966,27 @@ def test_constraintconf():
         out='conf.sdf',
         randomseed=1234,
     )
+    # Parallel run (the invalid SMILES is skipped)
+    with open('mol.smi', 'a') as f:
+        f.write("\nnot_a_smiles\n" + TEST_DATA['x0161']['smiles'] + "\n")
+    kwargs = dict(pdb=TEST_DATA['x0161']['protein']['pdb'], fix='fix.sdf', randomseed=1234, njobs=2, batch_size=1)
+    progress = constraintconf(smi='mol.smi', out='conf_njobs.sdf', **kwargs)
+    assert progress['offset'] == 3 and progress['invalid'] == 1
+    with open('conf.sdf', 'r') as f:
+        conf = f.read()
+    with open('conf_njobs.sdf', 'r') as f:
+        conf_njobs = f.read()
+    assert conf_njobs.count('$$$$') == 2 * conf.count('$$$$')
+    # Interrupted run: only the first batch finished and the second one was partially written
+    with open('mol_first.smi', 'w') as f:
+        f.write(TEST_DATA['x0161']['smiles'] + "\n")
+    assert constraintconf(smi='mol_first.smi', out='conf_resumed.sdf', **kwargs)['offset'] == 1
+    with open('conf_resumed.sdf', 'a') as f:
+        f.write(conf[:100])
+    progress = constraintconf(smi='mol.smi', out='conf_resumed.sdf', resume=True, **kwargs)
+    assert progress['offset'] == 3 and progress['invalid'] == 1 and progress['written'] == 2
+    with open('conf_resumed.sdf', 'r') as f:
+        assert f.read() == conf_njobs
     # Clean
     utils.tar_errors()
 
@@ -364,5 +1006,39 @@ def test_generate_conformers():
     utils.tar_errors()
 
 
+def test_constraintconf_cache():
+    from moldrug import constraintconf
+    ref = Chem.RemoveHs(Chem.MolFromMolFile(TEST_DATA['x0161']['ligand_3D']))
+    mol = Chem.MolFromSmiles('COC(=O)c1ccc(S(N)(=O)=O)cc1Cl')
+    mcs_smi = constraintconf.get_mcs(mol, ref, timeout=1)
+    assert (Chem.MolToSmiles(mol), Chem.MolToSmiles(ref), 1) in constraintconf._mcs_cache
+    # Same molecule with other atom order
+    assert constraintconf.get_mcs(Chem.MolFromSmiles('Clc1cc(S(N)(=O)=O)ccc1C(=O)OC'), ref, timeout=1) == mcs_smi
+    core = constraintconf.get_core(ref, mcs_smi)
+    assert constraintconf.get_core(Chem.Mol(ref), mcs_smi) is core
+    assert core.GetNumAtoms() == Chem.MolFromSmiles(mcs_smi).GetNumAtoms()
+    # Other coordinates, other core
+    moved = Chem.Mol(ref)
+    moved.GetConformer().SetAtomPosition(0, [0.0, 0.0, 0.0])
+    assert constraintconf.get_core(moved, mcs_smi) is not core
+    # The timeout can be set from the cost functions
+    generate_conformers, calls = constraintconf.generate_conformers, []
+
+    def recording_generate_conformers(**kwargs):
+        calls.append(kwargs)
+        return generate_conformers(**kwargs)
+    constraintconf.generate_conformers = recording_generate_conformers
+    try:
+        fitness.CostOnlyVina(
+            utils.Individual(mol), wd='test_constraintconf_cache', vina_executable='vina',
+            receptor_pdbqt_path=TEST_DATA['x0161']['protein']['pdbqt'], boxcenter=TEST_DATA['x0161']['box']['boxcenter'],
+            boxsize=TEST_DATA['x0161']['box']['boxsize'], constraint=True, constraint_ref=ref,
+            constraint_receptor_pdb_path=TEST_DATA['x0161']['protein']['pdb'], constraint_num_conf=1,
+            constraint_mcs_timeout=2)
+    finally:
+        constraintconf.generate_conformers = generate_conformers
+    assert calls[0]['mcs_timeout'] == 2
+
+
 if __name__ == '__main__':
     pass